@@ -1,31 +1,132 @@
-import sqlite3
+import asyncio
+import threading
+from connection_pool import get_async_pool, get_pool, pool_stats
+
+# Per thread: pool name -> [connection, nesting depth]
+_active = threading.local()
+# (task, pool name) -> [aiosqlite connection, nesting depth]
+_async_active = {}
+
 
 class DatabaseConnection:
     """
     A custom context manager for SQLite database connections.
-    - Opens a connection on __enter__.
-    - Closes it on __exit__ (even if an error occurs).
+    - Borrows a connection from a named pool on __enter__ (the pool for
+      db_name unless `pool` names another one). New pool connections get
+      the PRAGMA profile given, if any (see sqlite_profile).
+    - Returns it to the pool on __exit__ (even if an error occurs), rolled
+      back and reset, instead of closing it.
+    - Nested blocks on the same pool and thread reuse the outer connection;
+      if a transaction is open, the inner block runs in a savepoint that
+      is rolled back if the block raises.
+    - `async with` does the same with an aiosqlite connection from the
+      loop's async pool of that name, and returns an aiosqlite cursor.
+      Nesting is tracked per task instead of per thread.
     """
-    def __init__(self, db_name):
+    def __init__(self, db_name, profile=None, pool=None):
         self.db_name = db_name
+        self.profile = profile
+        self.pool_name = pool or db_name
         self.conn = None
+        self.cursor = None
+        self._pool = None
+        self._savepoint = None
+
+    @staticmethod
+    def pool_stats():
+        """Statistics of every named pool (see connection_pool.pool_stats)."""
+        return pool_stats()
+
+    def _active(self):
+        if not hasattr(_active, 'connections'):
+            _active.connections = {}
+        return _active.connections
 
     def __enter__(self):
-        """Opens the connection and returns a cursor."""
-        self.conn = sqlite3.connect(self.db_name)
-        return self.conn.cursor()  # Return cursor for query execution
+        """Borrows a connection (or reuses the outer one) and returns a cursor."""
+        active = self._active()
+        pool = self._pool = get_pool(self.pool_name, self.db_name, profile=self.profile)
+        outer = active.get(self.pool_name)
+        if outer is not None:
+            self.conn = outer[0]
+            outer[1] += 1
+            pool.record_nested()
+            if self.conn.in_transaction:
+                self._savepoint = f"database_connection_{outer[1]}"
+                self.conn.execute(f"SAVEPOINT {self._savepoint}")
+        else:
+            self.conn = pool.acquire()
+            active[self.pool_name] = [self.conn, 0]
+        self.cursor = self.conn.cursor()
+        return self.cursor  # Return cursor for query execution
 
     def __exit__(self, exc_type, exc_val, exc_tb):
-        """Closes the connection (handles exceptions if any)."""
-        if self.conn:
-            self.conn.close()
+        """Gives the connection back (handles exceptions if any)."""
+        if self.cursor:
+            self.cursor.close()
+        if self.conn is None:
+            return False
+        active = self._active()
+        entry = active[self.pool_name]
+        if entry[1]:
+            # Nested: leave the connection to the outer block
+            entry[1] -= 1
+            if self._savepoint is not None and self.conn.in_transaction:
+                if exc_type is not None:
+                    self.conn.execute(f"ROLLBACK TO {self._savepoint}")
+                self.conn.execute(f"RELEASE {self._savepoint}")
+        else:
+            del active[self.pool_name]
+            self._pool.release(self.conn)
+        self.conn = self.cursor = self._savepoint = None
         # Return False to propagate exceptions (True would suppress them)
+        return False
+
+    async def __aenter__(self):
+        """Borrows an aiosqlite connection (or reuses the outer one) and returns a cursor."""
+        key = (asyncio.current_task(), self.pool_name)
+        pool = self._pool = get_async_pool(self.pool_name, self.db_name, profile=self.profile)
+        outer = _async_active.get(key)
+        if outer is not None:
+            self.conn = outer[0]
+            outer[1] += 1
+            if self.conn.in_transaction:
+                self._savepoint = f"database_connection_{outer[1]}"
+                await self.conn.execute(f"SAVEPOINT {self._savepoint}")
+        else:
+            self.conn = await pool.acquire()
+            _async_active[key] = [self.conn, 0]
+        self.cursor = await self.conn.cursor()
+        return self.cursor
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        """Gives the aiosqlite connection back (handles exceptions if any)."""
+        if self.cursor:
+            await self.cursor.close()
+        if self.conn is None:
+            return False
+        key = (asyncio.current_task(), self.pool_name)
+        entry = _async_active[key]
+        if entry[1]:
+            entry[1] -= 1
+            if self._savepoint is not None and self.conn.in_transaction:
+                if exc_type is not None:
+                    await self.conn.execute(f"ROLLBACK TO {self._savepoint}")
+                await self.conn.execute(f"RELEASE {self._savepoint}")
+        else:
+            del _async_active[key]
+            await self._pool.release(self.conn)
+        self.conn = self.cursor = self._savepoint = None
+        return False
 
 
 # Example usage
-with DatabaseConnection('users.db') as cursor:
-    cursor.execute("SELECT * FROM users")
-    results = cursor.fetchall()
-    print("Users in the database:")
-    for row in results:
-        print(row)
\ No newline at end of file
+if __name__ == "__main__":
+    with DatabaseConnection('users.db') as cursor:
+        cursor.execute("SELECT * FROM users")
+        results = cursor.fetchall()
+        print("Users in the database:")
+        for row in results:
+            print(row)
+
+    print(DatabaseConnection.pool_stats())
@@ -1,52 +1,171 @@
 import sqlite3
+import sys
+from connection_pool import get_async_pool
+from sqlite_profile import apply_profile
+
+
+def dict_factory(cursor, row):
+    """Row factory returning each row as a {column: value} dict."""
+    return {column[0]: value for column, value in zip(cursor.description, row)}
+
 
 class ExecuteQuery:
     """
     A reusable context manager for executing parameterized SQL queries.
     - Manages database connections automatically.
     - Executes the given query with parameters.
-    - Returns query results.
+    - Returns query results: all rows as a list, or with stream=True a
+      lazy iterator that fetches `chunk_size` rows at a time, so memory
+      stays proportional to the chunk rather than the result.
+    - With many=True, runs the query once per parameter tuple
+      (executemany), commits on a clean exit and returns the row count.
+    - `async with` behaves the same on an aiosqlite connection borrowed
+      from the loop's async pool for db_name; streaming then returns an
+      async iterator.
     """
-    def __init__(self, db_name='users.db', query=None, params=None):
+    def __init__(self, db_name='users.db', query=None, params=None, profile=None,
+                 stream=False, chunk_size=500, row_factory=None, many=False):
         """
         Initialize with:
         - db_name: Database filename (default: 'users.db').
         - query: SQL query string (e.g., "SELECT * FROM users WHERE age > ?").
-        - params: Query parameters (e.g., (25,)).
+        - params: Query parameters (e.g., (25,)); with many=True an iterable
+          of parameter tuples, consumed lazily.
+        - profile: PRAGMA profile applied on connect (default: 'default',
+          which leaves the journal mode and synchronous setting alone).
+        - stream: Return a lazy row iterator instead of a list (default: False).
+        - chunk_size: Rows fetched per fetchmany() call when streaming (default: 500).
+        - row_factory: Row factory for the connection, e.g. sqlite3.Row or
+          dict_factory (default: plain tuples).
+        - many: Bulk write mode using executemany (default: False).
         """
+        if stream and many:
+            raise ValueError("stream and many cannot be combined")
         self.db_name = db_name
         self.query = query
         self.params = params if params is not None else ()
+        self.profile = profile
+        self.stream = stream
+        self.chunk_size = chunk_size
+        self.row_factory = row_factory
+        self.many = many
         self.conn = None
         self.cursor = None
+        self._pool = None
+
+    def _rows(self):
+        """Yield the result rows, fetching chunk_size of them at a time."""
+        while True:
+            rows = self.cursor.fetchmany(self.chunk_size)
+            if not rows:
+                return
+            yield from rows
 
     def __enter__(self):
         """Opens connection, executes query, and returns results."""
-        self.conn = sqlite3.connect(self.db_name)
-        self.cursor = self.conn.cursor()
-        
-        if self.query:
-            self.cursor.execute(self.query, self.params)
-            return self.cursor.fetchall()  # Return query results
-        
+        self.conn = apply_profile(sqlite3.connect(self.db_name), self.profile)
+        try:
+            if self.row_factory is not None:
+                self.conn.row_factory = self.row_factory
+            self.cursor = self.conn.cursor()
+
+            if self.query:
+                if self.many:
+                    self.cursor.executemany(self.query, self.params)
+                    return self.cursor.rowcount  # Rows written
+                self.cursor.execute(self.query, self.params)
+                if self.stream:
+                    return self._rows()  # Rows are fetched as they are iterated
+                return self.cursor.fetchall()  # Return query results
+        except BaseException:
+            # As in __aenter__: roll back a partly written batch and close
+            # the connection, which would otherwise keep the write lock
+            self.__exit__(*sys.exc_info())
+            raise
+
         return None  # If no query provided
 
+    async def _arows(self):
+        """Yield the result rows asynchronously, chunk_size at a time."""
+        while True:
+            rows = await self.cursor.fetchmany(self.chunk_size)
+            if not rows:
+                return
+            for row in rows:
+                yield row
+
+    async def __aenter__(self):
+        """Borrows a pooled aiosqlite connection, executes query, and returns results."""
+        self._pool = get_async_pool(self.db_name, profile=self.profile)
+        self.conn = await self._pool.acquire()
+        try:
+            if self.row_factory is not None:
+                self.conn.row_factory = self.row_factory
+            self.cursor = await self.conn.cursor()
+
+            if self.query:
+                if self.many:
+                    await self.cursor.executemany(self.query, self.params)
+                    return self.cursor.rowcount
+                await self.cursor.execute(self.query, self.params)
+                if self.stream:
+                    return self._arows()
+                return await self.cursor.fetchall()
+        except BaseException:
+            # __aexit__ is not called when __aenter__ raises; pass the error
+            # on so a partly written batch is rolled back, not committed
+            await self.__aexit__(*sys.exc_info())
+            raise
+
+        return None  # If no query provided
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        """Closes the cursor and returns the connection (even if an error occurs)."""
+        try:
+            if self.conn and self.many:
+                if exc_type is None:
+                    await self.conn.commit()
+                else:
+                    await self.conn.rollback()
+            if self.cursor:
+                await self.cursor.close()
+        finally:
+            if self.conn:
+                # The pool also rolls back anything left uncommitted
+                await self._pool.release(self.conn)
+            self.conn = self.cursor = None
+        return False
+
     def __exit__(self, exc_type, exc_val, exc_tb):
         """Closes cursor and connection (even if an error occurs)."""
+        if self.conn and self.many:
+            if exc_type is None:
+                self.conn.commit()
+            else:
+                self.conn.rollback()
         if self.cursor:
             self.cursor.close()
         if self.conn:
             self.conn.close()
-        
+        self.conn = self.cursor = None
+
         # Return False to propagate exceptions (True would suppress them)
         return False
 
 
 # Example usage
-query = "SELECT * FROM users WHERE age > ?"
-params = (25,)
+if __name__ == "__main__":
+    query = "SELECT * FROM users WHERE age > ?"
+    params = (25,)
+
+    with ExecuteQuery(query=query, params=params) as results:
+        print("Users older than 25:")
+        for row in results:
+            print(row)
 
-with ExecuteQuery(query=query, params=params) as results:
-    print("Users older than 25:")
-    for row in results:
-        print(row)
\ No newline at end of file
+    # Same query, streamed in chunks of 100 rows as dicts
+    with ExecuteQuery(query=query, params=params, stream=True, chunk_size=100,
+                      row_factory=dict_factory) as rows:
+        print("Streamed user names:")
+        for row in rows:
+            print(row['name'])
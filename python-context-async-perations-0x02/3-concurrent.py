@@ -1,48 +1,69 @@
 import asyncio
-import aiosqlite
+from query_executor import AiosqliteBackend, QueryExecutor
 
-async def async_fetch_users():
+ALL_USERS = ("SELECT * FROM users", ())
+OLDER_USERS = ("SELECT * FROM users WHERE age > ?", (40,))
+
+# Borrows from the running loop's shared pool, which closes with the loop
+_shared = AiosqliteBackend("users.db")
+
+
+async def _fetch(query, executor=None):
+    if executor is not None:
+        return (await executor.run([query]))[0]
+    return await _shared.fetchall(*query)
+
+
+async def async_fetch_users(executor=None):
     """
     Fetches all users from the database asynchronously.
+    Args:
+        executor: QueryExecutor whose connections to use (default: the
+            loop's shared pool for users.db).
     Returns:
         List of all users.
     """
-    async with aiosqlite.connect("users.db") as db:
-        async with db.execute("SELECT * FROM users") as cursor:
-            return await cursor.fetchall()
+    return await _fetch(ALL_USERS, executor)
 
 
-async def async_fetch_older_users():
+async def async_fetch_older_users(executor=None):
     """
     Fetches users older than 40 asynchronously.
+    Args:
+        executor: QueryExecutor whose connections to use (default: the
+            loop's shared pool for users.db).
     Returns:
         List of users with age > 40.
     """
-    async with aiosqlite.connect("users.db") as db:
-        async with db.execute("SELECT * FROM users WHERE age > 40") as cursor:
-            return await cursor.fetchall()
+    return await _fetch(OLDER_USERS, executor)
 
 
-async def fetch_concurrently():
+async def fetch_concurrently(queries=None, concurrency=10, timeout=None):
     """
-    Runs both fetch functions concurrently using asyncio.gather().
+    Runs queries concurrently, at most `concurrency` at a time, on a
+    connection pool that is closed again before returning.
+    Args:
+        queries: SQL strings, (sql, params) tuples or query_executor.Query
+            objects (default: all users and users older than 40).
+        concurrency: Max queries running at once (default: 10).
+        timeout: Per-query timeout in seconds (default: none).
     Returns:
-        Tuple of (all_users, older_users).
+        Tuple of results, in the order of the queries; by default
+        (all_users, older_users).
     """
-    return await asyncio.gather(
-        async_fetch_users(),
-        async_fetch_older_users()
-    )
+    async with QueryExecutor("users.db", concurrency=concurrency,
+                             timeout=timeout) as executor:
+        return tuple(await executor.run(queries or [ALL_USERS, OLDER_USERS]))
 
 
 # Run the concurrent fetch
 if __name__ == "__main__":
     all_users, older_users = asyncio.run(fetch_concurrently())
-    
+
     print("All users:")
     for user in all_users:
         print(user)
-    
+
     print("\nUsers older than 40:")
     for user in older_users:
-        print(user)
\ No newline at end of file
+        print(user)
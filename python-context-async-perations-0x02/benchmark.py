@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+"""
+Benchmarks for the async query helpers.
+
+    python3 benchmark.py backends --queries 16 --concurrency 4
+"""
+import argparse
+import asyncio
+import os
+import sqlite3
+import tempfile
+import time
+
+from connection_pool import close_async_pools
+from process_backend import ProcessBackend
+from query_executor import AiosqliteBackend, QueryExecutor, ThreadBackend
+
+BACKENDS = {
+    'thread': lambda database, concurrency: ThreadBackend(database, size=concurrency),
+    'aiosqlite': lambda database, concurrency: AiosqliteBackend(database, size=concurrency),
+    'process': lambda database, concurrency: ProcessBackend(database, workers=concurrency),
+}
+
+
+def _make_users_db(path, rows):
+    """Create a users table with `rows` rows at path, in WAL mode."""
+    conn = sqlite3.connect(path)
+    conn.execute("PRAGMA journal_mode = WAL")
+    conn.execute("CREATE TABLE users (id INTEGER PRIMARY KEY, name TEXT, "
+                 "email TEXT, age INTEGER)")
+    conn.executemany("INSERT INTO users VALUES (?, ?, ?, ?)",
+                     ((i, f"User {i}", f"user{i}@example.com", 18 + i % 80)
+                      for i in range(1, rows + 1)))
+    conn.commit()
+    conn.close()
+
+
+async def _run_backend(name, database, queries, concurrency):
+    backend = BACKENDS[name](database, concurrency)
+    executor = QueryExecutor(concurrency=concurrency, backend=backend)
+    try:
+        await executor.run(queries[:concurrency])  # warm up connections and workers
+        started = time.perf_counter()
+        results = await executor.run(queries)
+        elapsed = time.perf_counter() - started
+    finally:
+        await executor.close()
+        await close_async_pools()
+    return elapsed, sum(len(rows) for rows in results)
+
+
+def bench_backends(database, rows, queries, concurrency, backends):
+    """
+    Time the same large-result reads on each executor backend.
+
+    Every query reads users older than some age, so each one returns a
+    large share of the table and the cost is dominated by row decoding.
+    """
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        if not os.path.exists(database):
+            database = os.path.join(tmp, 'users.db')
+            _make_users_db(database, rows)
+        work = [("SELECT * FROM users WHERE age > ?", (18 + i % 40,))
+                for i in range(queries)]
+        for name in backends:
+            elapsed, total = asyncio.run(_run_backend(name, database, work, concurrency))
+            results[name] = elapsed
+            print(f"{name:>9}: {queries} queries, {total:,} rows in {elapsed:.3f} s "
+                  f"({total / elapsed:,.0f} rows/s)")
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    backends = commands.add_parser('backends', help="thread vs aiosqlite vs process reads")
+    backends.add_argument('--database', default='users.db',
+                          help="database to read (a generated one if missing)")
+    backends.add_argument('--rows', type=int, default=200_000,
+                          help="rows in the generated database")
+    backends.add_argument('--queries', type=int, default=16)
+    backends.add_argument('--concurrency', type=int, default=4)
+    backends.add_argument('--backend', action='append', choices=sorted(BACKENDS),
+                          help="backend to run (repeatable; default: all)")
+
+    args = parser.parse_args()
+    if args.command == 'backends':
+        bench_backends(args.database, args.rows, args.queries, args.concurrency,
+                       args.backend or list(BACKENDS))
+
+
+if __name__ == "__main__":
+    main()
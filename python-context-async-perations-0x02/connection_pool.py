@@ -0,0 +1,351 @@
+"""
+Named pools of SQLite connections for the context managers.
+
+A pool is registered under a name (the database filename unless given
+another one) and hands out connections that already have their PRAGMA
+profile applied. Connections come back rolled back and with their row
+factory cleared, so the next user sees a clean connection.
+
+AsyncConnectionPool does the same with aiosqlite connections for
+coroutines, with one set of named pools per event loop, closed when that
+loop shuts down.
+"""
+import asyncio
+import sqlite3
+import threading
+import weakref
+from queue import Empty, LifoQueue
+
+from sqlite_profile import apply_profile, apply_profile_async
+
+try:
+    import aiosqlite
+except ImportError:  # only needed for the async pool
+    aiosqlite = None
+
+
+class PoolTimeoutError(sqlite3.OperationalError):
+    """Raised when no pooled connection becomes free in time."""
+
+
+class ConnectionPool:
+    """
+    A bounded pool of connections to one SQLite database file.
+
+    Connections are opened lazily, up to `size`, and shared between
+    threads (check_same_thread=False), one user at a time.
+    """
+
+    def __init__(self, database='users.db', size=5, timeout=30.0, profile=None):
+        self.database = database
+        self.size = size
+        self.timeout = timeout
+        self.profile = profile
+        self._idle = LifoQueue()
+        self._lock = threading.Lock()
+        self._open = 0
+        self._in_use = 0
+        self._stats = {'checkouts': 0, 'created': 0, 'nested': 0,
+                       'waits': 0, 'timeouts': 0, 'resets': 0}
+
+    def _connect(self):
+        conn = sqlite3.connect(self.database, check_same_thread=False)
+        return apply_profile(conn, self.profile)
+
+    def acquire(self):
+        """Check a connection out of the pool, opening one if allowed."""
+        try:
+            conn = self._idle.get_nowait()
+        except Empty:
+            with self._lock:
+                can_open = self._open < self.size
+                if can_open:
+                    self._open += 1
+            if can_open:
+                try:
+                    conn = self._connect()
+                except Exception:
+                    with self._lock:
+                        self._open -= 1
+                    raise
+                with self._lock:
+                    self._stats['created'] += 1
+            else:
+                with self._lock:
+                    self._stats['waits'] += 1
+                try:
+                    conn = self._idle.get(timeout=self.timeout)
+                except Empty:
+                    with self._lock:
+                        self._stats['timeouts'] += 1
+                    raise PoolTimeoutError(
+                        f"No connection to {self.database} free after "
+                        f"{self.timeout}s (pool size {self.size})") from None
+        with self._lock:
+            self._stats['checkouts'] += 1
+            self._in_use += 1
+        return conn
+
+    def release(self, conn):
+        """Return a connection with its state reset."""
+        with self._lock:
+            self._in_use -= 1
+        try:
+            if conn.in_transaction:
+                conn.rollback()
+                with self._lock:
+                    self._stats['resets'] += 1
+            conn.row_factory = None
+        except sqlite3.ProgrammingError:
+            # Closed by its user: put a fresh connection in its place
+            try:
+                conn = self._connect()
+            except sqlite3.Error:
+                with self._lock:
+                    self._open -= 1
+                return
+        self._idle.put(conn)
+
+    def record_nested(self):
+        with self._lock:
+            self._stats['nested'] += 1
+
+    def stats(self):
+        """Pool counters plus the current number of open and idle connections."""
+        with self._lock:
+            snapshot = dict(self._stats)
+            snapshot.update(database=self.database, size=self.size,
+                            open=self._open, idle=self._idle.qsize(),
+                            in_use=self._in_use)
+        return snapshot
+
+    def close(self):
+        """Close every idle connection."""
+        while True:
+            try:
+                conn = self._idle.get_nowait()
+            except Empty:
+                return
+            with self._lock:
+                self._open -= 1
+            conn.close()
+
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def get_pool(name='users.db', database=None, **options):
+    """
+    Return the pool registered under a name, creating it on first use.
+
+    Args:
+        name (str): Pool name (default: 'users.db').
+        database (str): Database file for a new pool (default: the name).
+        **options: ConnectionPool options for a new pool; ignored once the
+            pool exists, use configure_pool() to change them.
+
+    Returns:
+        ConnectionPool: The named pool
+    """
+    with _pools_lock:
+        pool = _pools.get(name)
+        if pool is None:
+            pool = _pools[name] = ConnectionPool(database or name, **options)
+        return pool
+
+
+def configure_pool(name='users.db', database=None, **options):
+    """Replace the pool registered under a name with a newly configured one."""
+    with _pools_lock:
+        old = _pools.get(name)
+        pool = _pools[name] = ConnectionPool(database or name, **options)
+    if old is not None:
+        old.close()
+    return pool
+
+
+def pool_stats():
+    """
+    Statistics of every named pool.
+
+    Returns:
+        dict: Pool name -> ConnectionPool.stats()
+    """
+    with _pools_lock:
+        pools = dict(_pools)
+    return {name: pool.stats() for name, pool in pools.items()}
+
+
+class AsyncConnectionPool:
+    """
+    A bounded pool of aiosqlite connections to one SQLite database file.
+
+    Used from a single event loop. Every aiosqlite connection owns a worker
+    thread that keeps the process alive, so close the pool before the loop
+    ends; the named pools from get_async_pool() are closed with their loop.
+    """
+
+    def __init__(self, database='users.db', size=10, timeout=30.0, profile=None):
+        if aiosqlite is None:
+            raise ImportError("AsyncConnectionPool requires aiosqlite: "
+                              "pip install aiosqlite")
+        self.database = database
+        self.size = size
+        self.timeout = timeout
+        self.profile = profile
+        self._idle = asyncio.LifoQueue()
+        self._open = 0
+        self._in_use = 0
+        self._stats = {'checkouts': 0, 'created': 0, 'waits': 0,
+                       'timeouts': 0, 'resets': 0}
+
+    async def _connect(self):
+        conn = await aiosqlite.connect(self.database)
+        try:
+            return await apply_profile_async(conn, self.profile)
+        except BaseException:
+            await conn.close()
+            raise
+
+    async def acquire(self):
+        """Check a connection out of the pool, opening one if allowed."""
+        try:
+            conn = self._idle.get_nowait()
+        except asyncio.QueueEmpty:
+            if self._open < self.size:
+                self._open += 1
+                try:
+                    conn = await self._connect()
+                except BaseException:
+                    self._open -= 1
+                    raise
+                self._stats['created'] += 1
+            else:
+                self._stats['waits'] += 1
+                try:
+                    conn = await asyncio.wait_for(self._idle.get(), self.timeout)
+                except asyncio.TimeoutError:
+                    self._stats['timeouts'] += 1
+                    raise PoolTimeoutError(
+                        f"No connection to {self.database} free after "
+                        f"{self.timeout}s (pool size {self.size})") from None
+        self._stats['checkouts'] += 1
+        self._in_use += 1
+        return conn
+
+    async def release(self, conn, discard=False):
+        """
+        Return a connection with its state reset.
+
+        With discard=True the connection is closed and a fresh one takes
+        its place, e.g. after interrupt(), whose effect can outlive the
+        statement it was meant for.
+        """
+        self._in_use -= 1
+        kept = False
+        try:
+            try:
+                if discard:
+                    await conn.close()
+                else:
+                    if conn.in_transaction:
+                        await conn.rollback()
+                        self._stats['resets'] += 1
+                    conn.row_factory = None
+            except (sqlite3.ProgrammingError, ValueError):
+                # Closed by its user
+                discard = True
+            if discard:
+                # Put a fresh connection in its place
+                try:
+                    conn = await self._connect()
+                except sqlite3.Error:
+                    return
+            self._idle.put_nowait(conn)
+            kept = True
+        finally:
+            if not kept:
+                # Whatever went wrong, the connection has left the pool
+                self._open -= 1
+
+    def stats(self):
+        """Pool counters plus the current number of open and idle connections."""
+        snapshot = dict(self._stats)
+        snapshot.update(database=self.database, size=self.size, open=self._open,
+                        idle=self._idle.qsize(), in_use=self._in_use)
+        return snapshot
+
+    async def close(self):
+        """Close every idle connection."""
+        while not self._idle.empty():
+            conn = self._idle.get_nowait()
+            self._open -= 1
+            await conn.close()
+
+
+# event loop -> ({name: AsyncConnectionPool}, closer); asyncio queues and
+# aiosqlite futures belong to the loop they were created on
+_async_pools = weakref.WeakKeyDictionary()
+
+
+async def _close_at_shutdown(pools):
+    """
+    Close the pools once the loop finalizes this generator.
+
+    A loop closes every async generator it has seen in shutdown_asyncgens(),
+    which asyncio.run() calls before closing the loop.
+    """
+    try:
+        yield
+    finally:
+        _async_pools.pop(asyncio.get_running_loop(), None)
+        for pool in list(pools.values()):
+            await pool.close()
+
+
+def _loop_pools():
+    loop = asyncio.get_running_loop()
+    entry = _async_pools.get(loop)
+    if entry is None:
+        pools = {}
+        closer = _close_at_shutdown(pools)
+        # Starting it registers it with the loop; run it up to its yield
+        try:
+            closer.asend(None).send(None)
+        except StopIteration:
+            pass
+        entry = _async_pools[loop] = (pools, closer)
+    return entry[0]
+
+
+def get_async_pool(name='users.db', database=None, **options):
+    """
+    Return the running loop's async pool registered under a name.
+
+    Arguments are as for get_pool(). The loop's pools are closed when it
+    shuts down its async generators, as asyncio.run() does, or earlier by
+    close_async_pools().
+    """
+    pools = _loop_pools()
+    pool = pools.get(name)
+    if pool is None:
+        pool = pools[name] = AsyncConnectionPool(database or name, **options)
+    return pool
+
+
+async def configure_async_pool(name='users.db', database=None, **options):
+    """Replace the running loop's async pool registered under a name."""
+    pools = _loop_pools()
+    old = pools.get(name)
+    pool = pools[name] = AsyncConnectionPool(database or name, **options)
+    if old is not None:
+        await old.close()
+    return pool
+
+
+async def close_async_pools():
+    """Close the running loop's async pools."""
+    entry = _async_pools.pop(asyncio.get_running_loop(), None)
+    if entry is not None:
+        await entry[1].aclose()
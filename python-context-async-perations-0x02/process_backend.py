@@ -0,0 +1,107 @@
+"""
+Process-pool backend for QueryExecutor.
+
+aiosqlite and the thread backend decode rows in this process, under the
+GIL, so CPU-heavy reads of large results do not run in parallel. Here
+each worker process keeps its own read-only connection to the database
+and decodes rows itself. Rows are sent back column by column (one tuple
+per column rather than one per row), which pickles smaller and faster,
+and turned back into row tuples with zip().
+
+    executor = QueryExecutor(backend=ProcessBackend('users.db', workers=4))
+
+The database must already be in WAL mode, so the workers' reads do not
+block writers elsewhere. WAL is a persistent property of the file, so it
+is left to the owner of the database to switch it on, e.g. with the
+'balanced' profile of sqlite_profile. Queries that are already running
+in a worker cannot be interrupted; a timeout or cancellation only stops
+waiting.
+"""
+import asyncio
+import multiprocessing
+import os
+import sqlite3
+from concurrent.futures import ProcessPoolExecutor
+
+# The worker process's connection, opened by _init_worker
+_conn = None
+
+
+def _init_worker(database, pragmas):
+    global _conn
+    uri = f"file:{os.path.abspath(database)}?mode=ro"
+    _conn = sqlite3.connect(uri, uri=True)
+    for name, value in pragmas.items():
+        _conn.execute(f"PRAGMA {name} = {value}")
+    _conn.execute("PRAGMA query_only = 1")
+
+
+def _journal_mode(database):
+    """The journal mode of an existing database, read without changing it."""
+    uri = f"file:{os.path.abspath(database)}?mode=ro"
+    conn = sqlite3.connect(uri, uri=True)
+    try:
+        return conn.execute("PRAGMA journal_mode").fetchone()[0].lower()
+    finally:
+        conn.close()
+
+
+def _fetch_columns(sql, params):
+    """Run a query in a worker and return (row count, column tuples)."""
+    cursor = _conn.execute(sql, params)
+    try:
+        rows = cursor.fetchall()
+    finally:
+        cursor.close()
+    return len(rows), tuple(zip(*rows))
+
+
+class ProcessBackend:
+    """
+    Runs read queries in a pool of worker processes.
+
+    Args:
+        database (str): Database file (default: 'users.db').
+        workers (int): Number of worker processes (default: CPU count).
+        pragmas (dict): Read-side PRAGMAs for the workers' connections
+            (default: a 256 MiB memory map and a 64 MiB page cache).
+        mp_context: multiprocessing context (default: 'spawn', so workers
+            never inherit aiosqlite threads or open connections).
+
+    Raises:
+        ValueError: If the database is not in WAL mode.
+    """
+
+    def __init__(self, database='users.db', workers=None, pragmas=None, mp_context=None):
+        self.database = database
+        self.workers = workers or os.cpu_count()
+        if pragmas is None:
+            pragmas = {'mmap_size': 256 * 1024 * 1024, 'cache_size': -64 * 1024}
+        journal_mode = _journal_mode(database)
+        if journal_mode != 'wal':
+            raise ValueError(
+                f"ProcessBackend needs {database} in WAL mode, not "
+                f"{journal_mode!r}; switch it once with "
+                f"PRAGMA journal_mode = WAL (or the 'balanced' profile)")
+        self._pool = ProcessPoolExecutor(
+            self.workers,
+            mp_context=mp_context or multiprocessing.get_context('spawn'),
+            initializer=_init_worker, initargs=(database, pragmas))
+
+    async def fetch_columns(self, sql, params=()):
+        """
+        Run a query in a worker and return its columns.
+
+        Returns:
+            tuple: (row count, one tuple of values per column)
+        """
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._pool, _fetch_columns, sql, tuple(params))
+
+    async def fetchall(self, sql, params=()):
+        count, columns = await self.fetch_columns(sql, params)
+        return list(zip(*columns)) if count else []
+
+    async def close(self):
+        """Shut the worker processes down."""
+        await asyncio.get_running_loop().run_in_executor(None, self._pool.shutdown)
@@ -0,0 +1,259 @@
+"""
+Run many read queries concurrently, with a cap on how many run at once.
+
+    executor = QueryExecutor('users.db', concurrency=20)
+    results = await executor.run([
+        "SELECT * FROM users",
+        ("SELECT * FROM users WHERE age > ?", (40,)),
+        Query("SELECT COUNT(*) FROM users", timeout=0.5),
+    ])
+    print(executor.stats())
+
+The queries are executed by a backend. By default the executor gets an
+AiosqliteBackend with its own AsyncConnectionPool, sized to the
+concurrency limit, so hundreds of queries use a handful of file handles;
+close() (or leaving `async with QueryExecutor(...)`) closes those
+connections. An AiosqliteBackend created without scoped=True borrows from
+the loop's shared pool instead, which is closed with the loop.
+ThreadBackend runs the queries on pooled sqlite3 connections in a thread
+pool, and process_backend.ProcessBackend in worker processes. A backend
+is any object with async fetchall(sql, params) and close().
+"""
+import asyncio
+import time
+from collections import deque, namedtuple
+from concurrent.futures import ThreadPoolExecutor
+
+from connection_pool import AsyncConnectionPool, get_async_pool, get_pool
+
+Query = namedtuple('Query', 'sql params timeout', defaults=((), None))
+Query.__doc__ = """A query to run: SQL text, parameters and an optional timeout in seconds."""
+
+
+def _as_query(query):
+    if isinstance(query, Query):
+        return query
+    if isinstance(query, str):
+        return Query(query)
+    return Query(*query)
+
+
+class AiosqliteBackend:
+    """
+    Runs queries on aiosqlite connections from a named async pool.
+
+    With scoped=True the backend opens a pool of its own instead, and
+    close() closes its connections.
+    """
+
+    def __init__(self, database='users.db', size=10, profile=None, pool=None,
+                 scoped=False):
+        self.database = database
+        self.size = size
+        self.profile = profile
+        self.pool_name = pool or database
+        self.scoped = scoped
+        self._pool = None
+
+    def _get_pool(self):
+        if not self.scoped:
+            return get_async_pool(self.pool_name, self.database,
+                                  size=self.size, profile=self.profile)
+        if self._pool is None:
+            self._pool = AsyncConnectionPool(self.database, size=self.size,
+                                             profile=self.profile)
+        return self._pool
+
+    async def fetchall(self, sql, params=()):
+        pool = self._get_pool()
+        conn = await pool.acquire()
+        interrupted = False
+        try:
+            async with conn.execute(sql, params) as cursor:
+                return await cursor.fetchall()
+        except asyncio.CancelledError:
+            # Stop the statement still running on the connection's thread
+            await conn.interrupt()
+            interrupted = True
+            raise
+        finally:
+            # Never hand an interrupted connection to the next query
+            await pool.release(conn, discard=interrupted)
+
+    async def close(self):
+        # A shared pool is closed with its loop
+        if self._pool is not None:
+            await self._pool.close()
+            self._pool = None
+
+
+class ThreadBackend:
+    """Runs queries on sqlite3 connections from a named pool, in threads."""
+
+    def __init__(self, database='users.db', size=10, profile=None, pool=None):
+        self.database = database
+        self.profile = profile
+        self.pool_name = pool or database
+        self._pool = get_pool(self.pool_name, database, size=size, profile=profile)
+        self._threads = ThreadPoolExecutor(size)
+
+    def _fetchall(self, sql, params):
+        conn = self._pool.acquire()
+        try:
+            return conn.execute(sql, params).fetchall()
+        finally:
+            self._pool.release(conn)
+
+    async def fetchall(self, sql, params=()):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._threads, self._fetchall, sql, params)
+
+    async def close(self):
+        self._threads.shutdown(wait=False)
+
+
+class QueryExecutor:
+    """
+    Bounded-concurrency executor for read queries.
+
+    At most `concurrency` queries run at the same time; the rest wait their
+    turn. `timeout` is the default per-query timeout in seconds, counted
+    from when the query starts running; a Query can set its own. A query
+    that times out raises asyncio.TimeoutError and its statement is
+    interrupted. Cancelling run() or closing as_completed() cancels every
+    query still pending. Close the executor when done, or use it as
+    `async with QueryExecutor(...) as executor:`. Latency percentiles
+    cover the last `latency_samples` queries.
+    """
+
+    def __init__(self, database='users.db', concurrency=10, timeout=None, backend=None,
+                 latency_samples=10000):
+        self.concurrency = concurrency
+        self.timeout = timeout
+        self.backend = backend or AiosqliteBackend(database, size=concurrency,
+                                                   scoped=True)
+        self._latencies = deque(maxlen=latency_samples)
+        self._counts = {'queries': 0, 'errors': 0, 'timeouts': 0, 'cancelled': 0}
+        self._busy = 0.0  # wall time with at least one query running
+        self._running = 0
+        self._busy_since = None
+
+    async def _execute(self, semaphore, index, query):
+        async with semaphore:
+            if self._running == 0:
+                self._busy_since = time.perf_counter()
+            self._running += 1
+            started = time.perf_counter()
+            timeout = query.timeout if query.timeout is not None else self.timeout
+            try:
+                result = await asyncio.wait_for(
+                    self.backend.fetchall(query.sql, query.params), timeout)
+            except asyncio.TimeoutError:
+                self._counts['timeouts'] += 1
+                raise
+            except asyncio.CancelledError:
+                self._counts['cancelled'] += 1
+                raise
+            except Exception:
+                self._counts['errors'] += 1
+                raise
+            finally:
+                now = time.perf_counter()
+                self._latencies.append(now - started)
+                self._counts['queries'] += 1
+                self._running -= 1
+                if self._running == 0:
+                    self._busy += now - self._busy_since
+        return index, result
+
+    def _start(self, queries):
+        semaphore = asyncio.Semaphore(self.concurrency)
+        return [asyncio.ensure_future(self._execute(semaphore, index, _as_query(query)))
+                for index, query in enumerate(queries)]
+
+    async def run(self, queries, return_exceptions=False):
+        """
+        Run the queries and return their results in submission order.
+
+        Args:
+            queries: SQL strings, (sql, params[, timeout]) tuples or Query objects
+            return_exceptions (bool): Put a failed query's exception in its
+                slot instead of raising it (and cancelling the rest)
+
+        Returns:
+            list: One list of rows per query
+        """
+        tasks = self._start(queries)
+        try:
+            done = await asyncio.gather(*tasks, return_exceptions=return_exceptions)
+        except BaseException:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            raise
+        return [item[1] if isinstance(item, tuple) else item for item in done]
+
+    async def as_completed(self, queries, return_exceptions=False):
+        """
+        Yield (index, rows) pairs as the queries finish.
+
+        With return_exceptions, a failed query yields (index, exception);
+        otherwise its exception is raised and the other queries are
+        cancelled.
+        """
+        tasks = self._start(queries)
+        indexes = {task: index for index, task in enumerate(tasks)}
+        pending = set(tasks)
+        try:
+            while pending:
+                finished, pending = await asyncio.wait(
+                    pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in finished:
+                    if not return_exceptions or (not task.cancelled()
+                                                 and task.exception() is None):
+                        yield task.result()  # raises if the query failed
+                    elif task.cancelled():
+                        yield indexes[task], asyncio.CancelledError()
+                    else:
+                        yield indexes[task], task.exception()
+        finally:
+            for task in pending:
+                task.cancel()
+            if pending:
+                await asyncio.gather(*pending, return_exceptions=True)
+
+    def stats(self):
+        """
+        Counters of every query run so far, and latency of the most recent.
+
+        Returns:
+            dict: Counters, latency mean/p50/p95/p99/max in seconds over the
+                  last latency_samples queries, and busy_seconds, the wall
+                  time during which queries ran
+        """
+        latencies = sorted(self._latencies)
+        snapshot = dict(self._counts, busy_seconds=self._busy)
+        if not latencies:
+            return snapshot
+
+        def percentile(q):
+            return latencies[min(len(latencies) - 1, int(q * len(latencies)))]
+
+        snapshot.update(
+            mean_seconds=sum(latencies) / len(latencies),
+            p50_seconds=percentile(0.50),
+            p95_seconds=percentile(0.95),
+            p99_seconds=percentile(0.99),
+            max_seconds=latencies[-1])
+        return snapshot
+
+    async def close(self):
+        """Close the backend."""
+        await self.backend.close()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        await self.close()
+        return False
@@ -0,0 +1,270 @@
+#!/usr/bin/env python3
+"""Test connection_pool module"""
+import asyncio
+import os
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import threading
+import unittest
+from unittest.mock import AsyncMock, patch
+
+import connection_pool
+from connection_pool import (AsyncConnectionPool, ConnectionPool,
+                             PoolTimeoutError, configure_pool, get_pool,
+                             pool_stats)
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+# Both context managers borrowing from the loop's async pool
+EXIT_SCRIPT = """
+import asyncio
+import importlib
+
+from connection_pool import close_async_pools
+
+DatabaseConnection = importlib.import_module('0-databaseconnection').DatabaseConnection
+ExecuteQuery = importlib.import_module('1-execute').ExecuteQuery
+
+
+async def main(close):
+    async with ExecuteQuery('users.db', "INSERT INTO users VALUES (?, ?)",
+                            [(2, 'Bo'), (3, 'Cy')], many=True):
+        pass
+    async with DatabaseConnection('users.db') as cursor:
+        await cursor.execute("SELECT name FROM users ORDER BY id")
+        print(await cursor.fetchall())
+    async with ExecuteQuery('users.db', "SELECT COUNT(*) FROM users") as rows:
+        print(rows)
+    if close:
+        await close_async_pools()
+
+
+asyncio.run(main(close=%r))
+"""
+
+
+class PoolTestCase(unittest.TestCase):
+    """Base class with a scratch database file"""
+
+    def setUp(self):
+        """Create an empty database in a temporary directory"""
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.path = os.path.join(tmp.name, 'users.db')
+        sqlite3.connect(self.path).close()
+
+    def pool(self, **options):
+        """A ConnectionPool on the scratch database, closed after the test"""
+        pool = ConnectionPool(self.path, **options)
+        self.addCleanup(pool.close)
+        return pool
+
+
+class TestCheckout(PoolTestCase):
+    """Test ConnectionPool.acquire and release"""
+
+    def test_connection_reused(self):
+        """Test a released connection is handed out again"""
+        pool = self.pool(size=2)
+        conn = pool.acquire()
+        pool.release(conn)
+        self.assertIs(pool.acquire(), conn)
+        stats = pool.stats()
+        self.assertEqual((stats['created'], stats['checkouts'], stats['in_use']),
+                         (1, 2, 1))
+
+    def test_release_resets(self):
+        """Test uncommitted work is rolled back and counted as a reset"""
+        pool = self.pool(size=1)
+        conn = pool.acquire()
+        conn.execute("CREATE TABLE t (x)")
+        conn.commit()
+        conn.execute("INSERT INTO t VALUES (1)")
+        conn.row_factory = sqlite3.Row
+        pool.release(conn)
+        conn = pool.acquire()
+        self.assertIsNone(conn.row_factory)
+        self.assertEqual(conn.execute("SELECT COUNT(*) FROM t").fetchone(), (0,))
+        self.assertEqual(pool.stats()['resets'], 1)
+
+    def test_closed_connection_replaced(self):
+        """Test a connection closed by its user is replaced on release"""
+        pool = self.pool(size=1)
+        conn = pool.acquire()
+        conn.close()
+        pool.release(conn)
+        fresh = pool.acquire()
+        self.assertIsNot(fresh, conn)
+        self.assertEqual(pool.stats()['open'], 1)
+
+
+class TestMaxSize(PoolTestCase):
+    """Test a full pool makes callers wait"""
+
+    def test_waits_for_release(self):
+        """Test acquire blocks until another thread releases"""
+        pool = self.pool(size=1, timeout=5)
+        conn = pool.acquire()
+        timer = threading.Timer(0.05, pool.release, (conn,))
+        timer.start()
+        self.assertIs(pool.acquire(), conn)
+        timer.join()
+        self.assertEqual(pool.stats()['waits'], 1)
+
+    def test_timeout(self):
+        """Test acquire gives up after the pool's timeout"""
+        pool = self.pool(size=1, timeout=0.05)
+        pool.acquire()
+        with self.assertRaises(PoolTimeoutError):
+            pool.acquire()
+        stats = pool.stats()
+        self.assertEqual((stats['open'], stats['in_use'], stats['timeouts']),
+                         (1, 1, 1))
+
+
+class TestNamedPools(PoolTestCase):
+    """Test the registry of named pools"""
+
+    def setUp(self):
+        """Run each test against an empty registry"""
+        super().setUp()
+        patcher = patch.dict(connection_pool._pools, clear=True)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_get_pool(self):
+        """Test a name maps to one pool, on the database given at creation"""
+        pool = get_pool('main', self.path, size=2)
+        self.addCleanup(pool.close)
+        self.assertIs(get_pool('main', size=7), pool)
+        self.assertEqual((pool.database, pool.size), (self.path, 2))
+
+    def test_configure_pool(self):
+        """Test configure_pool replaces the pool and closes the old one"""
+        old = get_pool('main', self.path)
+        conn = old.acquire()
+        old.release(conn)
+        new = configure_pool('main', self.path, size=3)
+        self.addCleanup(new.close)
+        self.assertIsNot(new, old)
+        self.assertEqual(old.stats()['open'], 0)
+        self.assertEqual(pool_stats()['main']['size'], 3)
+
+
+class TestLeaks(PoolTestCase):
+    """Test a connection that is never released is noticed"""
+
+    def test_unreleased_connection(self):
+        """Test stats show it in use and a full pool times out naming the size"""
+        pool = self.pool(size=1, timeout=0.01)
+        pool.acquire()
+        self.assertEqual(pool.stats()['in_use'], 1)
+        with self.assertRaisesRegex(PoolTimeoutError, "pool size 1"):
+            pool.acquire()
+
+
+class TestAsyncPool(unittest.IsolatedAsyncioTestCase):
+    """Test AsyncConnectionPool"""
+
+    async def asyncSetUp(self):
+        """Create an empty database and a pool of two connections to it"""
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp.name, 'users.db')
+        sqlite3.connect(self.path).close()
+        self.pool = AsyncConnectionPool(self.path, size=2, timeout=5)
+
+    async def asyncTearDown(self):
+        """Close the pool and remove the database"""
+        await self.pool.close()
+        self.tmp.cleanup()
+
+    async def test_connection_reused(self):
+        """Test a released connection is handed out again"""
+        conn = await self.pool.acquire()
+        await self.pool.release(conn)
+        self.assertIs(await self.pool.acquire(), conn)
+        await self.pool.release(conn)
+        self.assertEqual(self.pool.stats()['created'], 1)
+
+    async def test_waits_for_release(self):
+        """Test acquire waits for a release once size connections are out"""
+        first = await self.pool.acquire()
+        second = await self.pool.acquire()
+        waiter = asyncio.ensure_future(self.pool.acquire())
+        await asyncio.sleep(0.01)
+        self.assertFalse(waiter.done())
+        await self.pool.release(first)
+        self.assertIs(await waiter, first)
+        await self.pool.release(first)
+        await self.pool.release(second)
+        self.assertEqual(self.pool.stats()['waits'], 1)
+
+    async def test_timeout(self):
+        """Test acquire gives up after the pool's timeout"""
+        self.pool.timeout = 0.01
+        held = [await self.pool.acquire(), await self.pool.acquire()]
+        with self.assertRaises(PoolTimeoutError):
+            await self.pool.acquire()
+        for conn in held:
+            await self.pool.release(conn)
+        self.assertEqual(self.pool.stats()['timeouts'], 1)
+
+    async def test_discard(self):
+        """Test a discarded connection is closed and replaced"""
+        conn = await self.pool.acquire()
+        await self.pool.release(conn, discard=True)
+        fresh = await self.pool.acquire()
+        self.assertIsNot(fresh, conn)
+        await self.pool.release(fresh)
+        self.assertEqual(self.pool.stats()['open'], 1)
+
+    async def test_failed_release_frees_slot(self):
+        """Test a connection whose rollback fails gives its slot back"""
+        conn = await self.pool.acquire()
+        await conn.execute("BEGIN")
+        with patch.object(conn, 'rollback', AsyncMock(side_effect=RuntimeError)):
+            with self.assertRaises(RuntimeError):
+                await self.pool.release(conn)
+        await conn.close()
+        stats = self.pool.stats()
+        self.assertEqual((stats['open'], stats['in_use']), (0, 0))
+
+
+class TestExitWithLoop(PoolTestCase):
+    """Test a program using the async pools exits once its loop is done"""
+
+    def run_script(self, close):
+        """Run EXIT_SCRIPT in a fresh interpreter next to users.db"""
+        conn = sqlite3.connect(self.path)
+        conn.execute("CREATE TABLE users (id INTEGER PRIMARY KEY, name TEXT)")
+        conn.execute("INSERT INTO users VALUES (1, 'Al')")
+        conn.commit()
+        conn.close()
+        env = dict(os.environ, PYTHONPATH=os.pathsep.join([HERE] + sys.path))
+        try:
+            return subprocess.run(
+                [sys.executable, '-c', EXIT_SCRIPT % close],
+                cwd=os.path.dirname(self.path), env=env,
+                capture_output=True, text=True, timeout=30)
+        except subprocess.TimeoutExpired:
+            self.fail("interpreter did not exit after asyncio.run()")
+
+    def test_pools_closed_with_loop(self):
+        """Test asyncio.run() alone closes the pools"""
+        result = self.run_script(close=False)
+        self.assertEqual(result.returncode, 0, result.stderr)
+        self.assertEqual(result.stdout.split('\n')[:2],
+                         ["[('Al',), ('Bo',), ('Cy',)]", "[(3,)]"])
+        self.assertNotIn("Traceback", result.stderr)
+
+    def test_closed_early(self):
+        """Test closing the pools before the loop ends is still fine"""
+        result = self.run_script(close=True)
+        self.assertEqual(result.returncode, 0, result.stderr)
+        self.assertNotIn("Traceback", result.stderr)
+
+
+if __name__ == '__main__':
+    unittest.main()
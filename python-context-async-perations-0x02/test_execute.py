@@ -0,0 +1,72 @@
+#!/usr/bin/env python3
+"""Test the ExecuteQuery context manager of 1-execute"""
+import importlib
+import os
+import sqlite3
+import tempfile
+import unittest
+
+ExecuteQuery = importlib.import_module('1-execute').ExecuteQuery
+
+INSERT = "INSERT INTO users VALUES (?, ?)"
+# The second row repeats the first one's key
+DUPLICATE_ROWS = [(1, 'Al'), (2, 'Bo'), (1, 'Cy')]
+
+
+class ExecuteTestCase(unittest.TestCase):
+    """Base class with an empty users table"""
+
+    def setUp(self):
+        """Create the table in a temporary directory"""
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.path = os.path.join(tmp.name, 'users.db')
+        conn = sqlite3.connect(self.path)
+        conn.execute("CREATE TABLE users (id INTEGER PRIMARY KEY, name TEXT)")
+        conn.close()
+
+    def assert_writable(self):
+        """Write from another connection without waiting for a lock"""
+        writer = sqlite3.connect(self.path, timeout=0)
+        try:
+            writer.execute("INSERT INTO users VALUES (9, 'Zed')")
+            writer.commit()
+            return writer.execute("SELECT id FROM users ORDER BY id").fetchall()
+        finally:
+            writer.close()
+
+
+class TestBulkWrite(ExecuteTestCase):
+    """Test ExecuteQuery with many=True"""
+
+    def test_commits(self):
+        """Test a clean bulk write is committed and returns the row count"""
+        with ExecuteQuery(self.path, INSERT, [(1, 'Al'), (2, 'Bo')], many=True) as count:
+            self.assertEqual(count, 2)
+        self.assertEqual(self.assert_writable(), [(1,), (2,), (9,)])
+
+    def test_failure_rolls_back(self):
+        """Test a failed bulk write is rolled back and leaves the file writable"""
+        query = ExecuteQuery(self.path, INSERT, DUPLICATE_ROWS, many=True)
+        with self.assertRaises(sqlite3.IntegrityError):
+            with query:
+                self.fail("body ran although executemany failed")
+        self.assertIsNone(query.conn)
+        self.assertEqual(self.assert_writable(), [(9,)])
+
+
+class TestAsyncBulkWrite(unittest.IsolatedAsyncioTestCase, ExecuteTestCase):
+    """Test async with ExecuteQuery with many=True"""
+
+    async def test_failure_rolls_back(self):
+        """Test a failed bulk write is rolled back and leaves the file writable"""
+        query = ExecuteQuery(self.path, INSERT, DUPLICATE_ROWS, many=True)
+        with self.assertRaises(sqlite3.IntegrityError):
+            async with query:
+                self.fail("body ran although executemany failed")
+        self.assertIsNone(query.conn)
+        self.assertEqual(self.assert_writable(), [(9,)])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,54 @@
+#!/usr/bin/env python3
+"""Test process_backend module"""
+import os
+import sqlite3
+import tempfile
+import unittest
+
+from process_backend import ProcessBackend
+
+
+class TestProcessBackend(unittest.IsolatedAsyncioTestCase):
+    """Test ProcessBackend against a small users table"""
+
+    def setUp(self):
+        """Create the table in a rollback-journal database"""
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.path = os.path.join(tmp.name, 'users.db')
+        conn = sqlite3.connect(self.path)
+        conn.execute("CREATE TABLE users (id INTEGER PRIMARY KEY, age INTEGER)")
+        conn.executemany("INSERT INTO users VALUES (?, ?)", [(1, 30), (2, 50)])
+        conn.commit()
+        conn.close()
+
+    def journal_mode(self):
+        """The database's journal mode"""
+        conn = sqlite3.connect(self.path)
+        try:
+            return conn.execute("PRAGMA journal_mode").fetchone()[0]
+        finally:
+            conn.close()
+
+    def test_requires_wal(self):
+        """Test a database not in WAL mode is refused and left as it was"""
+        with self.assertRaisesRegex(ValueError, "WAL"):
+            ProcessBackend(self.path, workers=1)
+        self.assertEqual(self.journal_mode(), 'delete')
+
+    async def test_fetchall(self):
+        """Test rows come back from the workers as tuples"""
+        conn = sqlite3.connect(self.path)
+        conn.execute("PRAGMA journal_mode = WAL")
+        conn.close()
+        backend = ProcessBackend(self.path, workers=1)
+        try:
+            rows = await backend.fetchall("SELECT * FROM users WHERE age > ?", (40,))
+            self.assertEqual(rows, [(2, 50)])
+            self.assertEqual(await backend.fetchall("SELECT * FROM users WHERE 0"), [])
+        finally:
+            await backend.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,61 @@
+#!/usr/bin/env python3
+"""Test query_executor module and the helpers of 3-concurrent"""
+import importlib
+import os
+import sqlite3
+import tempfile
+import unittest
+
+from connection_pool import get_async_pool
+from query_executor import QueryExecutor
+
+concurrent = importlib.import_module('3-concurrent')
+
+
+class ExecutorTestCase(unittest.IsolatedAsyncioTestCase):
+    """Base class running in a directory holding a users.db"""
+
+    def setUp(self):
+        """Create users.db in a temporary working directory"""
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.addCleanup(os.chdir, os.getcwd())
+        os.chdir(tmp.name)
+        conn = sqlite3.connect('users.db')
+        conn.execute("CREATE TABLE users (id INTEGER PRIMARY KEY, age INTEGER)")
+        conn.executemany("INSERT INTO users VALUES (?, ?)", [(1, 30), (2, 50)])
+        conn.commit()
+        conn.close()
+
+
+class TestQueryExecutor(ExecutorTestCase):
+    """Test QueryExecutor"""
+
+    async def test_latency_samples_bounded(self):
+        """Test only the last latency_samples latencies are kept"""
+        async with QueryExecutor('users.db', latency_samples=3) as executor:
+            await executor.run(["SELECT 1"] * 5)
+            self.assertEqual(len(executor._latencies), 3)
+            self.assertEqual(executor.stats()['queries'], 5)
+
+
+class TestHelpers(ExecutorTestCase):
+    """Test the 3-concurrent helpers reuse pooled connections"""
+
+    async def test_shared_pool(self):
+        """Test calls without an executor share the loop's pool"""
+        self.assertEqual(await concurrent.async_fetch_users(), [(1, 30), (2, 50)])
+        self.assertEqual(await concurrent.async_fetch_older_users(), [(2, 50)])
+        self.assertEqual(get_async_pool('users.db').stats()['created'], 1)
+
+    async def test_executor(self):
+        """Test calls given an executor run on its connections"""
+        async with QueryExecutor('users.db') as executor:
+            await concurrent.async_fetch_users(executor)
+            await concurrent.async_fetch_older_users(executor)
+            self.assertEqual(executor.stats()['queries'], 2)
+            self.assertEqual(executor.backend._get_pool().stats()['created'], 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
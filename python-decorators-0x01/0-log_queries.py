@@ -1,45 +1,84 @@
-import sqlite3
 import functools
-from datetime import datetime
+import logging
+import random
+import time
+import query_log
+from connection_pool import with_db_connection
+from statements import registry
 
-def log_queries(func):
+def log_queries(func=None, *, sample_rate=1.0, slow_ms=100.0):
     """
-    Decorator that logs SQL queries before executing them.
+    Decorator that logs SQL queries as structured records.
+
+    Each record holds the query fingerprint, a hash of its params, the
+    duration, the number of rows returned and the outcome. Records go
+    through a background queue (see query_log), so the query path does not
+    block on output.
     
     Args:
         func: The function to be decorated (in this case, fetch_all_users)
+        sample_rate: Fraction of ordinary queries to log (0.0 - 1.0)
+        slow_ms: Queries at least this slow, and failed queries, are
+                 always logged regardless of sampling
     
     Returns:
-        A wrapped function that logs the query before executing it
+        A wrapped function that logs the query it executes
     """
+    if func is None:
+        return functools.partial(log_queries, sample_rate=sample_rate, slow_ms=slow_ms)
+
     @functools.wraps(func)
-    def wrapper(*args, **kwargs):# Check if 'query' is in kwargs (keyword arguments)
-        if 'query' in kwargs:
-            print(f"Executing query: {kwargs['query']}")# Alternatively, check if query is passed as first positional argument
-        elif args and len(args) > 0:
-            print(f"Executing query: {args[0]}")
-        
-        # Call the original function with all its arguments
-        return func(*args, **kwargs)
+    def wrapper(*args, **kwargs):
+        # Check if 'query' is in kwargs, else take the first positional argument
+        query = kwargs.get('query') or (args[0] if args else None)
+        if not isinstance(query, str):
+            return func(*args, **kwargs)
+
+        started = time.perf_counter()
+        outcome = 'ok'
+        rows = None
+        try:
+            result = func(*args, **kwargs)
+            if isinstance(result, list):
+                rows = len(result)
+            elif result is not None:
+                rows = 1
+            else:
+                rows = 0
+            return result
+        except Exception as e:
+            outcome = type(e).__name__
+            raise
+        finally:
+            duration_ms = (time.perf_counter() - started) * 1000
+            slow = duration_ms >= slow_ms
+            if outcome != 'ok' or slow or random.random() < sample_rate:
+                query_log.emit({
+                    'event': 'query',
+                    'function': func.__qualname__,
+                    'fingerprint': query_log.fingerprint(query),
+                    'params_hash': query_log.params_hash(kwargs.get('params')),
+                    'duration_ms': round(duration_ms, 3),
+                    'rows': rows,
+                    'outcome': outcome,
+                    'slow': slow,
+                }, logging.WARNING if slow or outcome != 'ok' else logging.INFO)
     return wrapper
 
 @log_queries
-def fetch_all_users(query):
+@with_db_connection
+def fetch_all_users(query, conn=None):
     """
     Fetches all users from the database by executing the given query.
     
     Args:
         query: SQL query string to execute
+        conn: Pooled database connection (injected by decorator)
         
     Returns:
         List of tuples containing user data
     """
-    conn = sqlite3.connect('users.db')
-    cursor = conn.cursor()
-    cursor.execute(query)
-    results = cursor.fetchall()
-    conn.close()
-    return results
+    return registry.statement(query).fetchall(conn)
 
 # Fetch users while logging the query
 users = fetch_all_users(query="SELECT * FROM users")
\ No newline at end of file
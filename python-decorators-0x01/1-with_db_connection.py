@@ -1,34 +1,13 @@
-import sqlite3
-import functools
+# The decorator is shared by every module in this directory and lends out
+# connections from a pool instead of opening one per call
+from connection_pool import with_db_connection
+from metrics import instrument
+from statements import registry
 
-def with_db_connection(func):
-    """
-    Decorator that handles database connection lifecycle.
-    
-    Opens a connection, passes it to the function, and ensures it's closed.
-    
-    Args:
-        func: The function to be decorated (in this case, get_user_by_id)
-    
-    Returns:
-        A wrapped function that manages the database connection
-    """
-    @functools.wraps(func)
-    def wrapper(*args, **kwargs):
-        # Open a new database connection
-        conn = sqlite3.connect('users.db')
-        try:
-            # Add the connection to the function's keyword arguments
-            kwargs['conn'] = conn
-            # Execute the function with all arguments
-            result = func(*args, **kwargs)
-            return result
-        finally:
-            # Ensure connection is closed even if an error occurs
-            conn.close()
-    return wrapper
+GET_USER_BY_ID = registry.register('get_user_by_id', "SELECT * FROM users WHERE id = ?")
 
 @with_db_connection
+@instrument
 def get_user_by_id(user_id, conn=None):
     """
     Fetches a user by their ID using the provided database connection.
@@ -40,9 +19,7 @@ def get_user_by_id(user_id, conn=None):
     Returns:
         A tuple containing user data or None if not found
     """
-    cursor = conn.cursor()
-    cursor.execute("SELECT * FROM users WHERE id = ?", (user_id,))
-    return cursor.fetchone()
+    return GET_USER_BY_ID.fetchone(conn, (user_id,))
 
 # Fetch user by ID with automatic connection handling
 user = get_user_by_id(user_id=1)
@@ -1,18 +1,129 @@
-import sqlite3
 import functools
+import inspect
+import time
+from contextlib import contextmanager
+from connection_pool import bound_connection, with_db_connection
+import metrics
+import query_cache
+from sql_utils import (async_database_of, async_trace_statements, database_of,
+                       tables_written, trace_statements)
 
-# Reusing the connection decorator from previous tasks
-def with_db_connection(func):
-    """Handles opening/closing database connections."""
-    @functools.wraps(func)
-    def wrapper(*args, **kwargs):
-        conn = sqlite3.connect('users.db')
+# id(connection) -> the GroupCommit batching writes on it
+_batches = {}
+
+
+class GroupCommit:
+    """
+    A batch of transactional calls sharing one database transaction.
+
+    Each call runs inside its own savepoint, so a failing call is undone
+    without losing the rest of the batch. The transaction is committed
+    every `every` calls, every `interval_ms` milliseconds (checked after
+    each call), and when the batch ends.
+    """
+
+    def __init__(self, conn, every=None, interval_ms=None):
+        self.conn = conn
+        self.every = every
+        self.interval_ms = interval_ms
+        self.operations = 0
+        self.failed = 0
+        self.commits = 0
+        self._pending = 0
+        self._written = set()
+        self._started = time.monotonic()
+
+    def run(self, func, args, kwargs):
+        """Run one call inside a savepoint of the batch transaction."""
+        if not self.conn.in_transaction:
+            self.conn.execute("BEGIN")
+            self._started = time.monotonic()
+        self.conn.execute("SAVEPOINT group_commit_item")
         try:
-            kwargs['conn'] = conn
-            return func(*args, **kwargs)
+            with trace_statements(self.conn) as statements:
+                result = func(*args, **kwargs)
+        except Exception as e:
+            self.conn.execute("ROLLBACK TO group_commit_item")
+            self.conn.execute("RELEASE group_commit_item")
+            self.failed += 1
+            # Only this call is undone; the batch transaction goes on
+            metrics.registry.record_transaction('savepoint_rollback')
+            print(f"Operation rolled back to its savepoint due to: {e}")
+            raise
+        self.conn.execute("RELEASE group_commit_item")
+        self.operations += 1
+        self._pending += 1
+        for statement in statements:
+            self._written |= tables_written(statement)
+        if self._due():
+            self.flush()
+        return result
+
+    def _due(self):
+        if self.every is not None and self._pending >= self.every:
+            return True
+        if self.interval_ms is not None:
+            return (time.monotonic() - self._started) * 1000 >= self.interval_ms
+        return False
+
+    def flush(self):
+        """Commit the calls made so far."""
+        if self.conn.in_transaction:
+            self.conn.commit()
+        if self._pending:
+            self.commits += 1
+            metrics.registry.record_transaction('commit')
+            print(f"Group commit: {self._pending} operation(s) committed.")
+        if self._written:
+            query_cache.cache.invalidate(database_of(self.conn), self._written)
+        self._pending = 0
+        self._written = set()
+
+    def rollback(self):
+        """Drop the calls made since the last commit."""
+        if self.conn.in_transaction:
+            self.conn.rollback()
+        if self._pending:
+            metrics.registry.record_transaction('rollback')
+            print(f"Group commit: {self._pending} operation(s) rolled back.")
+        self._pending = 0
+        self._written = set()
+
+
+@contextmanager
+def group_commit(database='users.db', every=None, interval_ms=None):
+    """
+    Batch the @transactional calls made inside the block into few commits.
+
+    The block pins one pooled connection to the thread, so every
+    @with_db_connection @transactional call in it writes through the same
+    transaction. Pending work is committed when the block exits normally
+    and rolled back if it raises. Nested blocks join the outer batch.
+
+    Args:
+        database (str): Database file the batched calls use (default: users.db).
+        every (int): Commit after this many successful calls (default: only at the end).
+        interval_ms (float): Commit once this many milliseconds have passed
+            since the batch transaction began (default: only at the end).
+
+    Yields:
+        GroupCommit: The batch, with operations/failed/commits counters
+    """
+    with bound_connection(database) as conn:
+        batch = _batches.get(id(conn))
+        if batch is not None:
+            yield batch
+            return
+        batch = _batches[id(conn)] = GroupCommit(conn, every, interval_ms)
+        try:
+            yield batch
+        except BaseException:
+            batch.rollback()
+            raise
+        else:
+            batch.flush()
         finally:
-            conn.close()
-    return wrapper
+            del _batches[id(conn)]
 
 
 def transactional(func):
@@ -20,20 +131,64 @@ def transactional(func):
     Decorator that manages database transactions:
     - Commits on success.
     - Rolls back on failure.
+    - After a commit, drops cached query results that read from any
+      table the transaction wrote to.
+    - Inside a group_commit() block, runs in a savepoint of the shared
+      batch transaction instead of committing on its own.
+    - Coroutine functions are awaited and their aiosqlite connection is
+      committed or rolled back asynchronously.
     """
+    if inspect.iscoroutinefunction(func):
+        @functools.wraps(func)
+        async def async_wrapper(*args, **kwargs):
+            conn = kwargs.get('conn')
+            if not conn:
+                raise ValueError("No database connection provided.")
+
+            try:
+                async with async_trace_statements(conn) as statements:
+                    result = await func(*args, **kwargs)
+                await conn.commit()
+                metrics.registry.record_transaction('commit')
+                print("Transaction committed.")
+                written = set()
+                for statement in statements:
+                    written |= tables_written(statement)
+                if written:
+                    query_cache.cache.invalidate(await async_database_of(conn), written)
+                return result
+            except Exception as e:
+                await conn.rollback()
+                metrics.registry.record_transaction('rollback')
+                print(f"Transaction rolled back due to: {e}")
+                raise
+        return async_wrapper
+
     @functools.wraps(func)
     def wrapper(*args, **kwargs):
         conn = kwargs.get('conn')
         if not conn:
             raise ValueError("No database connection provided.")
-        
+
+        batch = _batches.get(id(conn))
+        if batch is not None:
+            return batch.run(func, args, kwargs)
+
         try:
-            result = func(*args, **kwargs)  # Execute the function
+            with trace_statements(conn) as statements:
+                result = func(*args, **kwargs)  # Execute the function
             conn.commit()  # Commit if successful
+            metrics.registry.record_transaction('commit')
             print("Transaction committed.")
+            written = set()
+            for statement in statements:
+                written |= tables_written(statement)
+            if written:
+                query_cache.cache.invalidate(database_of(conn), written)
             return result
         except Exception as e:
             conn.rollback()  # Roll back on error
+            metrics.registry.record_transaction('rollback')
             print(f"Transaction rolled back due to: {e}")
             raise  # Re-raise the exception
     return wrapper
@@ -41,6 +196,7 @@ def transactional(func):
 
 @with_db_connection
 @transactional
+@metrics.instrument
 def update_user_email(conn, user_id, new_email):
     """Updates a user's email within a transaction."""
     cursor = conn.cursor()
@@ -49,4 +205,10 @@ def update_user_email(conn, user_id, new_email):
 
 
 # Example usage
-update_user_email(user_id=1, new_email='Crawford_Cartwright@hotmail.com')
\ No newline at end of file
+if __name__ == "__main__":
+    update_user_email(user_id=1, new_email='Crawford_Cartwright@hotmail.com')
+
+    # Many updates, one commit per 500 of them
+    with group_commit(every=500):
+        for user_id in range(1, 1001):
+            update_user_email(user_id=user_id, new_email=f'user{user_id}@example.com')
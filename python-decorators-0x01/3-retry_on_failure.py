@@ -1,61 +1,221 @@
-import time
-import sqlite3
+import asyncio
 import functools
+import inspect
+import random
+import sqlite3
+import threading
+import time
+from connection_pool import PoolTimeoutError, with_db_connection
+import metrics
+from statements import registry
+
+FETCH_ALL_USERS = registry.register('fetch_all_users', "SELECT * FROM users")
+
+# sqlite3.OperationalError messages that mean "try again later"
+TRANSIENT_MESSAGES = (
+    'database is locked',
+    'database table is locked',
+    'database schema has changed',
+    'unable to open database file',
+)
+
+
+def is_transient(exc):
+    """
+    Tell whether an exception is worth retrying.
+
+    Lock and busy errors, pool timeouts and connection errors are transient.
+    Syntax errors, missing tables and constraint violations are not, since
+    running the same statement again fails the same way.
+    """
+    if isinstance(exc, (PoolTimeoutError, TimeoutError, ConnectionError)):
+        return True
+    if isinstance(exc, sqlite3.OperationalError):
+        message = str(exc).lower()
+        return any(text in message for text in TRANSIENT_MESSAGES)
+    return False
+
+
+class CircuitOpenError(RuntimeError):
+    """Raised instead of calling the function while its circuit is open."""
+
+
+class RetryBudget:
+    """
+    Cap on retries as a fraction of calls, shared between functions.
+
+    Every call deposits `ratio` tokens (up to `max_tokens`) and every retry
+    spends one. Once the bucket is empty failures are raised right away, so
+    a struggling database sees about (1 + ratio) times its normal load
+    instead of `retries` times.
+    """
+
+    def __init__(self, ratio=0.2, max_tokens=10.0):
+        self.ratio = ratio
+        self.max_tokens = max_tokens
+        self._tokens = max_tokens
+        self._lock = threading.Lock()
+
+    def deposit(self):
+        with self._lock:
+            self._tokens = min(self.max_tokens, self._tokens + self.ratio)
 
-# Reusing the connection decorator from previous task
-def with_db_connection(func):
-    """Handles opening/closing database connections automatically."""
-    @functools.wraps(func)
-    def wrapper(*args, **kwargs):
-        conn = sqlite3.connect('users.db')
-        try:
-            kwargs['conn'] = conn
-            return func(*args, **kwargs)
-        finally:
-            conn.close()
-    return wrapper
+    def withdraw(self):
+        """Take one retry token; False if the budget is spent."""
+        with self._lock:
+            if self._tokens < 1:
+                return False
+            self._tokens -= 1
+            return True
 
 
-def retry_on_failure(retries=3, delay=2):
+class CircuitBreaker:
     """
-    Decorator that retries a function if it raises an exception.
-    
+    Fail fast after repeated failed calls.
+
+    Once `failure_threshold` calls in a row have failed (retries included),
+    calls raise CircuitOpenError for `cooldown` seconds. After the cooldown
+    the circuit is half-open: one call goes through as a trial while the
+    others keep failing fast, until the trial's outcome closes the circuit
+    or opens it for another cooldown. A trial that never reports back
+    frees its slot after one more cooldown.
+    """
+
+    def __init__(self, failure_threshold=5, cooldown=30.0):
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self._failures = 0
+        self._opened_at = None
+        self._half_open = False
+        self._lock = threading.Lock()
+
+    def before_call(self):
+        with self._lock:
+            if self._opened_at is None:
+                return
+            now = time.monotonic()
+            if now - self._opened_at < self.cooldown:
+                if self._half_open:
+                    raise CircuitOpenError("Circuit half-open; waiting on a trial call")
+                raise CircuitOpenError(
+                    f"Circuit open after {self._failures} consecutive failures")
+            # Half-open: let this call through as the trial
+            self._half_open = True
+            self._opened_at = now
+
+    def record(self, success):
+        with self._lock:
+            if success:
+                self._failures = 0
+                self._opened_at = None
+                self._half_open = False
+                return
+            self._failures += 1
+            if self._half_open or self._failures >= self.failure_threshold:
+                self._opened_at = time.monotonic()
+                self._half_open = False
+
+
+# Shared by every retry_on_failure wrapper that is not given its own budget
+retry_budget = RetryBudget()
+
+
+def retry_on_failure(retries=3, delay=2, max_delay=30, retry_on=is_transient,
+                     budget=None, breaker=None):
+    """
+    Decorator that retries a function if it raises a transient exception.
+
+    Waits grow exponentially with full jitter: before retry n it sleeps a
+    random time between 0 and min(max_delay, delay * 2**(n - 1)), so callers
+    that failed together do not come back together. Coroutine functions get
+    an async wrapper that awaits asyncio.sleep instead of blocking the loop.
+
+    Only failures that retry_on accepts count against the circuit breaker:
+    a permanent error means the database did answer.
+
     Args:
-        retries (int): Max number of retry attempts (default: 3).
-        delay (int): Seconds to wait between retries (default: 2).
+        retries (int): Max number of attempts, at least 1 (default: 3).
+        delay (float): Base backoff in seconds (default: 2).
+        max_delay (float): Longest single backoff in seconds (default: 30).
+        retry_on (callable): Decides which exceptions to retry (default: is_transient).
+        budget (RetryBudget): Budget to draw retries from (default: retry_budget).
+        breaker (CircuitBreaker): Optional circuit breaker for this function.
     """
+    if retries < 1:
+        raise ValueError("retries must be a positive integer")
+
     def decorator(func):
+        def next_wait(attempt):
+            """Seconds to wait before retrying a transient error, or None to give up."""
+            if attempt >= retries:
+                return None
+            if not (budget or retry_budget).withdraw():
+                return None
+            wait = random.uniform(0, min(max_delay, delay * 2 ** (attempt - 1)))
+            metrics.registry.record_retry(func.__qualname__)
+            print(f"Attempt {attempt} failed. Retrying in {wait:.2f} seconds...")
+            return wait
+
+        def start_call():
+            if breaker:
+                breaker.before_call()
+            (budget or retry_budget).deposit()
+
+        def finish_call(success):
+            if breaker:
+                breaker.record(success)
+
+        if inspect.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                start_call()
+                for attempt in range(1, retries + 1):
+                    try:
+                        result = await func(*args, **kwargs)
+                    except Exception as e:
+                        transient = retry_on(e)
+                        wait = next_wait(attempt) if transient else None
+                        if wait is None:
+                            finish_call(not transient)
+                            raise
+                        await asyncio.sleep(wait)
+                    else:
+                        finish_call(True)
+                        return result
+            return async_wrapper
+
         @functools.wraps(func)
         def wrapper(*args, **kwargs):
-            last_exception = None
-            
+            start_call()
             for attempt in range(1, retries + 1):
                 try:
                     # Attempt to execute the function
-                    return func(*args, **kwargs)
-                
+                    result = func(*args, **kwargs)
                 except Exception as e:
-                    last_exception = e
-                    if attempt < retries:
-                        print(f"Attempt {attempt} failed. Retrying in {delay} seconds...")
-                        time.sleep(delay)
-            
-            # If all retries fail, raise the last exception
-            raise last_exception
-        
+                    # Permanent error, last attempt or no budget left: re-raise
+                    transient = retry_on(e)
+                    wait = next_wait(attempt) if transient else None
+                    if wait is None:
+                        finish_call(not transient)
+                        raise
+                    time.sleep(wait)
+                else:
+                    finish_call(True)
+                    return result
+
         return wrapper
     return decorator
 
 
 @with_db_connection
 @retry_on_failure(retries=3, delay=1)
+@metrics.instrument
 def fetch_users_with_retry(conn):
     """Fetches all users from the database with automatic retry on failure."""
-    cursor = conn.cursor()
-    cursor.execute("SELECT * FROM users")
-    return cursor.fetchall()
+    return FETCH_ALL_USERS.fetchall(conn)
 
 
 # Example usage
-users = fetch_users_with_retry()
-print(users)
\ No newline at end of file
+if __name__ == "__main__":
+    users = fetch_users_with_retry()
+    print(users)
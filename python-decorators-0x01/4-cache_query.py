@@ -1,49 +1,117 @@
-import time
-import sqlite3
 import functools
+import inspect
+from connection_pool import get_async_pool, get_pool, with_db_connection
 
-# Global dictionary to store cached queries
-query_cache = {}
+import metrics
+import query_cache
+from sql_utils import async_database_of, database_of, tables_read
 
-def cache_query(func):
+
+def _freeze(value):
+    """Turn call arguments into a hashable cache-key component."""
+    if isinstance(value, dict):
+        return tuple(sorted((k, _freeze(v)) for k, v in value.items()))
+    if isinstance(value, (list, tuple)):
+        return tuple(_freeze(item) for item in value)
+    return value
+
+
+def cache_query(func=None, *, ttl=None, stale_ttl=0.0, cache=None):
     """
     Decorator that caches database query results.
-    - Uses the SQL query as the cache key.
-    - Returns cached results if available.
+    - Keys on the database file, the query and every other argument,
+      so the same query with different params is cached separately.
+    - Returns cached results until they expire after `ttl` seconds, are
+      evicted by the cache's size limits, or a @transactional write
+      touches one of the tables the query reads.
+    - Concurrent misses on the same key run the query once; the other
+      callers wait for its result.
+    - With stale_ttl, an expired result keeps being returned for up to
+      that many seconds while one background thread refreshes it on its
+      own connection.
+    - Coroutine functions are cached too: concurrent tasks share one
+      computation and stale entries are refreshed by a background task.
+
+    Can be used bare (@cache_query) or configured (@cache_query(ttl=60)).
     """
-    @functools.wraps(func)
-    def wrapper(*args, **kwargs):
-        # Extract the query from kwargs (or args if needed)
+    if func is None:
+        return lambda f: cache_query(f, ttl=ttl, stale_ttl=stale_ttl, cache=cache)
+
+    def call_parts(args, kwargs):
+        # Extract the connection and query from kwargs (or args if needed)
+        conn = kwargs.get('conn') or (args[0] if args else None)
         query = kwargs.get('query') or (args[1] if len(args) > 1 else None)
-        
-        if query not in query_cache:
-            # If not cached, execute the query and store the result
-            result = func(*args, **kwargs)
-            query_cache[query] = result
+        call_args = tuple(arg for arg in args if arg is not conn)
+        call_kwargs = {k: v for k, v in kwargs.items() if k != 'conn'}
+        return conn, query, (func.__qualname__, _freeze(call_args), _freeze(call_kwargs))
+
+    def report(status):
+        metrics.registry.record_cache(func.__qualname__, status)
+        if status == 'miss':
             print("Query executed and cached.")
         else:
             print("Returning cached result.")
-        
-        return query_cache[query]
-    return wrapper
 
+    if inspect.iscoroutinefunction(func):
+        @functools.wraps(func)
+        async def async_wrapper(*args, **kwargs):
+            store = cache if cache is not None else query_cache.cache
+            conn, query, call_key = call_parts(args, kwargs)
+            if conn is None or query is None:
+                return await func(*args, **kwargs)
+            database = await async_database_of(conn)
+
+            async def refresh():
+                pool = get_async_pool(database)
+                fresh = await pool.acquire()
+                try:
+                    if 'conn' in kwargs:
+                        return await func(*args, **{**kwargs, 'conn': fresh})
+                    return await func(fresh, *args[1:], **kwargs)
+                finally:
+                    await pool.release(fresh)
+
+            result, status = await store.get_or_compute_async(
+                (database,) + call_key, lambda: func(*args, **kwargs),
+                tables=tables_read(query), ttl=ttl, stale_ttl=stale_ttl,
+                refresh=refresh if stale_ttl else None)
+            report(status)
+            return result
+        return async_wrapper
 
-# Reusing the connection decorator from previous tasks
-def with_db_connection(func):
-    """Handles opening/closing database connections."""
     @functools.wraps(func)
     def wrapper(*args, **kwargs):
-        conn = sqlite3.connect('users.db')
-        try:
-            kwargs['conn'] = conn
+        store = cache if cache is not None else query_cache.cache
+        conn, query, call_key = call_parts(args, kwargs)
+        if conn is None or query is None:
             return func(*args, **kwargs)
-        finally:
-            conn.close()
+
+        database = database_of(conn)
+        key = (database,) + call_key
+
+        def refresh():
+            # The caller's connection is back in its pool by then; borrow one
+            pool = get_pool(database)
+            fresh = pool.acquire()
+            try:
+                if 'conn' in kwargs:
+                    return func(*args, **{**kwargs, 'conn': fresh})
+                return func(fresh, *args[1:], **kwargs)
+            finally:
+                pool.release(fresh)
+
+        # If not cached, execute the query (once) and store the result
+        result, status = store.get_or_compute(
+            key, lambda: func(*args, **kwargs), tables=tables_read(query),
+            ttl=ttl, stale_ttl=stale_ttl, refresh=refresh if stale_ttl else None)
+        report(status)
+        return result
     return wrapper
 
 
 @with_db_connection
 @cache_query
+@metrics.instrument
 def fetch_users_with_cache(conn, query):
     """Fetches users from the database (with caching)."""
     cursor = conn.cursor()
@@ -52,8 +120,12 @@ def fetch_users_with_cache(conn, query):
 
 
 # Example usage
-print("First call (executes query):")
-users = fetch_users_with_cache(query="SELECT * FROM users")
+if __name__ == "__main__":
+    print("First call (executes query):")
+    users = fetch_users_with_cache(query="SELECT * FROM users")
+
+    print("\nSecond call (uses cache):")
+    users_again = fetch_users_with_cache(query="SELECT * FROM users")
 
-print("\nSecond call (uses cache):")
-users_again = fetch_users_with_cache(query="SELECT * FROM users")
\ No newline at end of file
+    # One query timed (the miss), one hit and one miss counted
+    print(metrics.registry.to_prometheus())
\ No newline at end of file
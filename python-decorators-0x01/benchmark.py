@@ -0,0 +1,247 @@
+#!/usr/bin/env python3
+"""
+Benchmarks for the database decorators.
+
+    python3 benchmark.py stampede --threads 64
+    python3 benchmark.py group-commit --updates 2000
+    python3 benchmark.py profiles --database users.db --seconds 3
+"""
+import argparse
+import contextlib
+import importlib
+import io
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+
+import query_cache
+import sqlite_profile
+from connection_pool import configure_pool, with_db_connection
+
+cache_query_module = importlib.import_module('4-cache_query')
+transactional_module = importlib.import_module('2-transactional')
+
+
+def _make_users_db(path, rows=10_000):
+    """Create a users table like users.db at path."""
+    conn = sqlite3.connect(path)
+    conn.execute("CREATE TABLE users (id INTEGER PRIMARY KEY, name TEXT, "
+                 "email TEXT, age INTEGER)")
+    conn.executemany("INSERT INTO users VALUES (?, ?, ?, ?)",
+                     [(i, f"User {i}", f"user{i}@example.com", 18 + i % 80)
+                      for i in range(1, rows + 1)])
+    conn.commit()
+    conn.close()
+
+
+def bench_stampede(threads, ttl, query_delay):
+    """
+    Hammer one cached query from many threads at once.
+
+    Counts how often the query really runs on a cold miss and after the
+    entry expires, where stale-while-revalidate should refresh it once.
+    """
+    executions = 0
+    count_lock = threading.Lock()
+    cache = query_cache.QueryCache()
+
+    @cache_query_module.cache_query(ttl=ttl, stale_ttl=60, cache=cache)
+    def fetch(conn, query):
+        nonlocal executions
+        with count_lock:
+            executions += 1
+        time.sleep(query_delay)  # make the race window wide
+        return conn.execute(query).fetchall()
+
+    def storm(path):
+        barrier = threading.Barrier(threads)
+
+        def worker():
+            conn = sqlite3.connect(path)
+            try:
+                barrier.wait()
+                fetch(conn, query="SELECT * FROM users WHERE age > 40")
+            finally:
+                conn.close()
+
+        workers = [threading.Thread(target=worker) for _ in range(threads)]
+        started = time.perf_counter()
+        for worker_thread in workers:
+            worker_thread.start()
+        for worker_thread in workers:
+            worker_thread.join()
+        return time.perf_counter() - started
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'users.db')
+        _make_users_db(path)
+        with contextlib.redirect_stdout(io.StringIO()):
+            cold = storm(path)
+            cold_executions = executions
+            time.sleep(ttl)
+            stale = storm(path)
+            # Let the background refresh finish before counting
+            deadline = time.monotonic() + 10
+            while executions == cold_executions and time.monotonic() < deadline:
+                time.sleep(0.01)
+
+    print(f"{threads} threads, cold miss:  {cold_executions} execution(s) "
+          f"in {cold * 1000:.1f} ms")
+    print(f"{threads} threads, expired:    {executions - cold_executions} "
+          f"refresh execution(s), callers served stale in {stale * 1000:.1f} ms")
+    print(f"cache stats: {cache.stats()}")
+    return {'cold_executions': cold_executions,
+            'refresh_executions': executions - cold_executions}
+
+
+def bench_group_commit(updates, every):
+    """
+    Time email updates committed one by one against group commit.
+
+    Uses SQLite's default rollback journal, so every commit pays for a sync.
+    """
+    transactional = transactional_module.transactional
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'users.db')
+        _make_users_db(path, rows=updates)
+        configure_pool(path, profile='default')
+
+        @with_db_connection(database=path)
+        @transactional
+        def update_email(conn, user_id, new_email):
+            conn.execute("UPDATE users SET email = ? WHERE id = ?", (new_email, user_id))
+
+        results = {}
+        with contextlib.redirect_stdout(io.StringIO()):
+            started = time.perf_counter()
+            for user_id in range(1, updates + 1):
+                update_email(user_id=user_id, new_email=f"a{user_id}@example.com")
+            results['per-call'] = time.perf_counter() - started
+
+            started = time.perf_counter()
+            with transactional_module.group_commit(path, every=every) as batch:
+                for user_id in range(1, updates + 1):
+                    update_email(user_id=user_id, new_email=f"b{user_id}@example.com")
+            results['group'] = time.perf_counter() - started
+        configure_pool(path, profile='default').close()
+
+    for mode, elapsed in results.items():
+        print(f"{mode:>9}: {updates} updates in {elapsed:.3f} s "
+              f"({updates / elapsed:,.0f}/s)")
+    print(f"group commit made {batch.commits} commit(s)")
+    return results
+
+
+def _copy_db(source, path):
+    """Copy a database with the backup API, in rollback-journal mode."""
+    src = sqlite3.connect(source)
+    dst = sqlite3.connect(path)
+    try:
+        src.backup(dst)
+        dst.execute("PRAGMA journal_mode = DELETE")
+    finally:
+        src.close()
+        dst.close()
+
+
+def bench_profiles(database, seconds, readers, writers, profiles):
+    """
+    Mixed read/write throughput of each SQLite profile.
+
+    Each profile gets its own copy of `database` (or of a generated users
+    table if the file does not exist). Reader threads look users up by id
+    while writer threads update emails, each write its own commit, all
+    through a pool configured with the profile.
+    """
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        for name in profiles:
+            path = os.path.join(tmp, f'{name}.db')
+            if os.path.exists(database):
+                _copy_db(database, path)
+            else:
+                _make_users_db(path)
+            ids = [row[0] for row in sqlite3.connect(path).execute("SELECT id FROM users")]
+            pool = configure_pool(path, size=readers + writers, profile=name)
+            counts = {'reads': 0, 'writes': 0, 'errors': 0}
+            count_lock = threading.Lock()
+            stop = threading.Event()
+
+            def work(write, seed):
+                done = errors = 0
+                position = seed
+                conn = pool.acquire()
+                try:
+                    while not stop.is_set():
+                        user_id = ids[position % len(ids)]
+                        position += 7919
+                        try:
+                            if write:
+                                conn.execute("UPDATE users SET email = ? WHERE id = ?",
+                                             (f"{user_id}.{done}@example.com", user_id))
+                                conn.commit()
+                            else:
+                                conn.execute("SELECT * FROM users WHERE id = ?",
+                                             (user_id,)).fetchone()
+                            done += 1
+                        except sqlite3.OperationalError:
+                            errors += 1
+                finally:
+                    pool.release(conn)
+                with count_lock:
+                    counts['writes' if write else 'reads'] += done
+                    counts['errors'] += errors
+
+            threads = ([threading.Thread(target=work, args=(False, i)) for i in range(readers)]
+                       + [threading.Thread(target=work, args=(True, i)) for i in range(writers)])
+            for thread in threads:
+                thread.start()
+            time.sleep(seconds)
+            stop.set()
+            for thread in threads:
+                thread.join()
+            pool.close()
+            results[name] = counts
+            print(f"{name:>9}: {counts['reads'] / seconds:>10,.0f} reads/s "
+                  f"{counts['writes'] / seconds:>8,.0f} writes/s "
+                  f"{counts['errors']} error(s)  {sqlite_profile.profile_pragmas(name)}")
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    stampede = commands.add_parser('stampede', help="single-flight cache_query under load")
+    stampede.add_argument('--threads', type=int, default=64)
+    stampede.add_argument('--ttl', type=float, default=0.5)
+    stampede.add_argument('--query-delay', type=float, default=0.05)
+
+    group = commands.add_parser('group-commit', help="per-call commits vs group commit")
+    group.add_argument('--updates', type=int, default=2000)
+    group.add_argument('--every', type=int, default=500)
+
+    profiles = commands.add_parser('profiles', help="mixed read/write throughput per SQLite profile")
+    profiles.add_argument('--database', default='users.db',
+                          help="database to copy (a generated one if missing)")
+    profiles.add_argument('--seconds', type=float, default=3.0)
+    profiles.add_argument('--readers', type=int, default=4)
+    profiles.add_argument('--writers', type=int, default=2)
+    profiles.add_argument('--profile', action='append', choices=sorted(sqlite_profile.PROFILES),
+                          help="profile to run (repeatable; default: all)")
+
+    args = parser.parse_args()
+    if args.command == 'stampede':
+        bench_stampede(args.threads, args.ttl, args.query_delay)
+    elif args.command == 'group-commit':
+        bench_group_commit(args.updates, args.every)
+    elif args.command == 'profiles':
+        bench_profiles(args.database, args.seconds, args.readers, args.writers,
+                       args.profile or list(sqlite_profile.PROFILES))
+
+
+if __name__ == "__main__":
+    main()
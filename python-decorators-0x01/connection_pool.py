@@ -0,0 +1,470 @@
+"""
+Pooled SQLite connections and the shared with_db_connection decorator.
+
+Coroutine functions decorated with with_db_connection borrow aiosqlite
+connections from an AsyncConnectionPool instead; aiosqlite is only needed
+once one is used.
+"""
+import asyncio
+import functools
+import inspect
+import sqlite3
+import threading
+import time
+import traceback
+import warnings
+import weakref
+from contextlib import contextmanager
+from queue import Empty, LifoQueue
+
+from sqlite_profile import profile_pragmas
+
+try:
+    import aiosqlite
+except ImportError:  # only needed for the async pool
+    aiosqlite = None
+
+
+class PoolTimeoutError(sqlite3.OperationalError):
+    """Raised when no pooled connection becomes free in time."""
+
+
+def _format_stack(stack):
+    if stack is None:
+        return "  (unknown; create the pool with track_stacks=True)\n"
+    return ''.join(traceback.format_list(stack))
+
+
+class ConnectionPool:
+    """
+    A bounded pool of connections to one SQLite database file.
+
+    Connections are opened lazily, up to `size`. The PRAGMAs of `profile`
+    (see sqlite_profile), with `pragmas` overriding single settings, are
+    applied once when each one is opened. A connection checked out for
+    longer than `leak_timeout` seconds is reported by leaks() and warned
+    about when it is finally released. Where it was checked out is only
+    known with track_stacks=True, since capturing a stack on every
+    checkout costs about as much as a small query.
+    """
+
+    def __init__(self, database='users.db', size=5, timeout=30.0,
+                 pragmas=None, leak_timeout=60.0, cached_statements=128,
+                 profile=None, track_stacks=False):
+        self.database = database
+        self.size = size
+        self.timeout = timeout
+        self.pragmas = profile_pragmas(profile, **(pragmas or {}))
+        self.leak_timeout = leak_timeout
+        self.cached_statements = cached_statements
+        self.track_stacks = track_stacks
+        self._idle = LifoQueue()
+        self._lock = threading.Lock()
+        self._open = 0
+        self._checked_out = {}  # id(conn) -> (conn, checked out at, stack)
+        self._stats = {'checkouts': 0, 'created': 0, 'waits': 0,
+                       'timeouts': 0, 'leaks_reported': 0}
+
+    def _connect(self):
+        conn = sqlite3.connect(self.database, check_same_thread=False,
+                               cached_statements=self.cached_statements)
+        for name, value in self.pragmas.items():
+            conn.execute(f"PRAGMA {name} = {value}")
+        return conn
+
+    def acquire(self):
+        """Check a connection out of the pool, opening one if allowed."""
+        conn = None
+        try:
+            conn = self._idle.get_nowait()
+        except Empty:
+            with self._lock:
+                can_open = self._open < self.size
+                if can_open:
+                    self._open += 1
+            if can_open:
+                try:
+                    conn = self._connect()
+                except Exception:
+                    with self._lock:
+                        self._open -= 1
+                    raise
+                with self._lock:
+                    self._stats['created'] += 1
+            else:
+                with self._lock:
+                    self._stats['waits'] += 1
+                try:
+                    conn = self._idle.get(timeout=self.timeout)
+                except Empty:
+                    with self._lock:
+                        self._stats['timeouts'] += 1
+                    leaks = self.leaks()
+                    hint = f"; {len(leaks)} connection(s) look leaked" if leaks else ""
+                    raise PoolTimeoutError(
+                        f"No connection to {self.database} free after "
+                        f"{self.timeout}s (pool size {self.size}){hint}") from None
+
+        stack = traceback.extract_stack(limit=8)[:-1] if self.track_stacks else None
+        with self._lock:
+            self._stats['checkouts'] += 1
+            self._checked_out[id(conn)] = (conn, time.monotonic(), stack)
+        return conn
+
+    def release(self, conn):
+        """Return a connection, rolling back anything left uncommitted."""
+        with self._lock:
+            _, checked_out_at, stack = self._checked_out.pop(id(conn), (None, None, None))
+        if checked_out_at is not None and self.leak_timeout is not None:
+            held = time.monotonic() - checked_out_at
+            if held > self.leak_timeout:
+                warnings.warn(
+                    f"Connection to {self.database} was held for {held:.1f}s, "
+                    f"checked out at:\n{_format_stack(stack)}",
+                    ResourceWarning, stacklevel=2)
+        try:
+            if conn.in_transaction:
+                conn.rollback()
+            conn.row_factory = None
+        except sqlite3.ProgrammingError:
+            # Closed by its user: put a fresh connection in its place
+            try:
+                conn = self._connect()
+            except sqlite3.Error:
+                with self._lock:
+                    self._open -= 1
+                return
+        self._idle.put(conn)
+
+    def leaks(self):
+        """
+        Connections held longer than leak_timeout.
+
+        Returns:
+            list: (seconds held, formatted checkout stack) pairs
+        """
+        if self.leak_timeout is None:
+            return []
+        now = time.monotonic()
+        with self._lock:
+            held = [(now - since, _format_stack(stack))
+                    for _, since, stack in self._checked_out.values()
+                    if now - since > self.leak_timeout]
+            self._stats['leaks_reported'] += len(held)
+        return held
+
+    def stats(self):
+        """Pool counters plus the current number of open and idle connections."""
+        with self._lock:
+            snapshot = dict(self._stats)
+            snapshot.update(size=self.size, open=self._open,
+                            idle=self._idle.qsize(),
+                            in_use=len(self._checked_out))
+        return snapshot
+
+    def close(self):
+        """Close every idle connection."""
+        while True:
+            try:
+                conn = self._idle.get_nowait()
+            except Empty:
+                return
+            with self._lock:
+                self._open -= 1
+            conn.close()
+
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def get_pool(database='users.db', **options):
+    """
+    Return the pool for a database file, creating it on first use.
+
+    options are passed to ConnectionPool when the pool is created and are
+    ignored afterwards; use configure_pool() to change them.
+    """
+    with _pools_lock:
+        pool = _pools.get(database)
+        if pool is None:
+            pool = _pools[database] = ConnectionPool(database, **options)
+        return pool
+
+
+def configure_pool(database='users.db', **options):
+    """Replace the pool for a database file with a newly configured one."""
+    with _pools_lock:
+        old = _pools.get(database)
+        _pools[database] = ConnectionPool(database, **options)
+    if old is not None:
+        old.close()
+    return _pools[database]
+
+
+class AsyncConnectionPool:
+    """
+    A bounded pool of aiosqlite connections to one SQLite database file.
+
+    The async counterpart of ConnectionPool, for use from one event loop:
+    connections are opened lazily up to `size`, get the profile PRAGMAs
+    on open, and are rolled back and reset when released. Close it before
+    the loop ends: every aiosqlite connection has a worker thread that
+    keeps the process alive. The pools from get_async_pool() are closed
+    with their loop.
+    """
+
+    def __init__(self, database='users.db', size=5, timeout=30.0,
+                 pragmas=None, profile=None):
+        if aiosqlite is None:
+            raise ImportError("AsyncConnectionPool requires aiosqlite: "
+                              "pip install aiosqlite")
+        self.database = database
+        self.size = size
+        self.timeout = timeout
+        self.pragmas = profile_pragmas(profile, **(pragmas or {}))
+        self._idle = asyncio.LifoQueue()
+        self._open = 0
+        self._in_use = 0
+        self._stats = {'checkouts': 0, 'created': 0, 'waits': 0, 'timeouts': 0}
+
+    async def _connect(self):
+        conn = await aiosqlite.connect(self.database)
+        try:
+            for name, value in self.pragmas.items():
+                # Close each cursor: SQLite keeps an interrupt() pending for
+                # as long as any statement on the connection is still open
+                async with conn.execute(f"PRAGMA {name} = {value}"):
+                    pass
+        except BaseException:
+            await conn.close()
+            raise
+        return conn
+
+    async def acquire(self):
+        """Check a connection out of the pool, opening one if allowed."""
+        try:
+            conn = self._idle.get_nowait()
+        except asyncio.QueueEmpty:
+            if self._open < self.size:
+                self._open += 1
+                try:
+                    conn = await self._connect()
+                except BaseException:
+                    self._open -= 1
+                    raise
+                self._stats['created'] += 1
+            else:
+                self._stats['waits'] += 1
+                try:
+                    conn = await asyncio.wait_for(self._idle.get(), self.timeout)
+                except asyncio.TimeoutError:
+                    self._stats['timeouts'] += 1
+                    raise PoolTimeoutError(
+                        f"No connection to {self.database} free after "
+                        f"{self.timeout}s (pool size {self.size})") from None
+        self._stats['checkouts'] += 1
+        self._in_use += 1
+        return conn
+
+    async def release(self, conn, discard=False):
+        """
+        Return a connection, rolling back anything left uncommitted.
+
+        With discard=True the connection is closed and a fresh one takes
+        its place, e.g. after interrupt(), whose effect can outlive the
+        statement it was meant for.
+        """
+        self._in_use -= 1
+        kept = False
+        try:
+            try:
+                if discard:
+                    await conn.close()
+                else:
+                    if conn.in_transaction:
+                        await conn.rollback()
+                    conn.row_factory = None
+            except (sqlite3.ProgrammingError, ValueError):
+                # Closed by its user
+                discard = True
+            if discard:
+                # Put a fresh connection in its place
+                try:
+                    conn = await self._connect()
+                except sqlite3.Error:
+                    return
+            self._idle.put_nowait(conn)
+            kept = True
+        finally:
+            if not kept:
+                # Whatever went wrong, the connection has left the pool
+                self._open -= 1
+
+    def stats(self):
+        """Pool counters plus the current number of open and idle connections."""
+        snapshot = dict(self._stats)
+        snapshot.update(size=self.size, open=self._open,
+                        idle=self._idle.qsize(), in_use=self._in_use)
+        return snapshot
+
+    async def close(self):
+        """Close every idle connection."""
+        while not self._idle.empty():
+            conn = self._idle.get_nowait()
+            self._open -= 1
+            await conn.close()
+
+
+# event loop -> ({database: AsyncConnectionPool}, closer); asyncio queues
+# and aiosqlite futures belong to the loop they were created on
+_async_pools = weakref.WeakKeyDictionary()
+
+
+async def _close_at_shutdown(pools):
+    """
+    Close the pools once the loop finalizes this generator.
+
+    Every async generator a loop has seen is closed by its
+    shutdown_asyncgens(), which asyncio.run() calls before closing the
+    loop, so the pools' connections (and their worker threads) do not
+    outlive it.
+    """
+    try:
+        yield
+    finally:
+        _async_pools.pop(asyncio.get_running_loop(), None)
+        for pool in list(pools.values()):
+            await pool.close()
+
+
+def _loop_pools():
+    loop = asyncio.get_running_loop()
+    entry = _async_pools.get(loop)
+    if entry is None:
+        pools = {}
+        closer = _close_at_shutdown(pools)
+        # Starting it registers it with the loop; run it up to its yield
+        try:
+            closer.asend(None).send(None)
+        except StopIteration:
+            pass
+        entry = _async_pools[loop] = (pools, closer)
+    return entry[0]
+
+
+def get_async_pool(database='users.db', **options):
+    """
+    Return the running event loop's async pool for a database file.
+
+    options are passed to AsyncConnectionPool when the pool is created.
+    The pools are closed when the loop shuts down its async generators,
+    as asyncio.run() does, or earlier by close_async_pools().
+    """
+    pools = _loop_pools()
+    pool = pools.get(database)
+    if pool is None:
+        pool = pools[database] = AsyncConnectionPool(database, **options)
+    return pool
+
+
+async def configure_async_pool(database='users.db', **options):
+    """Replace the running loop's async pool for a database file."""
+    pools = _loop_pools()
+    old = pools.get(database)
+    pool = pools[database] = AsyncConnectionPool(database, **options)
+    if old is not None:
+        await old.close()
+    return pool
+
+
+async def close_async_pools():
+    """Close the running loop's async pools."""
+    entry = _async_pools.pop(asyncio.get_running_loop(), None)
+    if entry is not None:
+        await entry[1].aclose()
+
+
+_local = threading.local()
+
+
+def _bound(database):
+    return getattr(_local, 'connections', {}).get(database)
+
+
+@contextmanager
+def bound_connection(database='users.db'):
+    """
+    Pin one pooled connection to the current thread for the block.
+
+    Every with_db_connection call for the same database inside the block
+    gets this connection instead of borrowing its own, so the calls can
+    share one transaction. Nested blocks reuse the outer connection.
+
+    Yields:
+        sqlite3.Connection: The pinned connection
+    """
+    conn = _bound(database)
+    if conn is not None:
+        yield conn
+        return
+    pool = get_pool(database)
+    conn = pool.acquire()
+    if not hasattr(_local, 'connections'):
+        _local.connections = {}
+    _local.connections[database] = conn
+    try:
+        yield conn
+    finally:
+        del _local.connections[database]
+        pool.release(conn)
+
+
+def with_db_connection(func=None, *, database='users.db'):
+    """
+    Decorator that lends the function a pooled database connection.
+
+    The connection is passed as the `conn` keyword argument and goes back
+    to the pool when the function returns or raises. If the caller already
+    passes a conn, that connection is used as is, and inside a
+    bound_connection() block the pinned connection is used.
+
+    Coroutine functions get an aiosqlite connection from the running
+    loop's AsyncConnectionPool instead.
+
+    Can be used bare (@with_db_connection) or configured
+    (@with_db_connection(database='other.db')).
+    """
+    if func is None:
+        return functools.partial(with_db_connection, database=database)
+
+    if inspect.iscoroutinefunction(func):
+        @functools.wraps(func)
+        async def async_wrapper(*args, **kwargs):
+            if kwargs.get('conn') is not None:
+                return await func(*args, **kwargs)
+            pool = get_async_pool(database)
+            conn = await pool.acquire()
+            try:
+                kwargs['conn'] = conn
+                return await func(*args, **kwargs)
+            finally:
+                await pool.release(conn)
+        return async_wrapper
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        if kwargs.get('conn') is not None:
+            return func(*args, **kwargs)
+        conn = _bound(database)
+        if conn is not None:
+            kwargs['conn'] = conn
+            return func(*args, **kwargs)
+        pool = get_pool(database)
+        conn = pool.acquire()
+        try:
+            kwargs['conn'] = conn
+            return func(*args, **kwargs)
+        finally:
+            pool.release(conn)
+    return wrapper
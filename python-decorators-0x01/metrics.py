@@ -0,0 +1,234 @@
+"""
+In-process query metrics for the database decorators.
+
+@instrument records latency histograms per query fingerprint. The other
+decorators report into the same registry: retry_on_failure counts retries,
+cache_query counts hits and misses, and transactional counts commits and
+rollbacks (a call undone inside a group_commit() batch counts as a
+savepoint_rollback). registry.snapshot() returns everything as a dict and
+registry.to_prometheus() renders the Prometheus text exposition format.
+"""
+import bisect
+import functools
+import inspect
+import re
+import threading
+import time
+
+from query_log import fingerprint
+from sql_utils import async_trace_statements, trace_statements
+
+_CONTROL = re.compile(r'^\s*(BEGIN|COMMIT|END|ROLLBACK|SAVEPOINT|RELEASE)\b', re.IGNORECASE)
+
+# Upper bounds in seconds, as in the Prometheus client defaults
+DEFAULT_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01,
+                   0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class Histogram:
+    """Fixed-bucket latency histogram with interpolated quantiles."""
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.bounds = tuple(buckets)
+        self.counts = [0] * (len(self.bounds) + 1)  # last one is +Inf
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def observe(self, value):
+        """Record one duration in seconds."""
+        self.counts[bisect.bisect_left(self.bounds, value)] += 1
+        self.count += 1
+        self.sum += value
+        self.max = max(self.max, value)
+
+    def quantile(self, q):
+        """Estimate the q-quantile by interpolating inside its bucket."""
+        if not self.count:
+            return None
+        rank = q * self.count
+        seen = 0
+        for index, bucket_count in enumerate(self.counts):
+            if bucket_count and seen + bucket_count >= rank:
+                lower = self.bounds[index - 1] if index > 0 else 0.0
+                upper = self.bounds[index] if index < len(self.bounds) else self.max
+                fraction = (rank - seen) / bucket_count
+                return min(lower + (upper - lower) * fraction, self.max)
+            seen += bucket_count
+        return self.max
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+class MetricsRegistry:
+    """Thread-safe store of every metric the decorators report."""
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = buckets
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        """Forget everything recorded so far."""
+        with self._lock:
+            self._latency = {}  # fingerprint -> Histogram
+            self._errors = {}  # fingerprint -> count
+            self._retries = {}  # function -> count
+            self._cache = {}  # function -> {'hit': n, 'miss': n, ...}
+            self._transactions = {'commit': 0, 'rollback': 0, 'savepoint_rollback': 0}
+
+    def observe_query(self, query, seconds, ok=True):
+        with self._lock:
+            histogram = self._latency.get(query)
+            if histogram is None:
+                histogram = self._latency[query] = Histogram(self.buckets)
+            histogram.observe(seconds)
+            if not ok:
+                self._errors[query] = self._errors.get(query, 0) + 1
+
+    def record_retry(self, function):
+        with self._lock:
+            self._retries[function] = self._retries.get(function, 0) + 1
+
+    def record_cache(self, function, status):
+        with self._lock:
+            counts = self._cache.setdefault(function, {})
+            counts[status] = counts.get(status, 0) + 1
+
+    def record_transaction(self, outcome):
+        with self._lock:
+            self._transactions[outcome] = self._transactions.get(outcome, 0) + 1
+
+    def snapshot(self):
+        """All metrics as a JSON-serializable dict."""
+        with self._lock:
+            queries = {
+                query: {
+                    'count': h.count,
+                    'errors': self._errors.get(query, 0),
+                    'sum_seconds': h.sum,
+                    'max_seconds': h.max,
+                    'p50_seconds': h.quantile(0.50),
+                    'p95_seconds': h.quantile(0.95),
+                    'p99_seconds': h.quantile(0.99),
+                } for query, h in self._latency.items()
+            }
+            cache = {}
+            for function, counts in self._cache.items():
+                lookups = sum(counts.values())
+                hits = lookups - counts.get('miss', 0)
+                cache[function] = dict(counts, hit_ratio=hits / lookups if lookups else None)
+            return {
+                'queries': queries,
+                'retries': dict(self._retries),
+                'cache': cache,
+                'transactions': dict(self._transactions),
+            }
+
+    def to_prometheus(self):
+        """All metrics in the Prometheus text exposition format."""
+        with self._lock:
+            lines = [
+                '# HELP db_query_duration_seconds Query latency by fingerprint.',
+                '# TYPE db_query_duration_seconds histogram',
+            ]
+            for query, h in self._latency.items():
+                label = f'query="{_escape(query)}"'
+                cumulative = 0
+                for bound, count in zip(self.buckets, h.counts):
+                    cumulative += count
+                    lines.append(f'db_query_duration_seconds_bucket{{{label},le="{bound}"}} {cumulative}')
+                lines.append(f'db_query_duration_seconds_bucket{{{label},le="+Inf"}} {h.count}')
+                lines.append(f'db_query_duration_seconds_sum{{{label}}} {h.sum}')
+                lines.append(f'db_query_duration_seconds_count{{{label}}} {h.count}')
+
+            lines += ['# HELP db_query_errors_total Failed queries by fingerprint.',
+                      '# TYPE db_query_errors_total counter']
+            for query, count in self._errors.items():
+                lines.append(f'db_query_errors_total{{query="{_escape(query)}"}} {count}')
+
+            lines += ['# HELP db_retries_total Retries by function.',
+                      '# TYPE db_retries_total counter']
+            for function, count in self._retries.items():
+                lines.append(f'db_retries_total{{function="{_escape(function)}"}} {count}')
+
+            lines += ['# HELP db_cache_requests_total Cache lookups by function and result.',
+                      '# TYPE db_cache_requests_total counter']
+            for function, counts in self._cache.items():
+                for status, count in counts.items():
+                    lines.append(f'db_cache_requests_total{{function="{_escape(function)}",'
+                                 f'result="{status}"}} {count}')
+
+            lines += ['# HELP db_transactions_total Transactions by outcome.',
+                      '# TYPE db_transactions_total counter']
+            for outcome, count in self._transactions.items():
+                lines.append(f'db_transactions_total{{outcome="{outcome}"}} {count}')
+        return '\n'.join(lines) + '\n'
+
+
+# Shared by every decorator in this directory
+registry = MetricsRegistry()
+
+
+def instrument(func=None, *, metrics=None):
+    """
+    Decorator that records the latency of a query function.
+
+    The latency is filed under the fingerprint of the `query` argument if
+    there is one. Otherwise it uses the first statement the function runs
+    on its `conn`, or the function name as a last resort. Put it below
+    @with_db_connection so that conn is available, and below
+    @transactional, @retry_on_failure and @cache_query so that it times
+    each attempt that reaches the database. Coroutine functions are timed
+    until they finish.
+    """
+    if func is None:
+        return functools.partial(instrument, metrics=metrics)
+
+    def record(query, statements, elapsed, ok):
+        if query is None:
+            query = next((s for s in statements if not _CONTROL.match(s)), None)
+        label = fingerprint(query) if query else func.__qualname__
+        target = metrics if metrics is not None else registry
+        target.observe_query(label, elapsed, ok)
+
+    if inspect.iscoroutinefunction(func):
+        @functools.wraps(func)
+        async def async_wrapper(*args, **kwargs):
+            query = kwargs.get('query')
+            conn = kwargs.get('conn')
+            started = time.perf_counter()
+            ok = False
+            statements = []
+            try:
+                if conn is not None and query is None:
+                    async with async_trace_statements(conn) as statements:
+                        result = await func(*args, **kwargs)
+                else:
+                    result = await func(*args, **kwargs)
+                ok = True
+                return result
+            finally:
+                record(query, statements, time.perf_counter() - started, ok)
+        return async_wrapper
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        query = kwargs.get('query')
+        conn = kwargs.get('conn')
+        started = time.perf_counter()
+        ok = False
+        statements = []
+        try:
+            if conn is not None and query is None:
+                with trace_statements(conn) as statements:
+                    result = func(*args, **kwargs)
+            else:
+                result = func(*args, **kwargs)
+            ok = True
+            return result
+        finally:
+            record(query, statements, time.perf_counter() - started, ok)
+    return wrapper
@@ -0,0 +1,357 @@
+"""
+Bounded query-result cache used by cache_query.
+
+Entries are evicted least-recently-used once the cache holds more than
+max_entries results or max_bytes of (estimated) result data, expire after a
+per-entry TTL, and are dropped when a transaction writes to a table they
+read from.
+
+get_or_compute() adds single-flight misses: concurrent callers of the same
+key wait for one computation instead of all running the query. It can also
+serve expired entries while one background refresh replaces them.
+get_or_compute_async() does the same for coroutines, with tasks waiting on
+a future instead of threads blocking on an event.
+"""
+import asyncio
+import sys
+import threading
+import time
+from collections import OrderedDict
+
+
+def _sizeof(value):
+    """Rough deep size of a query result in bytes."""
+    size = sys.getsizeof(value)
+    if isinstance(value, (list, tuple, set)):
+        size += sum(_sizeof(item) for item in value)
+    elif isinstance(value, dict):
+        size += sum(_sizeof(k) + _sizeof(v) for k, v in value.items())
+    return size
+
+
+class QueryCache:
+    """
+    LRU + TTL cache of query results with table-level invalidation.
+
+    Keys are opaque hashables that start with the database path, e.g.
+    (database, query, params). Every entry records the tables it was read
+    from so that invalidate() can drop it when one of them changes.
+    """
+
+    def __init__(self, max_entries=1024, max_bytes=64 * 1024 * 1024, ttl=300.0):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self._lock = threading.RLock()
+        # key -> (value, size, expires_at, stale_until, tables)
+        self._entries = OrderedDict()
+        self._by_table = {}  # (database, table) -> set of keys
+        self._versions = {}  # (database, table) -> invalidation count
+        self._inflight = {}  # key -> _Flight
+        self._async_inflight = {}  # (event loop, key) -> asyncio.Future
+        self._refreshing = set()
+        self._tasks = set()  # background refresh tasks, kept referenced
+        self._bytes = 0
+        self._stats = {'hits': 0, 'misses': 0, 'evictions': 0,
+                       'expirations': 0, 'invalidations': 0, 'stale_hits': 0,
+                       'shared_misses': 0, 'refreshes': 0}
+
+    def get(self, key):
+        """
+        Look up a key.
+
+        Returns:
+            tuple: (True, value) on a hit, (False, None) on a miss
+        """
+        with self._lock:
+            entry = self._lookup(key)
+            if entry is not None and entry[2] <= time.monotonic():
+                entry = None
+            if entry is None:
+                self._stats['misses'] += 1
+                return False, None
+            self._entries.move_to_end(key)
+            self._stats['hits'] += 1
+            return True, entry[0]
+
+    def _lookup(self, key):
+        # Called with the lock held; drops the entry once it is past its
+        # stale window, but returns expired entries still inside it
+        entry = self._entries.get(key)
+        if entry is not None and entry[3] <= time.monotonic():
+            self._remove(key)
+            self._stats['expirations'] += 1
+            return None
+        return entry
+
+    def _version(self, database, tables):
+        # Called with the lock held
+        return tuple(self._versions.get((database, t), 0) for t in sorted(tables))
+
+    def set(self, key, value, tables=(), ttl=None, stale_ttl=0.0, version=None):
+        """
+        Store a result.
+
+        Args:
+            key: Cache key; key[0] must be the database path
+            value: Query result
+            tables: Tables the result was read from
+            ttl: Seconds the entry stays valid (default: cache ttl)
+            stale_ttl: Extra seconds an expired entry may be served while
+                       it is refreshed
+            version: Table versions seen before computing the value; the
+                     value is not stored if a table was invalidated since
+        """
+        size = _sizeof(value)
+        if size > self.max_bytes:
+            return
+        expires_at = time.monotonic() + (self.ttl if ttl is None else ttl)
+        tables = frozenset(tables)
+        with self._lock:
+            if version is not None and version != self._version(key[0], tables):
+                return
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (value, size, expires_at, expires_at + stale_ttl, tables)
+            self._bytes += size
+            for table in tables:
+                self._by_table.setdefault((key[0], table), set()).add(key)
+            while (len(self._entries) > self.max_entries
+                   or self._bytes > self.max_bytes):
+                self._remove(next(iter(self._entries)))
+                self._stats['evictions'] += 1
+
+    def _remove(self, key):
+        # Called with the lock held
+        _, size, _, _, tables = self._entries.pop(key)
+        self._bytes -= size
+        for table in tables:
+            keys = self._by_table.get((key[0], table))
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._by_table[(key[0], table)]
+
+    def invalidate(self, database, tables):
+        """
+        Drop every entry of a database that read from any of the tables.
+
+        Returns:
+            int: Number of entries dropped
+        """
+        with self._lock:
+            keys = set()
+            for table in tables:
+                table = table.lower()
+                self._versions[(database, table)] = self._versions.get((database, table), 0) + 1
+                keys |= self._by_table.get((database, table), set())
+            for key in keys:
+                self._remove(key)
+            self._stats['invalidations'] += len(keys)
+            return len(keys)
+
+    def get_or_compute(self, key, compute, tables=(), ttl=None, stale_ttl=0.0,
+                       refresh=None):
+        """
+        Return the cached value for key, computing it at most once at a time.
+
+        On a miss the first caller runs compute() and every concurrent caller
+        for the same key waits for that result (or exception). If an entry
+        has expired less than stale_ttl seconds ago and refresh is given, the
+        stale value is returned at once and refresh() is run in a single
+        background thread to replace it.
+
+        Args:
+            key: Cache key; key[0] must be the database path
+            compute: Callable producing the value on a miss
+            tables: Tables the value is read from
+            ttl: Seconds the entry stays valid (default: cache ttl)
+            stale_ttl: Seconds past expiry an entry may still be served
+            refresh: Callable used for background refreshes; it must not
+                     depend on the caller's connection
+
+        Returns:
+            tuple: (value, status), status one of 'hit', 'stale', 'shared'
+                   or 'miss'
+        """
+        tables = frozenset(t.lower() for t in tables)
+        with self._lock:
+            cached = self._cached(key, tables, refresh is not None)
+            if cached is not None:
+                value, status, version = cached
+                if version is not None:
+                    threading.Thread(
+                        target=self._refresh,
+                        args=(key, refresh, tables, ttl, stale_ttl, version),
+                        daemon=True).start()
+                return value, status
+
+            flight = self._inflight.get(key)
+            if flight is None:
+                flight = self._inflight[key] = _Flight()
+                leader = True
+                self._stats['misses'] += 1
+                version = self._version(key[0], tables)
+            else:
+                leader = False
+                self._stats['shared_misses'] += 1
+
+        if not leader:
+            return flight.wait(), 'shared'
+
+        try:
+            value = compute()
+        except BaseException as e:
+            flight.fail(e)
+            raise
+        else:
+            self.set(key, value, tables, ttl, stale_ttl, version)
+            flight.finish(value)
+            return value, 'miss'
+        finally:
+            with self._lock:
+                self._inflight.pop(key, None)
+
+    def _cached(self, key, tables, can_refresh):
+        """
+        Serve a key from the cache if possible; called with the lock held.
+
+        Returns:
+            tuple: (value, status, version) on a hit or a servable stale
+                   entry, else None. version is the table version a refresh
+                   should store under, set only when the caller must start
+                   the (single) refresh for the key.
+        """
+        entry = self._lookup(key)
+        if entry is not None and entry[2] > time.monotonic():
+            self._entries.move_to_end(key)
+            self._stats['hits'] += 1
+            return entry[0], 'hit', None
+        if entry is not None and can_refresh:
+            self._stats['stale_hits'] += 1
+            version = None
+            if key not in self._refreshing:
+                self._refreshing.add(key)
+                self._stats['refreshes'] += 1
+                version = self._version(key[0], tables)
+            return entry[0], 'stale', version
+        return None
+
+    async def get_or_compute_async(self, key, compute, tables=(), ttl=None,
+                                   stale_ttl=0.0, refresh=None):
+        """
+        get_or_compute() for coroutines.
+
+        compute and refresh are zero-argument callables returning
+        awaitables. Tasks missing on the same key await the first task's
+        result; a stale refresh runs as a background task. If the computing
+        task is cancelled, the tasks waiting on it are cancelled too.
+
+        Returns:
+            tuple: (value, status), as for get_or_compute()
+        """
+        tables = frozenset(t.lower() for t in tables)
+        loop = asyncio.get_running_loop()
+        flight_key = (loop, key)
+        with self._lock:
+            cached = self._cached(key, tables, refresh is not None)
+            if cached is not None:
+                value, status, version = cached
+                if version is not None:
+                    task = loop.create_task(self._refresh_async(
+                        key, refresh, tables, ttl, stale_ttl, version))
+                    self._tasks.add(task)
+                    task.add_done_callback(self._tasks.discard)
+                return value, status
+
+            flight = self._async_inflight.get(flight_key)
+            if flight is None:
+                flight = self._async_inflight[flight_key] = loop.create_future()
+                leader = True
+                self._stats['misses'] += 1
+                version = self._version(key[0], tables)
+            else:
+                leader = False
+                self._stats['shared_misses'] += 1
+
+        if not leader:
+            # shield: a waiter being cancelled must not cancel the flight
+            return await asyncio.shield(flight), 'shared'
+
+        try:
+            value = await compute()
+        except asyncio.CancelledError:
+            flight.cancel()
+            raise
+        except BaseException as e:
+            flight.set_exception(e)
+            flight.exception()  # mark retrieved in case nobody was waiting
+            raise
+        else:
+            self.set(key, value, tables, ttl, stale_ttl, version)
+            flight.set_result(value)
+            return value, 'miss'
+        finally:
+            with self._lock:
+                self._async_inflight.pop(flight_key, None)
+
+    async def _refresh_async(self, key, refresh, tables, ttl, stale_ttl, version):
+        try:
+            self.set(key, await refresh(), tables, ttl, stale_ttl, version)
+        except Exception:
+            # Keep serving the stale entry until it leaves its window
+            pass
+        finally:
+            with self._lock:
+                self._refreshing.discard(key)
+
+    def _refresh(self, key, refresh, tables, ttl, stale_ttl, version):
+        try:
+            self.set(key, refresh(), tables, ttl, stale_ttl, version)
+        except Exception:
+            # Keep serving the stale entry until it leaves its window
+            pass
+        finally:
+            with self._lock:
+                self._refreshing.discard(key)
+
+    def clear(self):
+        """Drop every entry."""
+        with self._lock:
+            self._entries.clear()
+            self._by_table.clear()
+            self._bytes = 0
+
+    def stats(self):
+        """Hit/miss/eviction counters plus the current size."""
+        with self._lock:
+            snapshot = dict(self._stats)
+            snapshot.update(entries=len(self._entries), bytes=self._bytes)
+            return snapshot
+
+
+class _Flight:
+    """A computation in progress that other callers can wait on."""
+
+    def __init__(self):
+        self._done = threading.Event()
+        self._value = None
+        self._error = None
+
+    def finish(self, value):
+        self._value = value
+        self._done.set()
+
+    def fail(self, error):
+        self._error = error
+        self._done.set()
+
+    def wait(self):
+        self._done.wait()
+        if self._error is not None:
+            raise self._error
+        return self._value
+
+
+# Shared by cache_query and invalidated by transactional
+cache = QueryCache()
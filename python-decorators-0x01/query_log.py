@@ -0,0 +1,98 @@
+"""
+Structured, queued query logging.
+
+Records are handed to a QueueHandler, so the calling thread only pays for
+an in-memory enqueue. A QueueListener thread formats them as JSON lines
+and writes them to the real handler (stderr unless configured otherwise).
+"""
+import atexit
+import hashlib
+import json
+import logging
+import logging.handlers
+import queue
+import re
+import threading
+
+logger = logging.getLogger('query_log')
+
+_COMMENTS = re.compile(r'--[^\n]*|/\*.*?\*/', re.DOTALL)
+_STRINGS = re.compile(r"'(?:[^']|'')*'")
+_NUMBERS = re.compile(r'\b\d+(?:\.\d+)?\b')
+_IN_LISTS = re.compile(r'\(\s*\?(?:\s*,\s*\?)*\s*\)')
+_SPACES = re.compile(r'\s+')
+
+_listener = None
+_setup_lock = threading.Lock()
+
+
+def fingerprint(sql):
+    """
+    Normalize a query so that runs differing only in literals group together.
+
+    >>> fingerprint("SELECT * FROM users WHERE id IN (1, 2,3) AND name = 'x'")
+    'select * from users where id in (...) and name = ?'
+    """
+    sql = _COMMENTS.sub(' ', sql)
+    sql = _STRINGS.sub('?', sql)
+    sql = _NUMBERS.sub('?', sql)
+    sql = _IN_LISTS.sub('(...)', sql)
+    return _SPACES.sub(' ', sql).strip().lower()
+
+
+def params_hash(params):
+    """Short stable hash of query parameters, so values are not logged."""
+    if params is None:
+        return None
+    return hashlib.sha1(repr(params).encode()).hexdigest()[:12]
+
+
+class JsonFormatter(logging.Formatter):
+    """Format a record's `query` payload as a single JSON line."""
+
+    def format(self, record):
+        payload = {'ts': round(record.created, 6), 'level': record.levelname}
+        payload.update(getattr(record, 'query', None) or {'message': record.getMessage()})
+        return json.dumps(payload, default=str)
+
+
+def configure(handler=None, level=logging.INFO):
+    """
+    Route query records through a background queue to `handler`.
+
+    Called automatically by the first emit(). Calling it again replaces
+    the handler.
+    """
+    global _listener
+    with _setup_lock:
+        if _listener is not None:
+            _listener.stop()
+        if handler is None:
+            handler = logging.StreamHandler()
+        if handler.formatter is None:
+            handler.setFormatter(JsonFormatter())
+        records = queue.SimpleQueue()
+        logger.handlers[:] = [logging.handlers.QueueHandler(records)]
+        logger.setLevel(level)
+        logger.propagate = False
+        _listener = logging.handlers.QueueListener(records, handler)
+        _listener.start()
+
+
+def shutdown():
+    """Flush pending records and stop the listener thread."""
+    global _listener
+    with _setup_lock:
+        if _listener is not None:
+            _listener.stop()
+            _listener = None
+
+
+atexit.register(shutdown)
+
+
+def emit(record, level=logging.INFO):
+    """Queue one structured query record."""
+    if _listener is None:
+        configure()
+    logger.log(level, record.get('fingerprint', ''), extra={'query': record})
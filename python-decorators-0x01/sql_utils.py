@@ -0,0 +1,109 @@
+"""
+Small SQL helpers shared by the decorators.
+"""
+import re
+from contextlib import asynccontextmanager, contextmanager
+
+_TABLE_NAME = r'[`"\[]?(\w+)[`"\]]?'
+_READ_TABLES = re.compile(r'\b(?:FROM|JOIN)\s+' + _TABLE_NAME, re.IGNORECASE)
+_WRITE_TABLES = re.compile(
+    r'^\s*(?:INSERT(?:\s+OR\s+\w+)?\s+INTO|REPLACE\s+INTO|UPDATE(?:\s+OR\s+\w+)?'
+    r'|DELETE\s+FROM|DROP\s+TABLE(?:\s+IF\s+EXISTS)?|ALTER\s+TABLE)\s+' + _TABLE_NAME,
+    re.IGNORECASE)
+
+# id(connection) -> statement lists collecting for that connection
+_tracers = {}
+
+
+def tables_read(query):
+    """Return the lower-cased names of the tables a query reads from."""
+    return {name.lower() for name in _READ_TABLES.findall(query)}
+
+
+def tables_written(query):
+    """Return the lower-cased name of the table a statement modifies, if any."""
+    match = _WRITE_TABLES.match(query)
+    return {match.group(1).lower()} if match else set()
+
+
+def database_of(conn):
+    """Return the file path of the main database of a sqlite3 connection."""
+    for _, name, path in conn.execute("PRAGMA database_list"):
+        if name == 'main':
+            return path or ':memory:'
+    return ':memory:'
+
+
+async def async_database_of(conn):
+    """database_of() for an aiosqlite connection."""
+    async with conn.execute("PRAGMA database_list") as cursor:
+        async for _, name, path in cursor:
+            if name == 'main':
+                return path or ':memory:'
+    return ':memory:'
+
+
+def _trace_callback(key):
+    def callback(sql):
+        for collector in _tracers.get(key, ()):
+            collector.append(sql)
+    return callback
+
+
+def _remove_collector(key, statements):
+    """Unregister a collector; True if it was the last one on the connection."""
+    collectors = _tracers[key]
+    # Remove by identity: distinct collectors may hold equal contents
+    collectors[:] = [c for c in collectors if c is not statements]
+    if collectors:
+        return False
+    del _tracers[key]
+    return True
+
+
+@contextmanager
+def trace_statements(conn):
+    """
+    Collect every SQL statement executed on a connection inside the block.
+
+    sqlite3 allows a single trace callback per connection, so nested or
+    concurrent tracers on the same connection share one callback.
+
+    Yields:
+        list: The statements, filled in as they run
+    """
+    statements = []
+    key = id(conn)
+    collectors = _tracers.setdefault(key, [])
+    if not collectors:
+        conn.set_trace_callback(_trace_callback(key))
+    collectors.append(statements)
+    try:
+        yield statements
+    finally:
+        if _remove_collector(key, statements):
+            conn.set_trace_callback(None)
+
+
+@asynccontextmanager
+async def async_trace_statements(conn):
+    """
+    trace_statements() for an aiosqlite connection.
+
+    The callback runs on the connection's worker thread, but only while
+    a statement the block awaits is executing.
+
+    Yields:
+        list: The statements, filled in as they run
+    """
+    statements = []
+    key = id(conn)
+    collectors = _tracers.setdefault(key, [])
+    if not collectors:
+        await conn.set_trace_callback(_trace_callback(key))
+    collectors.append(statements)
+    try:
+        yield statements
+    finally:
+        if _remove_collector(key, statements):
+            await conn.set_trace_callback(None)
@@ -0,0 +1,141 @@
+"""
+Registry of named SQL statements with per-statement execution stats.
+
+sqlite3 keeps an LRU cache of compiled statements on every connection, keyed
+by the SQL text. Since pooled connections are reused, running a registered
+statement through its handle compiles it once per connection and reuses the
+compiled form afterwards. Keep the number of hot statements below the
+pool's cached_statements (128 by default) so they stay compiled.
+
+Ad hoc SQL looked up with statement() is tracked too, but only for the
+most recently used `max_adhoc` texts, so callers passing arbitrary
+queries do not grow the registry without bound.
+"""
+import threading
+import time
+from collections import OrderedDict
+
+
+class Statement:
+    """A named SQL statement; call it with a connection to execute it."""
+
+    def __init__(self, registry, name, sql):
+        self.registry = registry
+        self.name = name
+        self.sql = sql
+        self.executions = 0
+        self.errors = 0
+        self.total_seconds = 0.0
+        self.max_seconds = 0.0
+
+    def _run(self, conn, params, fetch):
+        started = time.perf_counter()
+        ok = False
+        try:
+            cursor = conn.execute(self.sql, params)
+            result = fetch(cursor) if fetch else cursor
+            ok = True
+            return result
+        finally:
+            elapsed = time.perf_counter() - started
+            with self.registry._lock:
+                self.executions += 1
+                self.total_seconds += elapsed
+                self.max_seconds = max(self.max_seconds, elapsed)
+                if not ok:
+                    self.errors += 1
+
+    def __call__(self, conn, params=()):
+        """Execute on conn and return the cursor."""
+        return self._run(conn, params, None)
+
+    def fetchone(self, conn, params=()):
+        """Execute on conn and return the first row (timed including the fetch)."""
+        return self._run(conn, params, lambda cursor: cursor.fetchone())
+
+    def fetchall(self, conn, params=()):
+        """Execute on conn and return all rows (timed including the fetch)."""
+        return self._run(conn, params, lambda cursor: cursor.fetchall())
+
+    def __repr__(self):
+        return f"Statement({self.name!r}, {self.sql!r})"
+
+
+class StatementRegistry:
+    """Named statements, looked up by name or by their SQL text."""
+
+    def __init__(self, max_adhoc=128):
+        self.max_adhoc = max_adhoc
+        self._lock = threading.Lock()
+        self._by_name = {}
+        self._by_sql = {}
+        self._adhoc = OrderedDict()  # sql -> Statement, least recent first
+
+    def register(self, name, sql):
+        """
+        Register a statement under a name and return its handle.
+
+        Registering the same name and SQL again returns the existing handle.
+        """
+        with self._lock:
+            statement = self._by_name.get(name)
+            if statement is not None:
+                if statement.sql != sql:
+                    raise ValueError(f"Statement {name!r} is already registered "
+                                     f"with different SQL")
+                return statement
+            statement = Statement(self, name, sql)
+            self._by_name[name] = statement
+            self._by_sql.setdefault(sql, statement)
+            self._adhoc.pop(sql, None)
+            return statement
+
+    def statement(self, sql):
+        """
+        Return the handle for a SQL text.
+
+        SQL that was not registered gets an ad hoc handle named after its
+        text; only the max_adhoc most recently used of those are kept, so
+        their counters start over once they are evicted.
+        """
+        with self._lock:
+            statement = self._by_sql.get(sql)
+            if statement is not None:
+                return statement
+            statement = self._adhoc.get(sql)
+            if statement is not None:
+                self._adhoc.move_to_end(sql)
+                return statement
+            statement = self._adhoc[sql] = Statement(self, sql, sql)
+            while len(self._adhoc) > self.max_adhoc:
+                self._adhoc.popitem(last=False)
+            return statement
+
+    def __getitem__(self, name):
+        return self._by_name[name]
+
+    def __len__(self):
+        return len(self._by_name) + len(self._adhoc)
+
+    def stats(self):
+        """
+        Per-statement counters, hottest (most total time) first.
+
+        Returns:
+            list: One dict per statement
+        """
+        with self._lock:
+            rows = [{
+                'name': s.name,
+                'sql': s.sql,
+                'executions': s.executions,
+                'errors': s.errors,
+                'total_seconds': s.total_seconds,
+                'mean_seconds': s.total_seconds / s.executions if s.executions else 0.0,
+                'max_seconds': s.max_seconds,
+            } for s in [*self._by_name.values(), *self._adhoc.values()]]
+        return sorted(rows, key=lambda row: row['total_seconds'], reverse=True)
+
+
+# Shared by the decorated query functions
+registry = StatementRegistry()
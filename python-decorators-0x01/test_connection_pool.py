@@ -0,0 +1,261 @@
+#!/usr/bin/env python3
+"""Test connection_pool module"""
+import asyncio
+import os
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import unittest
+from unittest.mock import AsyncMock, patch
+
+from connection_pool import AsyncConnectionPool, ConnectionPool, PoolTimeoutError
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+# Coroutines borrowing connections through every async decorator path
+EXIT_SCRIPT = """
+import asyncio
+import importlib
+
+from connection_pool import close_async_pools, with_db_connection
+
+transactional = importlib.import_module('2-transactional').transactional
+cache_query = importlib.import_module('4-cache_query').cache_query
+
+
+@with_db_connection
+@transactional
+async def rename(conn, user_id, name):
+    await conn.execute("UPDATE users SET name = ? WHERE id = ?", (name, user_id))
+
+
+@with_db_connection
+@cache_query
+async def fetch(conn, query):
+    async with conn.execute(query) as cursor:
+        return await cursor.fetchall()
+
+
+async def main(close):
+    await rename(user_id=1, name='Bo')
+    print(await fetch(query="SELECT name FROM users"))
+    if close:
+        await close_async_pools()
+
+
+asyncio.run(main(close=%r))
+"""
+
+
+class PoolTestCase(unittest.TestCase):
+    """Base class with a scratch database file"""
+
+    def setUp(self):
+        """Create an empty database in a temporary directory"""
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.path = os.path.join(tmp.name, 'users.db')
+        sqlite3.connect(self.path).close()
+
+    def pool(self, **options):
+        """A ConnectionPool on the scratch database, closed after the test"""
+        pool = ConnectionPool(self.path, **options)
+        self.addCleanup(pool.close)
+        return pool
+
+
+class TestCheckout(PoolTestCase):
+    """Test ConnectionPool.acquire and release"""
+
+    def test_connection_reused(self):
+        """Test a released connection is handed out again"""
+        pool = self.pool(size=2)
+        conn = pool.acquire()
+        pool.release(conn)
+        self.assertIs(pool.acquire(), conn)
+        stats = pool.stats()
+        self.assertEqual((stats['created'], stats['checkouts'], stats['in_use']),
+                         (1, 2, 1))
+
+    def test_release_rolls_back(self):
+        """Test work left uncommitted is not seen by the next borrower"""
+        pool = self.pool(size=1)
+        conn = pool.acquire()
+        conn.execute("CREATE TABLE t (x)")
+        conn.commit()
+        conn.execute("INSERT INTO t VALUES (1)")
+        conn.row_factory = sqlite3.Row
+        pool.release(conn)
+        conn = pool.acquire()
+        self.assertIsNone(conn.row_factory)
+        self.assertEqual(conn.execute("SELECT COUNT(*) FROM t").fetchone(), (0,))
+
+    def test_closed_connection_replaced(self):
+        """Test a connection closed by its user is replaced on release"""
+        pool = self.pool(size=1)
+        conn = pool.acquire()
+        conn.close()
+        pool.release(conn)
+        fresh = pool.acquire()
+        self.assertIsNot(fresh, conn)
+        self.assertEqual(fresh.execute("SELECT 1").fetchone(), (1,))
+        self.assertEqual(pool.stats()['open'], 1)
+
+
+class TestMaxSize(PoolTestCase):
+    """Test a full pool makes callers wait"""
+
+    def test_waits_for_release(self):
+        """Test acquire blocks until another thread releases"""
+        pool = self.pool(size=1, timeout=5)
+        conn = pool.acquire()
+        timer = threading.Timer(0.05, pool.release, (conn,))
+        timer.start()
+        self.assertIs(pool.acquire(), conn)
+        timer.join()
+        self.assertEqual(pool.stats()['waits'], 1)
+
+    def test_timeout(self):
+        """Test acquire gives up after the pool's timeout"""
+        pool = self.pool(size=1, timeout=0.05)
+        pool.acquire()
+        with self.assertRaises(PoolTimeoutError):
+            pool.acquire()
+        stats = pool.stats()
+        self.assertEqual((stats['open'], stats['timeouts']), (1, 1))
+
+
+class TestLeaks(PoolTestCase):
+    """Test connections held past leak_timeout are reported"""
+
+    def test_leaks(self):
+        """Test leaks() lists connections held too long, with their stack"""
+        pool = self.pool(size=2, leak_timeout=0.01, track_stacks=True)
+        pool.acquire()
+        time.sleep(0.02)
+        leaks = pool.leaks()
+        self.assertEqual(len(leaks), 1)
+        self.assertIn('test_leaks', leaks[0][1])
+
+    def test_warning_on_release(self):
+        """Test releasing a connection held too long warns"""
+        pool = self.pool(size=1, leak_timeout=0.01)
+        conn = pool.acquire()
+        time.sleep(0.02)
+        with self.assertWarns(ResourceWarning):
+            pool.release(conn)
+        self.assertEqual(pool.leaks(), [])
+
+    def test_timeout_names_leaks(self):
+        """Test a pool timeout mentions connections that look leaked"""
+        pool = self.pool(size=1, timeout=0.01, leak_timeout=0)
+        pool.acquire()
+        with self.assertRaisesRegex(PoolTimeoutError, "look leaked"):
+            pool.acquire()
+
+
+class TestAsyncPool(unittest.IsolatedAsyncioTestCase):
+    """Test AsyncConnectionPool"""
+
+    async def asyncSetUp(self):
+        """Create an empty database and a pool of two connections to it"""
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp.name, 'users.db')
+        sqlite3.connect(self.path).close()
+        self.pool = AsyncConnectionPool(self.path, size=2, timeout=5)
+
+    async def asyncTearDown(self):
+        """Close the pool and remove the database"""
+        await self.pool.close()
+        self.tmp.cleanup()
+
+    async def test_connection_reused(self):
+        """Test a released connection is handed out again"""
+        conn = await self.pool.acquire()
+        await self.pool.release(conn)
+        self.assertIs(await self.pool.acquire(), conn)
+        await self.pool.release(conn)
+        self.assertEqual(self.pool.stats()['created'], 1)
+
+    async def test_waits_for_release(self):
+        """Test acquire waits for a release once size connections are out"""
+        first = await self.pool.acquire()
+        second = await self.pool.acquire()
+        waiter = asyncio.ensure_future(self.pool.acquire())
+        await asyncio.sleep(0.01)
+        self.assertFalse(waiter.done())
+        await self.pool.release(first)
+        self.assertIs(await waiter, first)
+        await self.pool.release(first)
+        await self.pool.release(second)
+        self.assertEqual(self.pool.stats()['waits'], 1)
+
+    async def test_timeout(self):
+        """Test acquire gives up after the pool's timeout"""
+        self.pool.timeout = 0.01
+        held = [await self.pool.acquire(), await self.pool.acquire()]
+        with self.assertRaises(PoolTimeoutError):
+            await self.pool.acquire()
+        for conn in held:
+            await self.pool.release(conn)
+        self.assertEqual(self.pool.stats()['timeouts'], 1)
+
+    async def test_discard(self):
+        """Test a discarded connection is closed and replaced"""
+        conn = await self.pool.acquire()
+        await self.pool.release(conn, discard=True)
+        fresh = await self.pool.acquire()
+        self.assertIsNot(fresh, conn)
+        await self.pool.release(fresh)
+        self.assertEqual(self.pool.stats()['open'], 1)
+
+    async def test_failed_release_frees_slot(self):
+        """Test a connection whose rollback fails gives its slot back"""
+        conn = await self.pool.acquire()
+        await conn.execute("BEGIN")
+        with patch.object(conn, 'rollback', AsyncMock(side_effect=RuntimeError)):
+            with self.assertRaises(RuntimeError):
+                await self.pool.release(conn)
+        await conn.close()
+        stats = self.pool.stats()
+        self.assertEqual((stats['open'], stats['in_use']), (0, 0))
+
+
+class TestExitWithLoop(PoolTestCase):
+    """Test a program using the async pools exits once its loop is done"""
+
+    def run_script(self, close):
+        """Run EXIT_SCRIPT in a fresh interpreter next to users.db"""
+        conn = sqlite3.connect(self.path)
+        conn.execute("CREATE TABLE users (id INTEGER PRIMARY KEY, name TEXT)")
+        conn.execute("INSERT INTO users VALUES (1, 'Al')")
+        conn.commit()
+        conn.close()
+        env = dict(os.environ, PYTHONPATH=os.pathsep.join([HERE] + sys.path))
+        try:
+            return subprocess.run(
+                [sys.executable, '-c', EXIT_SCRIPT % close],
+                cwd=os.path.dirname(self.path), env=env,
+                capture_output=True, text=True, timeout=30)
+        except subprocess.TimeoutExpired:
+            self.fail("interpreter did not exit after asyncio.run()")
+
+    def test_pools_closed_with_loop(self):
+        """Test asyncio.run() alone closes the pools"""
+        result = self.run_script(close=False)
+        self.assertEqual(result.returncode, 0, result.stderr)
+        self.assertIn("[('Bo',)]", result.stdout)
+        self.assertNotIn("Traceback", result.stderr)
+
+    def test_closed_early(self):
+        """Test closing the pools before the loop ends is still fine"""
+        result = self.run_script(close=True)
+        self.assertEqual(result.returncode, 0, result.stderr)
+        self.assertNotIn("Traceback", result.stderr)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+"""Test metrics module"""
+import sqlite3
+import unittest
+from unittest.mock import patch
+
+import aiosqlite
+
+from metrics import Histogram, MetricsRegistry, instrument
+from query_log import fingerprint
+
+
+class FakeClock:
+    """Stands in for the time module; each call is `step` seconds later"""
+
+    def __init__(self, step):
+        self.now = 0.0
+        self.step = step
+
+    def perf_counter(self):
+        """Current fake time, then move it forward"""
+        now = self.now
+        self.now += self.step
+        return now
+
+
+class MetricsTestCase(unittest.TestCase):
+    """Base class with a fresh registry and calls that take 3 ms"""
+
+    def setUp(self):
+        """Patch the clock of the metrics module"""
+        self.metrics = MetricsRegistry()
+        patcher = patch('metrics.time', FakeClock(0.003))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def assert_in_bucket(self, label, below, upper):
+        """Assert the label's one call lands in the (below, upper] bucket"""
+        lines = self.metrics.to_prometheus().splitlines()
+        bucket = f'db_query_duration_seconds_bucket{{query="{label}"'
+        self.assertIn(f'{bucket},le="{below}"}} 0', lines)
+        self.assertIn(f'{bucket},le="{upper}"}} 1', lines)
+
+
+class TestHistogram(unittest.TestCase):
+    """Test Histogram buckets and quantiles"""
+
+    def test_bucket_bounds_inclusive(self):
+        """Test a value equal to an upper bound lands in that bucket"""
+        histogram = Histogram((0.1, 1.0))
+        for value in (0.1, 0.5, 5.0):
+            histogram.observe(value)
+        self.assertEqual(histogram.counts, [1, 1, 1])
+
+    def test_quantiles(self):
+        """Test quantiles interpolate inside the bucket and stop at the max"""
+        histogram = Histogram((1.0, 2.0))
+        for value in (1.5, 1.5, 1.5, 1.8):
+            histogram.observe(value)
+        self.assertAlmostEqual(histogram.quantile(0.5), 1.5)
+        self.assertEqual(histogram.quantile(0.99), 1.8)
+        self.assertIsNone(Histogram().quantile(0.5))
+
+
+class TestInstrument(MetricsTestCase):
+    """Test @instrument"""
+
+    def test_query_argument(self):
+        """Test a call is filed under its query's fingerprint and bucket"""
+        @instrument(metrics=self.metrics)
+        def run(query):
+            return query
+
+        run(query="SELECT * FROM users WHERE id = 1")
+        label = fingerprint("SELECT * FROM users WHERE id = 1")
+        self.assertEqual(self.metrics.snapshot()['queries'][label]['count'], 1)
+        self.assert_in_bucket(label, 0.0025, 0.005)
+
+    def test_traced_statement(self):
+        """Test without a query the first statement run on conn is used"""
+        @instrument(metrics=self.metrics)
+        def run(conn):
+            conn.execute("BEGIN")
+            conn.execute("SELECT 1")
+
+        conn = sqlite3.connect(':memory:')
+        self.addCleanup(conn.close)
+        run(conn=conn)
+        self.assertEqual(list(self.metrics.snapshot()['queries']),
+                         [fingerprint("SELECT 1")])
+
+    def test_error_counted(self):
+        """Test a failing call is timed and counted as an error"""
+        @instrument(metrics=self.metrics)
+        def broken():
+            raise sqlite3.OperationalError("no such table")
+
+        with self.assertRaises(sqlite3.OperationalError):
+            broken()
+        stats = self.metrics.snapshot()['queries'][broken.__qualname__]
+        self.assertEqual((stats['count'], stats['errors']), (1, 1))
+
+
+class TestInstrumentAsync(MetricsTestCase, unittest.IsolatedAsyncioTestCase):
+    """Test @instrument on coroutine functions"""
+
+    async def test_coroutine_timed(self):
+        """Test a coroutine is timed until it finishes, under its statement"""
+        @instrument(metrics=self.metrics)
+        async def run(conn):
+            async with conn.execute("SELECT 1") as cursor:
+                return await cursor.fetchall()
+
+        async with aiosqlite.connect(':memory:') as conn:
+            self.assertEqual(await run(conn=conn), [(1,)])
+        label = fingerprint("SELECT 1")
+        self.assertEqual(self.metrics.snapshot()['queries'][label]['count'], 1)
+        self.assert_in_bucket(label, 0.0025, 0.005)
+
+
+if __name__ == '__main__':
+    unittest.main()
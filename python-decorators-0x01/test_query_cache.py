@@ -0,0 +1,297 @@
+#!/usr/bin/env python3
+"""Test query_cache module"""
+import asyncio
+import threading
+import time
+import unittest
+from unittest.mock import patch
+
+from query_cache import QueryCache, _sizeof
+
+
+class FakeClock:
+    """Stands in for the time module so tests can move time forward"""
+
+    def __init__(self):
+        self.now = 1000.0
+
+    def monotonic(self):
+        """Current fake time"""
+        return self.now
+
+    def advance(self, seconds):
+        """Move the clock forward"""
+        self.now += seconds
+
+
+class ClockTestCase(unittest.TestCase):
+    """Base class running every test on a FakeClock"""
+
+    def setUp(self):
+        """Patch query_cache's clock"""
+        self.clock = FakeClock()
+        patcher = patch('query_cache.time', self.clock)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+
+class TestEviction(ClockTestCase):
+    """Test QueryCache evicts least-recently-used entries first"""
+
+    def test_max_entries(self):
+        """Test the least recently read entry goes first"""
+        cache = QueryCache(max_entries=3)
+        for name in 'abc':
+            cache.set(('db', name), name)
+        cache.get(('db', 'a'))
+        cache.set(('db', 'd'), 'd')
+        self.assertEqual(cache.get(('db', 'b')), (False, None))
+        for name in 'acd':
+            self.assertEqual(cache.get(('db', name)), (True, name))
+        self.assertEqual(cache.stats()['evictions'], 1)
+
+    def test_overwrite_refreshes_recency(self):
+        """Test storing a key again makes it the most recent"""
+        cache = QueryCache(max_entries=2)
+        cache.set(('db', 'a'), 1)
+        cache.set(('db', 'b'), 2)
+        cache.set(('db', 'a'), 3)
+        cache.set(('db', 'c'), 4)
+        self.assertEqual(cache.get(('db', 'a')), (True, 3))
+        self.assertEqual(cache.get(('db', 'b')), (False, None))
+
+    def test_max_bytes(self):
+        """Test entries are evicted once their total size is too large"""
+        value = 'x' * 1000
+        cache = QueryCache(max_bytes=2 * _sizeof(value) + 10)
+        cache.set(('db', 'a'), value)
+        cache.set(('db', 'b'), value)
+        cache.set(('db', 'c'), value)
+        self.assertEqual(cache.get(('db', 'a')), (False, None))
+        self.assertEqual(cache.stats()['entries'], 2)
+        self.assertEqual(cache.stats()['bytes'], 2 * _sizeof(value))
+
+    def test_oversized_value_not_stored(self):
+        """Test a value larger than max_bytes is never cached"""
+        cache = QueryCache(max_bytes=100)
+        cache.set(('db', 'small'), 1)
+        cache.set(('db', 'big'), 'x' * 1000)
+        self.assertEqual(cache.get(('db', 'big')), (False, None))
+        self.assertEqual(cache.get(('db', 'small')), (True, 1))
+
+
+class TestExpiry(ClockTestCase):
+    """Test QueryCache TTLs"""
+
+    def test_ttl(self):
+        """Test an entry is served until its TTL runs out"""
+        cache = QueryCache(ttl=10)
+        cache.set(('db', 'a'), 1)
+        self.clock.advance(9.9)
+        self.assertEqual(cache.get(('db', 'a')), (True, 1))
+        self.clock.advance(0.1)
+        self.assertEqual(cache.get(('db', 'a')), (False, None))
+        stats = cache.stats()
+        self.assertEqual((stats['expirations'], stats['entries']), (1, 0))
+
+    def test_per_entry_ttl(self):
+        """Test a TTL given to set() overrides the cache's"""
+        cache = QueryCache(ttl=10)
+        cache.set(('db', 'short'), 1, ttl=1)
+        cache.set(('db', 'long'), 2, ttl=100)
+        self.clock.advance(50)
+        self.assertEqual(cache.get(('db', 'short')), (False, None))
+        self.assertEqual(cache.get(('db', 'long')), (True, 2))
+
+
+class TestInvalidation(ClockTestCase):
+    """Test QueryCache.invalidate"""
+
+    def setUp(self):
+        """Cache entries reading from different tables and databases"""
+        super().setUp()
+        self.cache = QueryCache()
+        self.cache.set(('a.db', 'users'), 1, tables=['users'])
+        self.cache.set(('a.db', 'join'), 2, tables=['users', 'orders'])
+        self.cache.set(('a.db', 'orders'), 3, tables=['orders'])
+        self.cache.set(('b.db', 'users'), 4, tables=['users'])
+
+    def test_drops_readers_of_table(self):
+        """Test every entry reading the table is dropped, and only those"""
+        self.assertEqual(self.cache.invalidate('a.db', ['Users']), 2)
+        self.assertEqual(self.cache.get(('a.db', 'users')), (False, None))
+        self.assertEqual(self.cache.get(('a.db', 'join')), (False, None))
+        self.assertEqual(self.cache.get(('a.db', 'orders')), (True, 3))
+        self.assertEqual(self.cache.get(('b.db', 'users')), (True, 4))
+
+    def test_evicted_entry_leaves_no_table_index(self):
+        """Test eviction also forgets which tables the entry read"""
+        cache = QueryCache(max_entries=1)
+        cache.set(('a.db', 'users'), 1, tables=['users'])
+        cache.set(('a.db', 'orders'), 2, tables=['orders'])
+        self.assertEqual(cache.invalidate('a.db', ['users']), 0)
+        self.assertEqual(cache.get(('a.db', 'orders')), (True, 2))
+
+
+class TestStaleServing(ClockTestCase):
+    """Test get_or_compute once an entry has expired"""
+
+    def setUp(self):
+        """A cache holding 'old' for 10 s, servable stale for 5 s more"""
+        super().setUp()
+        self.cache = QueryCache()
+        self.key = ('db', 'query')
+        self.refreshed = threading.Event()
+        self.cache.get_or_compute(self.key, lambda: 'old', ttl=10, stale_ttl=5)
+
+    def refresh(self):
+        """Background refresh producing 'new'"""
+        self.refreshed.set()
+        return 'new'
+
+    def test_hit_before_expiry(self):
+        """Test a fresh entry is a plain hit"""
+        self.clock.advance(9)
+        self.assertEqual(self.cache.get_or_compute(
+            self.key, lambda: 'computed', refresh=self.refresh), ('old', 'hit'))
+
+    def test_stale_served_while_refreshing(self):
+        """Test an expired entry is served at once and refreshed in the background"""
+        self.clock.advance(12)
+        self.assertEqual(self.cache.get_or_compute(
+            self.key, lambda: 'computed', ttl=10, stale_ttl=5,
+            refresh=self.refresh), ('old', 'stale'))
+        self.assertTrue(self.refreshed.wait(5))
+        for _ in range(500):
+            if self.cache.get(self.key) == (True, 'new'):
+                break
+            time.sleep(0.01)
+        self.assertEqual(self.cache.get(self.key), (True, 'new'))
+        self.assertEqual(self.cache.stats()['refreshes'], 1)
+
+    def test_expired_without_refresh(self):
+        """Test an expired entry is recomputed when no refresh is given"""
+        self.clock.advance(12)
+        self.assertEqual(self.cache.get_or_compute(self.key, lambda: 'computed'),
+                         ('computed', 'miss'))
+
+    def test_past_stale_window(self):
+        """Test an entry past its stale window is recomputed, not served"""
+        self.clock.advance(16)
+        self.assertEqual(self.cache.get_or_compute(
+            self.key, lambda: 'computed', refresh=self.refresh),
+            ('computed', 'miss'))
+        self.assertFalse(self.refreshed.is_set())
+
+
+class TestSingleFlight(unittest.TestCase):
+    """Test concurrent misses on one key share one computation"""
+
+    def setUp(self):
+        """A cache and a computation that blocks until released"""
+        self.cache = QueryCache()
+        self.key = ('a.db', 'SELECT * FROM users')
+        self.started = threading.Event()
+        self.release = threading.Event()
+        self.calls = 0
+
+    def blocking(self, result):
+        """Return a compute() that blocks, then returns or raises result"""
+        def compute():
+            self.calls += 1
+            self.started.set()
+            self.release.wait(5)
+            if isinstance(result, BaseException):
+                raise result
+            return result
+        return compute
+
+    def start(self, compute, callers):
+        """Run get_or_compute in threads; return their outcomes and threads"""
+        outcomes = [None] * callers
+
+        def call(index):
+            try:
+                outcomes[index] = self.cache.get_or_compute(
+                    self.key, compute, tables=['users'])
+            except Exception as e:
+                outcomes[index] = e
+
+        threads = [threading.Thread(target=call, args=(i,)) for i in range(callers)]
+        threads[0].start()
+        self.assertTrue(self.started.wait(5))
+        for thread in threads[1:]:
+            thread.start()
+        for _ in range(500):
+            if self.cache.stats()['shared_misses'] == callers - 1:
+                break
+            time.sleep(0.01)
+        return outcomes, threads
+
+    def finish(self, threads):
+        """Release the computation and wait for every caller"""
+        self.release.set()
+        for thread in threads:
+            thread.join(5)
+
+    def test_shared_result(self):
+        """Test waiting callers get the leader's value"""
+        outcomes, threads = self.start(self.blocking('rows'), 4)
+        self.finish(threads)
+        self.assertEqual(self.calls, 1)
+        self.assertEqual(sorted(outcomes),
+                         [('rows', 'miss')] + [('rows', 'shared')] * 3)
+
+    def test_shared_exception(self):
+        """Test waiting callers get the leader's exception, and it is not cached"""
+        error = ValueError("no such table")
+        outcomes, threads = self.start(self.blocking(error), 4)
+        self.finish(threads)
+        self.assertEqual(self.calls, 1)
+        self.assertEqual(outcomes, [error] * 4)
+        self.assertEqual(self.cache.get_or_compute(self.key, lambda: 'rows'),
+                         ('rows', 'miss'))
+
+    def test_invalidation_during_compute(self):
+        """Test a result computed across an invalidation is returned, not cached"""
+        outcomes, threads = self.start(self.blocking('old rows'), 1)
+        self.cache.invalidate('a.db', ['users'])
+        self.finish(threads)
+        self.assertEqual(outcomes, [('old rows', 'miss')])
+        self.assertEqual(self.cache.get(self.key), (False, None))
+
+    def test_invalidation_of_other_table(self):
+        """Test an invalidation of an unrelated table does not block caching"""
+        outcomes, threads = self.start(self.blocking('rows'), 1)
+        self.cache.invalidate('a.db', ['orders'])
+        self.finish(threads)
+        self.assertEqual(self.cache.get(self.key), (True, 'rows'))
+
+
+class TestSingleFlightAsync(unittest.IsolatedAsyncioTestCase):
+    """Test get_or_compute_async shares one computation between tasks"""
+
+    async def test_shared_exception(self):
+        """Test every waiting task gets the leader's exception"""
+        cache = QueryCache()
+        release = asyncio.Event()
+        error = ValueError("no such table")
+        calls = []
+
+        async def compute():
+            calls.append(1)
+            await release.wait()
+            raise error
+
+        tasks = [asyncio.ensure_future(cache.get_or_compute_async(('db', 'q'), compute))
+                 for _ in range(3)]
+        await asyncio.sleep(0)
+        release.set()
+        outcomes = await asyncio.gather(*tasks, return_exceptions=True)
+        self.assertEqual(outcomes, [error] * 3)
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(cache.stats()['shared_misses'], 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,195 @@
+#!/usr/bin/env python3
+"""Test the retry_on_failure decorator of 3-retry_on_failure"""
+import importlib
+import sqlite3
+import unittest
+from types import SimpleNamespace
+from unittest.mock import patch
+
+retry = importlib.import_module('3-retry_on_failure')
+CircuitBreaker = retry.CircuitBreaker
+CircuitOpenError = retry.CircuitOpenError
+RetryBudget = retry.RetryBudget
+retry_on_failure = retry.retry_on_failure
+
+LOCKED = sqlite3.OperationalError("database is locked")
+NO_TABLE = sqlite3.OperationalError("no such table: users")
+
+
+class FakeTime:
+    """Stands in for the time module: sleeping only moves the clock"""
+
+    def __init__(self):
+        self.now = 1000.0
+        self.sleeps = []
+
+    def monotonic(self):
+        """Current fake time"""
+        return self.now
+
+    def sleep(self, seconds):
+        """Record the sleep and move the clock forward"""
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+
+class RetryTestCase(unittest.TestCase):
+    """Base class with a fake clock and the longest possible backoffs"""
+
+    def setUp(self):
+        """Patch the module's clock and make every wait its upper bound"""
+        self.time = FakeTime()
+        for name, value in (('time', self.time),
+                            ('random', SimpleNamespace(uniform=max))):
+            patcher = patch.object(retry, name, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.calls = 0
+
+    def failing(self, *errors, result='rows'):
+        """A function raising the given errors in turn, then returning result"""
+        errors = list(errors)
+
+        def func():
+            self.calls += 1
+            if errors:
+                raise errors.pop(0)
+            return result
+        return func
+
+
+class TestRetries(RetryTestCase):
+    """Test which errors are retried, and how long the waits are"""
+
+    def test_backoff_bounds(self):
+        """Test waits double from delay and are capped at max_delay"""
+        func = retry_on_failure(retries=5, delay=1, max_delay=3,
+                                budget=RetryBudget())(self.failing(*[LOCKED] * 4))
+        self.assertEqual(func(), 'rows')
+        self.assertEqual(self.time.sleeps, [1, 2, 3, 3])
+
+    def test_gives_up_after_retries(self):
+        """Test the last attempt's error is raised"""
+        func = retry_on_failure(retries=3, delay=1,
+                                budget=RetryBudget())(self.failing(*[LOCKED] * 5))
+        with self.assertRaises(sqlite3.OperationalError):
+            func()
+        self.assertEqual(self.calls, 3)
+
+    def test_permanent_error_not_retried(self):
+        """Test an error retry_on rejects is raised at once"""
+        func = retry_on_failure(retries=3, budget=RetryBudget())(self.failing(NO_TABLE))
+        with self.assertRaises(sqlite3.OperationalError):
+            func()
+        self.assertEqual((self.calls, self.time.sleeps), (1, []))
+
+    def test_retries_validated(self):
+        """Test fewer than one attempt is refused"""
+        with self.assertRaises(ValueError):
+            retry_on_failure(retries=0)
+
+
+class TestBudget(RetryTestCase):
+    """Test a spent RetryBudget stops retries"""
+
+    def test_budget_exhaustion(self):
+        """Test once the tokens are spent failures are raised right away"""
+        budget = RetryBudget(ratio=0.0, max_tokens=1.0)
+        func = retry_on_failure(retries=5, budget=budget)(self.failing(*[LOCKED] * 10))
+        with self.assertRaises(sqlite3.OperationalError):
+            func()
+        self.assertEqual(self.calls, 2)
+        with self.assertRaises(sqlite3.OperationalError):
+            func()
+        self.assertEqual(self.calls, 3)
+
+    def test_calls_refill_budget(self):
+        """Test every call deposits ratio tokens"""
+        budget = RetryBudget(ratio=0.5, max_tokens=1.0)
+        self.assertTrue(budget.withdraw())
+        self.assertFalse(budget.withdraw())
+        budget.deposit()
+        budget.deposit()
+        self.assertTrue(budget.withdraw())
+
+
+class TestBreaker(RetryTestCase):
+    """Test the circuit breaker through the decorator"""
+
+    def setUp(self):
+        """A breaker opening after two failed calls for 10 s"""
+        super().setUp()
+        self.breaker = CircuitBreaker(failure_threshold=2, cooldown=10)
+
+    def decorate(self, func):
+        """Retry once at most, reporting to the breaker"""
+        return retry_on_failure(retries=1, budget=RetryBudget(),
+                                breaker=self.breaker)(func)
+
+    def open_circuit(self):
+        """Fail two calls with a transient error"""
+        func = self.decorate(self.failing(LOCKED, LOCKED))
+        for _ in range(2):
+            with self.assertRaises(sqlite3.OperationalError):
+                func()
+
+    def test_opens(self):
+        """Test calls fail fast without running once the circuit opens"""
+        self.open_circuit()
+        func = self.decorate(self.failing())
+        with self.assertRaises(CircuitOpenError):
+            func()
+        self.assertEqual(self.calls, 2)
+
+    def test_permanent_errors_do_not_open(self):
+        """Test errors retry_on rejects are not counted as failures"""
+        func = self.decorate(self.failing(NO_TABLE, NO_TABLE, NO_TABLE))
+        for _ in range(3):
+            with self.assertRaises(sqlite3.OperationalError):
+                func()
+        self.assertEqual(self.calls, 3)
+
+    def test_half_open_trial_closes(self):
+        """Test after the cooldown one trial runs and its success closes the circuit"""
+        self.open_circuit()
+        self.time.now += 10
+        func = self.decorate(self.failing())
+        self.assertEqual(func(), 'rows')
+        self.assertEqual(func(), 'rows')
+
+    def test_half_open_trial_reopens(self):
+        """Test a failed trial opens the circuit for another cooldown"""
+        self.open_circuit()
+        self.time.now += 10
+        with self.assertRaises(sqlite3.OperationalError):
+            self.decorate(self.failing(LOCKED))()
+        with self.assertRaises(CircuitOpenError):
+            self.decorate(self.failing())()
+
+    def test_half_open_admits_one_trial(self):
+        """Test other calls fail fast while the trial is running"""
+        self.open_circuit()
+        self.time.now += 10
+        self.breaker.before_call()
+        with self.assertRaisesRegex(CircuitOpenError, "half-open"):
+            self.breaker.before_call()
+
+
+class TestAsyncRetries(unittest.IsolatedAsyncioTestCase):
+    """Test the coroutine wrapper"""
+
+    async def test_retries_then_succeeds(self):
+        """Test a coroutine is retried on a transient error"""
+        errors = [LOCKED]
+
+        @retry_on_failure(retries=2, delay=0, budget=RetryBudget())
+        async def fetch():
+            if errors:
+                raise errors.pop()
+            return 'rows'
+
+        self.assertEqual(await fetch(), 'rows')
+
+
+if __name__ == '__main__':
+    unittest.main()
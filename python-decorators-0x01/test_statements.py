@@ -0,0 +1,46 @@
+#!/usr/bin/env python3
+"""Test statements module"""
+import sqlite3
+import unittest
+
+from statements import StatementRegistry
+
+
+class TestStatementRegistry(unittest.TestCase):
+    """Test StatementRegistry lookups and counters"""
+
+    def setUp(self):
+        """A registry holding at most two ad hoc statements"""
+        self.registry = StatementRegistry(max_adhoc=2)
+        self.conn = sqlite3.connect(':memory:')
+        self.addCleanup(self.conn.close)
+
+    def test_registered_lookup_by_sql(self):
+        """Test statement() finds a registered statement by its SQL"""
+        named = self.registry.register('one', "SELECT 1")
+        self.assertIs(self.registry.statement("SELECT 1"), named)
+        self.assertIs(self.registry['one'], named)
+
+    def test_adhoc_statements_capped(self):
+        """Test only the most recently used ad hoc statements are kept"""
+        self.registry.register('one', "SELECT 1")
+        for n in range(2, 6):
+            self.registry.statement(f"SELECT {n}").fetchall(self.conn)
+        self.registry.statement("SELECT 4")
+        self.registry.statement("SELECT 6")
+        names = sorted(row['name'] for row in self.registry.stats())
+        self.assertEqual(names, ['SELECT 4', 'SELECT 6', 'one'])
+        self.assertEqual(len(self.registry), 3)
+
+    def test_counters(self):
+        """Test executions and errors are counted per statement"""
+        statement = self.registry.statement("SELECT ?")
+        self.assertEqual(statement.fetchone(self.conn, (7,)), (7,))
+        with self.assertRaises(sqlite3.ProgrammingError):
+            statement.fetchone(self.conn, ())
+        stats = self.registry.stats()[0]
+        self.assertEqual((stats['executions'], stats['errors']), (2, 1))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+"""Test the group_commit batches of 2-transactional"""
+import importlib
+import os
+import sqlite3
+import tempfile
+import unittest
+from unittest.mock import patch
+
+import connection_pool
+import metrics
+from connection_pool import with_db_connection
+
+transactional_module = importlib.import_module('2-transactional')
+group_commit = transactional_module.group_commit
+transactional = transactional_module.transactional
+
+
+class GroupCommitTestCase(unittest.TestCase):
+    """Base class with an empty users table and a function writing to it"""
+
+    def setUp(self):
+        """Create the table and a fresh metrics registry"""
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.path = os.path.join(tmp.name, 'users.db')
+        conn = sqlite3.connect(self.path)
+        conn.execute("CREATE TABLE users (id INTEGER PRIMARY KEY, name TEXT)")
+        conn.close()
+        self.addCleanup(lambda: connection_pool._pools.pop(self.path).close())
+        patcher = patch.object(metrics, 'registry', metrics.MetricsRegistry())
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        @with_db_connection(database=self.path)
+        @transactional
+        def add_user(conn, user_id, fail=False):
+            conn.execute("INSERT INTO users VALUES (?, 'user')", (user_id,))
+            if fail:
+                raise ValueError("bad user")
+        self.add_user = add_user
+
+    def committed(self):
+        """The ids another connection can see"""
+        conn = sqlite3.connect(self.path)
+        try:
+            return [row[0] for row in conn.execute("SELECT id FROM users ORDER BY id")]
+        finally:
+            conn.close()
+
+    def transactions(self):
+        """Transaction counters recorded so far"""
+        return metrics.registry.snapshot()['transactions']
+
+
+class TestGroupCommit(GroupCommitTestCase):
+    """Test calls batched by group_commit()"""
+
+    def test_failing_item_rolls_back_alone(self):
+        """Test a failing call is undone and the others are committed"""
+        with group_commit(self.path) as batch:
+            self.add_user(user_id=1)
+            with self.assertRaises(ValueError):
+                self.add_user(user_id=2, fail=True)
+            self.add_user(user_id=3)
+        self.assertEqual(self.committed(), [1, 3])
+        self.assertEqual((batch.operations, batch.failed, batch.commits), (2, 1, 1))
+        self.assertEqual(self.transactions(),
+                         {'commit': 1, 'rollback': 0, 'savepoint_rollback': 1})
+
+    def test_commits_every_n_calls(self):
+        """Test the batch commits after every `every` successful calls"""
+        with group_commit(self.path, every=2) as batch:
+            for user_id in range(1, 4):
+                self.add_user(user_id=user_id)
+            self.assertEqual(self.committed(), [1, 2])
+        self.assertEqual(self.committed(), [1, 2, 3])
+        self.assertEqual(batch.commits, 2)
+
+    def test_block_error_rolls_back_pending(self):
+        """Test an error leaving the block drops the uncommitted calls"""
+        with self.assertRaises(RuntimeError):
+            with group_commit(self.path, every=2):
+                for user_id in range(1, 4):
+                    self.add_user(user_id=user_id)
+                raise RuntimeError("stop")
+        self.assertEqual(self.committed(), [1, 2])
+        self.assertEqual(self.transactions()['rollback'], 1)
+
+    def test_outside_batch(self):
+        """Test a failing call outside a batch is a plain rollback"""
+        with self.assertRaises(ValueError):
+            self.add_user(user_id=1, fail=True)
+        self.assertEqual(self.committed(), [])
+        self.assertEqual(self.transactions()['rollback'], 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,44 +1,22 @@
 import mysql.connector
+import seed
 from typing import Dict, Generator
 
-def stream_users() -> Generator[Dict[str, str | int], None, None]:
+def stream_users(prefetch: int = 1000) -> Generator[Dict[str, str | int], None, None]:
     """
     Generator function that streams rows from user_data table one by one.
+
+    Rows are read through an unbuffered cursor, prefetch rows at a time, so
+    memory use does not grow with the size of the table.
+
+    Args:
+        prefetch: Number of rows fetched from the server per round trip
     
     Yields:
         Dict: A dictionary representing a row from user_data table with keys:
               'user_id', 'name', 'email', 'age'
     """
-    connection = None
-    cursor = None
-    
     try:
-        # Connect to the database
-        connection = mysql.connector.connect(
-            host='localhost',
-            user='root',
-            password='password',
-            database='ALX_prodev'
-        )
-        
-        # Create a server-side cursor (more memory efficient)
-        cursor = connection.cursor(dictionary=True)
-        
-        # Execute the query
-        cursor.execute("SELECT * FROM user_data")
-        
-        # Stream rows one by one
-        while True:
-            row = cursor.fetchone()
-            if row is None:
-                break
-            yield row
-            
+        yield from seed.stream_rows("SELECT * FROM user_data", prefetch=prefetch)
     except mysql.connector.Error as e:
         print(f"Database error: {e}")
-    finally:
-        # Clean up resources
-        if cursor:
-            cursor.close()
-        if connection:
-            connection.close()
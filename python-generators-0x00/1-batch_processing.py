@@ -1,29 +1,49 @@
-import mysql.connector
-from typing import Generator, Dict, List
-
-def stream_users_in_batches(batch_size: int) -> Generator[List[Dict[str, str | int]], None, None]:
-    """Stream users from database in batches"""
-    conn = mysql.connector.connect(
-        host='localhost',
-        user='root',
-        password='password',
-        database='ALX_prodev'
-    )
-    cursor = conn.cursor(dictionary=True)
-    cursor.execute("SELECT * FROM user_data")
-    
-    try:
-        while True:
-            batch = cursor.fetchmany(batch_size)
-            if not batch:
-                return  # Explicit return when done
-            yield batch  # Yield each batch
-    finally:
-        cursor.close()
-        conn.close()
-
-def batch_processing(batch_size: int = 50) -> None:
-    """Process batches of users and filter those over 25"""
+import seed
+from columnar import ColumnBatch
+from partitioned_scan import partitioned_scan
+from typing import Generator, Dict, List, Optional, Union
+
+USER_COLUMNS = ('user_id', 'name', 'email', 'age')
+# user_id is a VARCHAR(36) uuid and age a DECIMAL(10, 0)
+USER_DTYPES = ('S36', 'S', 'S', 'int64')
+
+def stream_users_in_batches(batch_size: int, columnar: bool = False
+                            ) -> Generator[Union[List[Dict[str, str | int]], ColumnBatch], None, None]:
+    """
+    Stream users from database in batches
+
+    With columnar=True each batch is a ColumnBatch of NumPy arrays instead of
+    a list of row dicts, so it can be filtered without a Python loop.
+    """
+    if not columnar:
+        yield from seed.stream_batches("SELECT * FROM user_data", batch_size=batch_size)
+        return
+
+    query = f"SELECT {', '.join(USER_COLUMNS)} FROM user_data"
+    for rows in seed.stream_batches(query, batch_size=batch_size, dictionary=False):
+        yield ColumnBatch.from_rows(rows, USER_COLUMNS, USER_DTYPES)
+
+def batch_processing(batch_size: int = 50, partitions: Optional[int] = None,
+                     columnar: bool = False) -> None:
+    """
+    Process batches of users and filter those over 25
+
+    With partitions set, the table is scanned in parallel key ranges by that
+    many worker processes and rows are printed as they arrive. With
+    columnar=True the age filter runs vectorized over each batch.
+    """
+    if partitions:
+        for user in partitioned_scan(where="age > %s", params=(25,),
+                                     partitions=partitions, batch_size=batch_size):
+            print(user)
+        return
+
+    if columnar:
+        for batch in stream_users_in_batches(batch_size, columnar=True):
+            for user in batch.filter(batch['age'] > 25).to_rows():
+                print(user)
+        return
+
     for batch in stream_users_in_batches(batch_size):
         for user in batch:
             if user['age'] > 25:
@@ -1,21 +1,198 @@
 #!/usr/bin/python3
+import base64
+import json
+import queue
+import re
+import threading
 import seed
 
-def paginate_users(page_size, offset):
-    """Fetch a page of users from the database"""
-    connection = seed.connect_to_prodev()
+_IDENTIFIER = re.compile(r'^[A-Za-z_][A-Za-z0-9_]*$')
+
+
+class Page(list):
+    """A page of rows that also carries the cursor for the following page."""
+
+    def __init__(self, rows, next_cursor=None):
+        super().__init__(rows)
+        self.next_cursor = next_cursor
+
+
+def encode_cursor(sort_key, values):
+    """Pack the sort key values of the last row into an opaque token"""
+    payload = json.dumps({'k': sort_key, 'v': list(values)}, default=str)
+    return base64.urlsafe_b64encode(payload.encode()).decode()
+
+
+def decode_cursor(token, sort_key):
+    """Unpack a token produced by encode_cursor for the given sort key"""
+    try:
+        payload = json.loads(base64.urlsafe_b64decode(token.encode()))
+    except ValueError as e:
+        raise ValueError(f"Invalid pagination cursor: {token!r}") from e
+    if payload.get('k') != sort_key:
+        raise ValueError(f"Cursor was issued for sort key {payload.get('k')!r}, "
+                         f"not {sort_key!r}")
+    return payload['v']
+
+
+def _fetch_page(query, params, connection=None):
+    """Run a page query on the given connection or one borrowed from the pool"""
+    if connection is None:
+        with seed.connection() as connection:
+            return _fetch_page(query, params, connection)
     cursor = connection.cursor(dictionary=True)
-    cursor.execute(f"SELECT * FROM user_data LIMIT {page_size} OFFSET {offset}")
-    rows = cursor.fetchall()
-    connection.close()
-    return rows
-
-def lazy_paginate(page_size):
-    """Generator function to lazily paginate through users"""
-    offset = 0
-    while True:
-        page = paginate_users(page_size, offset)
-        if not page:
-            break
-        yield page
-        offset += page_size
+    try:
+        cursor.execute(query, params)
+        return cursor.fetchall()
+    finally:
+        cursor.close()
+
+
+def paginate_users(page_size, offset, connection=None):
+    """Fetch a page of users from the database"""
+    return _fetch_page("SELECT * FROM user_data LIMIT %s OFFSET %s",
+                       (page_size, offset), connection)
+
+
+def keyset_query(page_size, cursor=None, sort_key='user_id'):
+    """
+    Build the keyset query for the page after a cursor.
+
+    Returns:
+        tuple: (query, params, key_columns), with %s placeholders
+    """
+    if not _IDENTIFIER.match(sort_key):
+        raise ValueError(f"Invalid sort key: {sort_key!r}")
+    key_columns = [sort_key] if sort_key == 'user_id' else [sort_key, 'user_id']
+    columns = ", ".join(key_columns)
+
+    query = "SELECT * FROM user_data"
+    params = []
+    if cursor is not None:
+        after = decode_cursor(cursor, sort_key)
+        placeholders = ", ".join(["%s"] * len(key_columns))
+        query += f" WHERE ({columns}) > ({placeholders})"
+        params.extend(after)
+    query += f" ORDER BY {columns} LIMIT %s"
+    params.append(page_size)
+    return query, params, key_columns
+
+
+def paginate_users_after(page_size, cursor=None, sort_key='user_id',
+                         connection=None):
+    """
+    Fetch the page of users that follows a keyset cursor.
+
+    The page starts right after the row the cursor points at, so the cost of
+    a page does not depend on how deep into the table it is, as long as
+    sort_key is indexed. Sort keys other than user_id are tie-broken on
+    user_id so that pages never skip or repeat rows.
+
+    Args:
+        page_size: Number of rows per page
+        cursor: Token from a previous page's next_cursor, None for page one
+        sort_key: Indexed column to page on
+        connection: Connection to reuse; one is borrowed from the pool if omitted
+
+    Returns:
+        Page: The rows, with next_cursor set to None on the last page
+    """
+    query, params, key_columns = keyset_query(page_size, cursor, sort_key)
+    rows = _fetch_page(query, params, connection)
+    next_cursor = None
+    if len(rows) == page_size:
+        last = rows[-1]
+        next_cursor = encode_cursor(sort_key, [last[c] for c in key_columns])
+    return Page(rows, next_cursor)
+
+
+def _read_ahead(pages, prefetch):
+    """
+    Run a page generator in a background thread, up to prefetch pages ahead.
+
+    The bounded queue blocks the producer once prefetch pages are waiting.
+    Closing the returned generator stops the producer and waits for it, so
+    its connection is back in the pool when close() returns.
+    """
+    buffer = queue.Queue(prefetch)
+    stop = threading.Event()
+
+    def put(item):
+        while not stop.is_set():
+            try:
+                buffer.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def produce():
+        try:
+            for page in pages:
+                if not put(('page', page)):
+                    break
+            else:
+                put(('done', None))
+        except Exception as e:
+            put(('error', e))
+        finally:
+            pages.close()
+
+    producer = threading.Thread(target=produce, name='lazy_paginate-prefetch',
+                                daemon=True)
+    producer.start()
+    try:
+        while True:
+            kind, payload = buffer.get()
+            if kind == 'page':
+                yield payload
+            elif kind == 'done':
+                break
+            else:
+                raise payload
+    finally:
+        stop.set()
+        producer.join()
+
+
+def _pages(page_size, mode, cursor, sort_key):
+    """Yield pages over a single pooled connection"""
+    with seed.connection() as connection:
+        if mode == 'offset':
+            offset = 0
+            while True:
+                page = paginate_users(page_size, offset, connection)
+                if not page:
+                    break
+                yield page
+                offset += page_size
+            return
+
+        while True:
+            page = paginate_users_after(page_size, cursor, sort_key, connection)
+            if not page:
+                break
+            yield page
+            cursor = page.next_cursor
+            if cursor is None:
+                break
+
+
+def lazy_paginate(page_size, mode='keyset', cursor=None, sort_key='user_id',
+                  prefetch=0):
+    """
+    Generator function to lazily paginate through users
+
+    Every page is fetched over the same connection. In the default keyset
+    mode each yielded page has a next_cursor attribute that can be passed
+    back as cursor to resume the scan later; mode='offset' keeps the old
+    LIMIT/OFFSET paging. With prefetch > 0, up to that many pages are
+    fetched by a background thread while the current page is consumed.
+    """
+    if mode not in ('keyset', 'offset'):
+        raise ValueError(f"Unknown pagination mode: {mode!r}")
+
+    pages = _pages(page_size, mode, cursor, sort_key)
+    if prefetch > 0:
+        pages = _read_ahead(pages, prefetch)
+    return pages
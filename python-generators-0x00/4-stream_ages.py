@@ -1,40 +1,29 @@
 #!/usr/bin/python3
-import mysql.connector
-from typing import Generator
+import seed
+from aggregates import summarize
+from partitioned_scan import partitioned_aggregate
+from typing import Generator, Optional
 
-def stream_user_ages() -> Generator[int, None, None]:
+def stream_user_ages(prefetch: int = 1000) -> Generator[int, None, None]:
     """Generator function that streams user ages one by one"""
-    conn = mysql.connector.connect(
-        host='localhost',
-        user='root',
-        password='',
-        database='ALX_prodev'
-    )
-    cursor = conn.cursor()
-    
-    try:
-        cursor.execute("SELECT age FROM user_data")
-        while True:
-            age = cursor.fetchone()
-            if age is None:
-                break
-            yield age[0]  # Yield just the age value
-    finally:
-        cursor.close()
-        conn.close()
+    for row in seed.stream_rows("SELECT age FROM user_data",
+                                prefetch=prefetch, dictionary=False):
+        yield row[0]  # Yield just the age value
 
-def calculate_average_age() -> None:
-    """Calculate and print the average age of users"""
-    total = 0
-    count = 0
-    
-    # First loop: iterate through ages
-    for age in stream_user_ages():
-        total += age
-        count += 1
-    
-    # Calculate average
-    average = total / count if count > 0 else 0
+def calculate_average_age(partitions: Optional[int] = None) -> None:
+    """
+    Calculate and print the average age of users
+
+    The mean is computed by MySQL, so only one row crosses the wire. With
+    partitions set, the ages are instead summed client-side in parallel key
+    ranges by that many worker processes.
+    """
+    if partitions:
+        result = partitioned_aggregate('age', partitions=partitions)
+        total, count = result['sum'], result['count']
+        average = total / count if count > 0 else 0
+    else:
+        average = summarize('user_data', 'age')['mean'] or 0
     
     # Print result
     print(f"Average age of users: {average:.2f}")
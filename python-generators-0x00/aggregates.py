@@ -0,0 +1,324 @@
+#!/usr/bin/python3
+"""
+Streaming aggregates over user_data.
+
+summarize() pushes the work down to MySQL when it is given a table name and
+falls back to one-pass online algorithms when it is given any iterable,
+such as the generators in this directory.
+"""
+import math
+import re
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Union
+
+import seed
+
+_IDENTIFIER = re.compile(r'^[A-Za-z_][A-Za-z0-9_]*$')
+
+
+class RunningStats:
+    """Count, sum, mean, variance, min and max in one pass (Welford)."""
+
+    def __init__(self) -> None:
+        self.count = 0
+        self.sum = 0.0
+        self.mean = 0.0
+        self._m2 = 0.0
+        self.min: Optional[float] = None
+        self.max: Optional[float] = None
+
+    def update(self, value: float) -> None:
+        """Add one value."""
+        self.count += 1
+        self.sum += value
+        delta = value - self.mean
+        self.mean += delta / self.count
+        self._m2 += delta * (value - self.mean)
+        if self.min is None or value < self.min:
+            self.min = value
+        if self.max is None or value > self.max:
+            self.max = value
+
+    def merge(self, other: 'RunningStats') -> None:
+        """Fold the values seen by another instance into this one."""
+        if other.count == 0:
+            return
+        if self.count == 0:
+            self.__dict__.update(other.__dict__)
+            return
+        count = self.count + other.count
+        delta = other.mean - self.mean
+        self.mean += delta * other.count / count
+        self._m2 += other._m2 + delta * delta * self.count * other.count / count
+        self.count = count
+        self.sum += other.sum
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+
+    @property
+    def variance(self) -> Optional[float]:
+        """Population variance, None before any value was added."""
+        return self._m2 / self.count if self.count else None
+
+
+class Histogram:
+    """Counts of values in fixed-width buckets starting at multiples of width."""
+
+    def __init__(self, width: float) -> None:
+        if width <= 0:
+            raise ValueError("width must be positive")
+        self.width = width
+        self.counts: Dict[float, int] = {}
+
+    def update(self, value: float) -> None:
+        """Add one value."""
+        bucket = math.floor(value / self.width) * self.width
+        self.counts[bucket] = self.counts.get(bucket, 0) + 1
+
+    def merge(self, other: 'Histogram') -> None:
+        """Fold the counts of another histogram with the same width."""
+        if other.width != self.width:
+            raise ValueError("Cannot merge histograms with different widths")
+        for bucket, count in other.counts.items():
+            self.counts[bucket] = self.counts.get(bucket, 0) + count
+
+    def as_dict(self) -> Dict[float, int]:
+        """Bucket lower bound -> count, in ascending bucket order."""
+        return dict(sorted(self.counts.items()))
+
+
+class QuantileSketch:
+    """
+    Approximate quantiles in bounded memory, t-digest style.
+
+    Values are buffered and periodically merged into weighted centroids.
+    Centroids near the median may absorb many values while those near the
+    tails stay small, so extreme percentiles remain accurate. Memory is
+    roughly proportional to compression, whatever the number of values.
+    """
+
+    def __init__(self, compression: int = 100) -> None:
+        self.compression = compression
+        self.count = 0
+        self.min: Optional[float] = None
+        self.max: Optional[float] = None
+        self._centroids: List[List[float]] = []
+        self._buffer: List[float] = []
+
+    def update(self, value: float) -> None:
+        """Add one value."""
+        self._buffer.append(value)
+        self.count += 1
+        if self.min is None or value < self.min:
+            self.min = value
+        if self.max is None or value > self.max:
+            self.max = value
+        if len(self._buffer) >= self.compression * 10:
+            self._compress()
+
+    def merge(self, other: 'QuantileSketch') -> None:
+        """Fold the values seen by another sketch into this one."""
+        other._compress()
+        if other.count == 0:
+            return
+        self._centroids.extend([list(c) for c in other._centroids])
+        self.count += other.count
+        self.min = other.min if self.min is None else min(self.min, other.min)
+        self.max = other.max if self.max is None else max(self.max, other.max)
+        self._compress()
+
+    def _compress(self) -> None:
+        points = self._centroids + [[value, 1] for value in self._buffer]
+        self._buffer = []
+        if not points:
+            return
+        points.sort(key=lambda c: c[0])
+        total = sum(weight for _, weight in points)
+
+        merged = [list(points[0])]
+        before = 0.0  # weight to the left of merged[-1]
+        for mean, weight in points[1:]:
+            last = merged[-1]
+            q = (before + (last[1] + weight) / 2) / total
+            limit = 4 * total * q * (1 - q) / self.compression
+            if last[1] + weight <= max(limit, 1):
+                last[1] += weight
+                last[0] += (mean - last[0]) * weight / last[1]
+            else:
+                before += last[1]
+                merged.append([mean, weight])
+        self._centroids = merged
+
+    def quantile(self, q: float) -> Optional[float]:
+        """Estimate the q-quantile, 0 <= q <= 1."""
+        if not 0 <= q <= 1:
+            raise ValueError("q must be between 0 and 1")
+        self._compress()
+        if not self._centroids:
+            return None
+
+        target = q * self.count
+        centers = []
+        before = 0.0
+        for mean, weight in self._centroids:
+            centers.append((before + weight / 2, mean))
+            before += weight
+
+        first_position, first_mean = centers[0]
+        if target <= first_position:
+            if first_position == 0:
+                return first_mean
+            return self.min + (first_mean - self.min) * target / first_position
+        last_position, last_mean = centers[-1]
+        if target >= last_position:
+            span = self.count - last_position
+            if span == 0:
+                return last_mean
+            return last_mean + (self.max - last_mean) * (target - last_position) / span
+
+        for (left_pos, left_mean), (right_pos, right_mean) in zip(centers, centers[1:]):
+            if left_pos <= target <= right_pos:
+                fraction = (target - left_pos) / (right_pos - left_pos)
+                return left_mean + (right_mean - left_mean) * fraction
+        return last_mean
+
+
+def _check_identifier(name: str) -> str:
+    if not _IDENTIFIER.match(name):
+        raise ValueError(f"Invalid SQL identifier: {name!r}")
+    return name
+
+
+def _as_float(value: Any) -> Optional[float]:
+    return None if value is None else float(value)
+
+
+def _summarize_sql(table: str, column: str, where: Optional[str],
+                   params: Sequence[Any], histogram_width: Optional[float],
+                   percentiles: Sequence[float],
+                   connection: Any) -> Dict[str, Any]:
+    """Compute the summary with aggregate queries run by MySQL."""
+    table = _check_identifier(table)
+    column = _check_identifier(column)
+    condition = f"{column} IS NOT NULL"
+    if where:
+        condition += f" AND ({where})"
+
+    cursor = connection.cursor()
+    try:
+        cursor.execute(f"SELECT COUNT({column}), SUM({column}), AVG({column}), "
+                       f"MIN({column}), MAX({column}), VAR_POP({column}) "
+                       f"FROM {table} WHERE {condition}", params)
+        count, total, mean, low, high, variance = cursor.fetchone()
+        summary = {
+            'count': count,
+            'sum': _as_float(total) if count else 0.0,
+            'mean': _as_float(mean),
+            'min': _as_float(low),
+            'max': _as_float(high),
+            'variance': _as_float(variance),
+        }
+
+        if histogram_width is not None:
+            if histogram_width <= 0:
+                raise ValueError("width must be positive")
+            cursor.execute(f"SELECT FLOOR({column} / %s) AS bucket, COUNT(*) "
+                           f"FROM {table} WHERE {condition} "
+                           f"GROUP BY bucket ORDER BY bucket",
+                           (histogram_width, *params))
+            summary['histogram'] = {
+                float(bucket) * histogram_width: n for bucket, n in cursor.fetchall()
+            }
+
+        if percentiles:
+            # Nearest-rank percentiles; cheap when column is indexed
+            summary['percentiles'] = {}
+            for q in percentiles:
+                if not 0 <= q <= 1:
+                    raise ValueError("q must be between 0 and 1")
+                value = None
+                if count:
+                    cursor.execute(f"SELECT {column} FROM {table} WHERE {condition} "
+                                   f"ORDER BY {column} LIMIT 1 OFFSET %s",
+                                   (*params, round(q * (count - 1))))
+                    value = _as_float(cursor.fetchone()[0])
+                summary['percentiles'][q] = value
+    finally:
+        cursor.close()
+    return summary
+
+
+def _summarize_stream(values: Iterable[Any], column: Optional[str],
+                      histogram_width: Optional[float],
+                      percentiles: Sequence[float]) -> Dict[str, Any]:
+    """Compute the summary in a single pass over an iterable."""
+    stats = RunningStats()
+    histogram = Histogram(histogram_width) if histogram_width is not None else None
+    sketch = QuantileSketch() if percentiles else None
+
+    for item in values:
+        value = item[column] if column is not None else item
+        if value is None:
+            continue
+        value = float(value)
+        stats.update(value)
+        if histogram is not None:
+            histogram.update(value)
+        if sketch is not None:
+            sketch.update(value)
+
+    summary = {
+        'count': stats.count,
+        'sum': stats.sum,
+        'mean': stats.mean if stats.count else None,
+        'min': stats.min,
+        'max': stats.max,
+        'variance': stats.variance,
+    }
+    if histogram is not None:
+        summary['histogram'] = histogram.as_dict()
+    if sketch is not None:
+        summary['percentiles'] = {q: sketch.quantile(q) for q in percentiles}
+    return summary
+
+
+def summarize(source: Union[str, Iterable[Any]],
+              column: Optional[str] = None,
+              where: Optional[str] = None,
+              params: Sequence[Any] = (),
+              histogram_width: Optional[float] = None,
+              percentiles: Sequence[float] = (),
+              connection: Any = None) -> Dict[str, Any]:
+    """
+    Summarize a numeric column or stream of numbers.
+
+    If source is a table name the aggregates are computed by MySQL and only
+    the results cross the wire. Otherwise source is consumed once: rows are
+    indexed by column (plain values when column is None), and percentiles
+    come from a QuantileSketch, so they are approximate.
+
+    Args:
+        source: Table name, or an iterable of rows or values
+        column: Column to summarize (required for a table)
+        where: SQL filter for a table source, e.g. "age > %s"
+        params: Parameters for the placeholders in where
+        histogram_width: Bucket width for a histogram, None to skip it
+        percentiles: Quantiles to estimate, e.g. (0.5, 0.95, 0.99)
+        connection: Connection for a table source; borrowed from the pool if omitted
+
+    Returns:
+        Dict: count, sum, mean, min, max and variance, plus 'histogram'
+              and 'percentiles' when requested. Values are floats.
+    """
+    if not isinstance(source, str):
+        if where is not None:
+            raise ValueError("where only applies to a table source")
+        return _summarize_stream(source, column, histogram_width, percentiles)
+
+    if column is None:
+        raise ValueError("column is required when summarizing a table")
+    if connection is None:
+        with seed.connection() as connection:
+            return _summarize_sql(source, column, where, params,
+                                  histogram_width, percentiles, connection)
+    return _summarize_sql(source, column, where, params,
+                          histogram_width, percentiles, connection)
@@ -0,0 +1,181 @@
+#!/usr/bin/python3
+"""
+asyncio counterparts of the user_data generators.
+
+Each function is an async generator to be consumed with `async for`, so many
+streams can share one event loop without a thread per stream. Rows have the
+same keys as the synchronous generators.
+
+MySQL is reached through aiomysql with unbuffered (SS) cursors. Any
+aiosqlite connection can be passed instead, e.g. a local SQLite copy of
+user_data for tests; %s placeholders are translated for it.
+"""
+import importlib
+from contextlib import aclosing
+from typing import Any, AsyncGenerator, Dict, List, Optional, Sequence
+
+import seed
+
+try:
+    import aiomysql
+except ImportError:
+    aiomysql = None
+
+_paginate = importlib.import_module('2-lazy_paginate')
+
+
+async def connect() -> Any:
+    """Open an aiomysql connection to ALX_prodev using seed.DB_CONFIG."""
+    if aiomysql is None:
+        raise ImportError("The async generators require aiomysql (pip install aiomysql)")
+    return await aiomysql.connect(
+        host=seed.DB_CONFIG['host'],
+        user=seed.DB_CONFIG['user'],
+        password=seed.DB_CONFIG['password'],
+        db=seed.DB_CONFIG['database'],
+    )
+
+
+def _is_sqlite(connection: Any) -> bool:
+    return type(connection).__module__.startswith('aiosqlite')
+
+
+async def _close(connection: Any) -> None:
+    if _is_sqlite(connection):
+        await connection.close()
+    else:
+        # Closes the socket without reading any pending result
+        connection.close()
+
+
+async def async_stream_batches(query: str,
+                               params: Optional[Sequence[Any]] = None,
+                               batch_size: int = 1000,
+                               dictionary: bool = True,
+                               connection: Any = None
+                               ) -> AsyncGenerator[List[Any], None]:
+    """
+    Stream the result of a query in batches without buffering it.
+
+    Wrap the generator in contextlib.aclosing() when it may be abandoned
+    early, so that it is closed right away instead of at garbage collection.
+    The generators below do so for the streams they consume, so closing
+    one of them closes its query's cursor too.
+
+    Args:
+        query: SQL query with %s placeholders
+        params: Query parameters
+        batch_size: Number of rows fetched per round trip
+        dictionary: Yield rows as dicts instead of tuples
+        connection: aiomysql or aiosqlite connection; one is opened if omitted
+
+    Yields:
+        List: Up to batch_size rows
+    """
+    if batch_size < 1:
+        raise ValueError("batch_size must be a positive integer")
+
+    owns_connection = connection is None
+    if owns_connection:
+        connection = await connect()
+
+    sqlite = _is_sqlite(connection)
+    cursor = None
+    exhausted = False
+    try:
+        if sqlite:
+            cursor = await connection.execute(query.replace('%s', '?'), params or ())
+        else:
+            cursor_class = aiomysql.SSDictCursor if dictionary else aiomysql.SSCursor
+            cursor = await connection.cursor(cursor_class)
+            await cursor.execute(query, params)
+
+        columns = None
+        while True:
+            rows = await cursor.fetchmany(batch_size)
+            if not rows:
+                exhausted = True
+                break
+            if sqlite:
+                if dictionary:
+                    columns = columns or [d[0] for d in cursor.description]
+                    rows = [dict(zip(columns, row)) for row in rows]
+                else:
+                    rows = [tuple(row) for row in rows]
+            yield list(rows)
+    finally:
+        # An unbuffered MySQL cursor reads the rest of the result on close;
+        # skip that when the stream was abandoned on a connection we own
+        if cursor is not None and (exhausted or sqlite or not owns_connection):
+            await cursor.close()
+        if owns_connection:
+            await _close(connection)
+
+
+async def async_stream_users(prefetch: int = 1000,
+                             connection: Any = None
+                             ) -> AsyncGenerator[Dict[str, Any], None]:
+    """Async generator that streams rows from user_data one by one."""
+    async with aclosing(async_stream_batches("SELECT * FROM user_data",
+                                             batch_size=prefetch,
+                                             connection=connection)) as batches:
+        async for batch in batches:
+            for row in batch:
+                yield row
+
+
+async def async_stream_users_in_batches(batch_size: int,
+                                        connection: Any = None
+                                        ) -> AsyncGenerator[List[Dict[str, Any]], None]:
+    """Async generator that streams users from user_data in batches."""
+    async with aclosing(async_stream_batches("SELECT * FROM user_data",
+                                             batch_size=batch_size,
+                                             connection=connection)) as batches:
+        async for batch in batches:
+            yield batch
+
+
+async def async_lazy_paginate(page_size: int,
+                              cursor: Optional[str] = None,
+                              sort_key: str = 'user_id',
+                              connection: Any = None) -> AsyncGenerator[Any, None]:
+    """
+    Async generator that pages through user_data with keyset pagination.
+
+    Pages are the same Page objects as lazy_paginate yields, and their
+    next_cursor tokens are interchangeable with the synchronous version.
+    """
+    owns_connection = connection is None
+    if owns_connection:
+        connection = await connect()
+    try:
+        while True:
+            query, params, key_columns = _paginate.keyset_query(page_size, cursor, sort_key)
+            rows = []
+            async with aclosing(async_stream_batches(query, params, batch_size=page_size,
+                                                     connection=connection)) as batches:
+                async for batch in batches:
+                    rows.extend(batch)
+            if not rows:
+                break
+            cursor = None
+            if len(rows) == page_size:
+                cursor = _paginate.encode_cursor(
+                    sort_key, [rows[-1][c] for c in key_columns])
+            yield _paginate.Page(rows, cursor)
+            if cursor is None:
+                break
+    finally:
+        if owns_connection:
+            await _close(connection)
+
+
+async def async_stream_user_ages(prefetch: int = 1000,
+                                 connection: Any = None) -> AsyncGenerator[int, None]:
+    """Async generator that streams user ages one by one."""
+    async with aclosing(async_stream_batches("SELECT age FROM user_data",
+                                             batch_size=prefetch, dictionary=False,
+                                             connection=connection)) as batches:
+        async for batch in batches:
+            for row in batch:
+                yield row[0]
@@ -0,0 +1,217 @@
+#!/usr/bin/python3
+"""
+Benchmarks for the user_data streaming helpers.
+
+Run against an ALX_prodev database whose user_data table holds at least as
+many rows as the largest size requested (load it with seed.bulk_insert_data).
+
+    python3 benchmark.py memory --sizes 10000 100000 1000000 10000000
+    python3 benchmark.py pagination --pages 1 10000
+    python3 benchmark.py columnar --rows 1000000
+    python3 benchmark.py scaling --workers 1 2 4 8
+"""
+import argparse
+import importlib
+import multiprocessing
+import resource
+import statistics
+import time
+import uuid
+from decimal import Decimal
+from typing import Dict, List
+
+import seed
+from columnar import ColumnBatch
+from partitioned_scan import partitioned_aggregate, partitioned_scan
+
+lazy_paginate = importlib.import_module('2-lazy_paginate')
+batch_processing = importlib.import_module('1-batch_processing')
+
+
+def _peak_rss_kb() -> int:
+    """Peak resident set size of the current process in KiB (Linux)."""
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+def _stream_worker(rows: int, buffered: bool, prefetch: int,
+                   results: multiprocessing.Queue) -> None:
+    """Stream `rows` rows in a fresh process and report its peak RSS."""
+    baseline = _peak_rss_kb()
+    started = time.perf_counter()
+    count = 0
+    query = "SELECT * FROM user_data LIMIT %s"
+    if buffered:
+        connection = seed.connect_to_prodev()
+        cursor = connection.cursor(buffered=True, dictionary=True)
+        cursor.execute(query, (rows,))
+        for _ in iter(cursor.fetchone, None):
+            count += 1
+        cursor.close()
+        connection.close()
+    else:
+        for _ in seed.stream_rows(query, (rows,), prefetch=prefetch):
+            count += 1
+    results.put({
+        'rows': count,
+        'seconds': time.perf_counter() - started,
+        'peak_rss_kb': _peak_rss_kb(),
+        'growth_kb': _peak_rss_kb() - baseline,
+    })
+
+
+def bench_memory(sizes: List[int], prefetch: int, buffered: bool) -> List[Dict]:
+    """Measure peak RSS while streaming result sets of increasing size."""
+    results = multiprocessing.Queue()
+    report = []
+    for size in sizes:
+        # A process per size, so every measurement starts from a clean peak
+        worker = multiprocessing.Process(
+            target=_stream_worker, args=(size, buffered, prefetch, results))
+        worker.start()
+        result = results.get()
+        worker.join()
+        report.append(result)
+        print(f"{result['rows']:>10} rows  {result['seconds']:8.2f}s  "
+              f"peak RSS {result['peak_rss_kb'] / 1024:8.1f} MiB  "
+              f"growth {result['growth_kb'] / 1024:8.1f} MiB")
+    return report
+
+
+def _median_ms(fetch, repeat: int) -> float:
+    """Median wall-clock time of fetch() in milliseconds."""
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fetch()
+        timings.append((time.perf_counter() - started) * 1000)
+    return statistics.median(timings)
+
+
+def bench_pagination(pages: List[int], page_size: int, repeat: int) -> List[Dict]:
+    """Compare OFFSET and keyset page-fetch latency at given page numbers."""
+    connection = seed.connect_to_prodev()
+    report = []
+    try:
+        for page in pages:
+            skipped = (page - 1) * page_size
+            cursor = None
+            if skipped:
+                # Locate the row before the page once, outside the timing
+                lookup = connection.cursor()
+                lookup.execute("SELECT user_id FROM user_data ORDER BY user_id "
+                               "LIMIT 1 OFFSET %s", (skipped - 1,))
+                row = lookup.fetchone()
+                lookup.close()
+                if row is None:
+                    print(f"user_data has fewer than {skipped} rows, skipping page {page}")
+                    continue
+                cursor = lazy_paginate.encode_cursor('user_id', [row[0]])
+
+            offset_ms = _median_ms(lambda: lazy_paginate.paginate_users(
+                page_size, skipped, connection), repeat)
+            keyset_ms = _median_ms(lambda: lazy_paginate.paginate_users_after(
+                page_size, cursor, connection=connection), repeat)
+            result = {'page': page, 'offset_ms': offset_ms, 'keyset_ms': keyset_ms}
+            report.append(result)
+            print(f"page {page:>7}  OFFSET {offset_ms:9.2f} ms  "
+                  f"keyset {keyset_ms:9.2f} ms")
+    finally:
+        connection.close()
+    return report
+
+
+def bench_columnar(rows: int, batch_size: int) -> Dict:
+    """Per-row cost of filtering age > 25 over dict batches vs ColumnBatch."""
+    names = batch_processing.USER_COLUMNS
+    batch = [(str(uuid.uuid4()), f"User {i}", f"user{i}@example.com",
+              Decimal(18 + i % 80)) for i in range(batch_size)]
+    batches = max(rows // batch_size, 1)
+    total = batches * batch_size
+
+    started = time.perf_counter()
+    for _ in range(batches):
+        users = [dict(zip(names, row)) for row in batch]
+        older = [user for user in users if user['age'] > 25]
+    dict_ns = (time.perf_counter() - started) * 1e9 / total
+
+    started = time.perf_counter()
+    for _ in range(batches):
+        columns = ColumnBatch.from_rows(batch, names, batch_processing.USER_DTYPES)
+        older = columns.filter(columns['age'] > 25)
+    columnar_ns = (time.perf_counter() - started) * 1e9 / total
+
+    print(f"{total} rows in batches of {batch_size}: "
+          f"dict rows {dict_ns:8.1f} ns/row  columnar {columnar_ns:8.1f} ns/row "
+          f"({len(older)} rows kept per batch)")
+    return {'rows': total, 'dict_ns_per_row': dict_ns, 'columnar_ns_per_row': columnar_ns}
+
+
+def bench_scaling(workers: List[int], batch_size: int) -> List[Dict]:
+    """
+    Throughput of full-table partitioned scans by number of worker processes.
+
+    Rows streamed back to this process go through one consumer, so the scan
+    mostly measures transfer; the aggregate folds rows in the workers and
+    shows how far the CPU-bound part scales.
+    """
+    report = []
+    baseline = {}
+    for count in workers:
+        timings = {}
+        for kind in ('scan', 'aggregate'):
+            started = time.perf_counter()
+            if kind == 'scan':
+                rows = sum(1 for _ in partitioned_scan(
+                    partitions=count, batch_size=batch_size))
+            else:
+                rows = partitioned_aggregate(
+                    'age', partitions=count, batch_size=batch_size)['count']
+            elapsed = time.perf_counter() - started
+            rate = rows / elapsed if elapsed > 0 else float('inf')
+            baseline.setdefault(kind, rate)
+            timings[kind] = {'rows': rows, 'seconds': elapsed, 'rows_per_second': rate,
+                             'speedup': rate / baseline[kind] if baseline[kind] else 0.0}
+        report.append({'workers': count, **timings})
+        print(f"{count:3d} worker(s): "
+              + "  ".join(f"{kind} {t['rows_per_second']:12,.0f} rows/s "
+                          f"({t['speedup']:.2f}x)" for kind, t in timings.items()))
+    return report
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    memory = commands.add_parser('memory', help="peak RSS of stream_rows by result size")
+    memory.add_argument('--sizes', type=int, nargs='+',
+                        default=[10_000, 100_000, 1_000_000, 10_000_000])
+    memory.add_argument('--prefetch', type=int, default=1000)
+    memory.add_argument('--buffered', action='store_true',
+                        help="use a buffered cursor instead, for comparison")
+
+    pagination = commands.add_parser('pagination', help="OFFSET vs keyset page latency")
+    pagination.add_argument('--pages', type=int, nargs='+', default=[1, 10_000])
+    pagination.add_argument('--page-size', type=int, default=100)
+    pagination.add_argument('--repeat', type=int, default=5)
+
+    columnar = commands.add_parser('columnar', help="dict rows vs ColumnBatch filter cost")
+    columnar.add_argument('--rows', type=int, default=1_000_000)
+    columnar.add_argument('--batch-size', type=int, default=10_000)
+
+    scaling = commands.add_parser('scaling', help="partitioned scan throughput by worker count")
+    scaling.add_argument('--workers', type=int, nargs='+', default=[1, 2, 4, 8])
+    scaling.add_argument('--batch-size', type=int, default=1000)
+
+    args = parser.parse_args()
+    if args.command == 'memory':
+        bench_memory(args.sizes, args.prefetch, args.buffered)
+    elif args.command == 'pagination':
+        bench_pagination(args.pages, args.page_size, args.repeat)
+    elif args.command == 'columnar':
+        bench_columnar(args.rows, args.batch_size)
+    elif args.command == 'scaling':
+        bench_scaling(args.workers, args.batch_size)
+
+
+if __name__ == "__main__":
+    main()
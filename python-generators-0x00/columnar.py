@@ -0,0 +1,115 @@
+#!/usr/bin/python3
+"""
+Column-oriented batches of user_data rows backed by NumPy arrays.
+
+A ColumnBatch stores one array per column instead of one dict per row, so
+filters and projections over a batch run as vectorized array operations.
+NumPy is only needed when columnar batches are actually used.
+"""
+from decimal import Decimal
+from typing import Any, Dict, List, Optional, Sequence
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+
+def _require_numpy() -> None:
+    if np is None:
+        raise ImportError("Columnar batches require numpy (pip install numpy)")
+
+
+def _to_array(values: Sequence[Any], dtype: Optional[Any] = None) -> 'np.ndarray':
+    """
+    Convert one column of values, to `dtype` if given or else to a compact
+    dtype picked by looking at every value.
+    """
+    if dtype is not None:
+        dtype = np.dtype(dtype)
+        if dtype.kind != 'S':
+            # Converted in C, e.g. Decimal -> int64, with no Python int() per value
+            return np.fromiter(values, dtype=dtype, count=len(values))
+        try:
+            return np.array(values, dtype=dtype)  # encoded in C, ASCII only
+        except UnicodeEncodeError:
+            return np.array([str(v).encode('utf-8') for v in values], dtype=dtype)
+    if values and all(isinstance(v, (int, Decimal)) and not isinstance(v, bool)
+                      and v == int(v) for v in values):
+        return np.array([int(v) for v in values], dtype=np.int64)
+    if values and all(isinstance(v, (int, float, Decimal)) for v in values):
+        return np.array([float(v) for v in values], dtype=np.float64)
+    # Fixed-width UTF-8 bytes: a uuid takes 36 bytes instead of a str object
+    return np.array([str(v).encode('utf-8') for v in values], dtype=np.bytes_)
+
+
+class ColumnBatch:
+    """
+    A batch of rows stored as one NumPy array per column.
+
+    Numeric columns become int64 or float64 arrays and everything else is
+    stored as fixed-width UTF-8 bytes, so compare string columns against
+    bytes, e.g. batch['email'] == b'alice@example.com'.
+    """
+
+    def __init__(self, columns: Dict[str, 'np.ndarray']) -> None:
+        _require_numpy()
+        lengths = {len(array) for array in columns.values()}
+        if len(lengths) > 1:
+            raise ValueError("All columns of a batch must have the same length")
+        self.columns = columns
+
+    @classmethod
+    def from_rows(cls, rows: Sequence[Sequence[Any]], names: Sequence[str],
+                  dtypes: Optional[Sequence[Any]] = None) -> 'ColumnBatch':
+        """
+        Build a batch from tuple rows.
+
+        Args:
+            rows: Rows whose values are in the same order as names
+            names: Column names
+            dtypes: One NumPy dtype per column, e.g. ('S36', 'S', 'S', 'int64').
+                Known dtypes skip the per-value type checks and let NumPy
+                convert each column in one call; a fixed-width 'S<n>'
+                silently truncates longer values. By default the dtypes
+                are inferred from the values.
+
+        Returns:
+            ColumnBatch: The rows transposed into column arrays
+        """
+        _require_numpy()
+        values = list(zip(*rows)) if rows else [()] * len(names)
+        if dtypes is None:
+            dtypes = [None] * len(names)
+        return cls({name: _to_array(column, dtype)
+                    for name, column, dtype in zip(names, values, dtypes)})
+
+    @property
+    def names(self) -> List[str]:
+        """Column names, in order."""
+        return list(self.columns)
+
+    def __len__(self) -> int:
+        return len(next(iter(self.columns.values()), ()))
+
+    def __getitem__(self, name: str) -> 'np.ndarray':
+        return self.columns[name]
+
+    def filter(self, mask: 'np.ndarray') -> 'ColumnBatch':
+        """Keep the rows where a boolean mask is True."""
+        return ColumnBatch({name: array[mask] for name, array in self.columns.items()})
+
+    def select(self, *names: str) -> 'ColumnBatch':
+        """Keep only the given columns."""
+        return ColumnBatch({name: self.columns[name] for name in names})
+
+    def to_rows(self) -> List[Dict[str, Any]]:
+        """Convert back to the row-dict format used by the generators."""
+        decoded = {}
+        for name, array in self.columns.items():
+            if array.dtype.kind == 'S':
+                decoded[name] = [value.decode('utf-8') for value in array.tolist()]
+            else:
+                decoded[name] = array.tolist()
+        names = list(decoded)
+        return [dict(zip(names, values)) for values in zip(*decoded.values())]
@@ -0,0 +1,285 @@
+#!/usr/bin/python3
+"""
+Parallel scans of user_data split into user_id key ranges.
+
+Every partition is streamed by its own worker process over its own
+connection, so filtering and aggregating in Python is spread over all cores
+instead of running on one interpreter thread.
+"""
+import multiprocessing
+import os
+import re
+from functools import partial
+from typing import Any, Callable, Dict, Generator, List, Optional, Sequence, Tuple
+
+import seed
+
+# Columns a scan may select or filter on; updated_at exists once change
+# tracking is enabled (see change_stream)
+USER_DATA_COLUMNS = ('user_id', 'name', 'email', 'age', 'updated_at')
+
+# One `column <op> %s` comparison; values only ever arrive as parameters
+_CONDITION = re.compile(r'\s*(\w+)\s*(?:=|!=|<>|<=|>=|<|>|LIKE)\s*%s\s*', re.IGNORECASE)
+_AND = re.compile(r'\bAND\b', re.IGNORECASE)
+
+# user_id values are uuid4 strings, so their first 32 bits are uniformly
+# distributed and splitting that space evenly gives evenly sized partitions
+_KEY_SPACE = 2 ** 32
+
+
+def key_ranges(partitions: int) -> List[Tuple[Optional[str], Optional[str]]]:
+    """
+    Split the user_id key space into contiguous, non-overlapping ranges.
+
+    The first range has no lower bound and the last has no upper bound, so
+    every key falls into exactly one range even if it is not a uuid.
+
+    Args:
+        partitions: Number of ranges to produce
+
+    Returns:
+        List: (low, high) pairs, low inclusive and high exclusive
+    """
+    if partitions < 1:
+        raise ValueError("partitions must be a positive integer")
+    bounds = [format(i * _KEY_SPACE // partitions, '08x') for i in range(1, partitions)]
+    lows = [None] + bounds
+    highs = bounds + [None]
+    return list(zip(lows, highs))
+
+
+def _check_column(column: str) -> str:
+    if column not in USER_DATA_COLUMNS:
+        raise ValueError(f"Unknown user_data column {column!r}; "
+                         f"choose from {', '.join(USER_DATA_COLUMNS)}")
+    return column
+
+
+def _select_list(columns: str) -> str:
+    """Validate a column list: "*" or comma-separated user_data columns."""
+    if columns.strip() == "*":
+        return "*"
+    return ", ".join(_check_column(column.strip()) for column in columns.split(","))
+
+
+def _check_where(where: str, params: Sequence[Any]) -> str:
+    """
+    Validate a filter: `column <op> %s` comparisons joined by AND, one
+    parameter per placeholder. Anything else, such as a literal value or
+    a subquery, is refused rather than pasted into the SQL.
+    """
+    for condition in _AND.split(where):
+        match = _CONDITION.fullmatch(condition)
+        if match is None:
+            raise ValueError(f"Unsupported filter {condition.strip()!r}; use "
+                             f"'column <op> %s' joined by AND, values in params")
+        _check_column(match.group(1))
+    placeholders = where.count("%s")
+    if placeholders != len(params):
+        raise ValueError(f"Filter has {placeholders} placeholder(s) "
+                         f"but {len(params)} param(s) were given")
+    return where
+
+
+def _range_query(low: Optional[str], high: Optional[str], columns: str,
+                 where: Optional[str], params: Sequence[Any],
+                 ordered: bool) -> Tuple[str, List[Any]]:
+    """Build the query and parameters that read one key range."""
+    columns = _select_list(columns)
+    conditions = []
+    query_params = []
+    if low is not None:
+        conditions.append("user_id >= %s")
+        query_params.append(low)
+    if high is not None:
+        conditions.append("user_id < %s")
+        query_params.append(high)
+    if where:
+        conditions.append(f"({_check_where(where, params)})")
+        query_params.extend(params)
+
+    query = f"SELECT {columns} FROM user_data"
+    if conditions:
+        query += " WHERE " + " AND ".join(conditions)
+    if ordered:
+        query += " ORDER BY user_id"
+    return query, query_params
+
+
+def _scan_partition(index: int, query: str, params: List[Any], batch_size: int,
+                    queue: multiprocessing.Queue) -> None:
+    """Worker: stream one key range into the queue, then signal completion."""
+    try:
+        for batch in seed.stream_batches(query, params, batch_size):
+            queue.put((index, 'rows', batch))
+        queue.put((index, 'done', None))
+    except Exception as e:
+        queue.put((index, 'error', f"{type(e).__name__}: {e}"))
+
+
+def partitioned_scan(where: Optional[str] = None,
+                     params: Sequence[Any] = (),
+                     columns: str = "*",
+                     partitions: Optional[int] = None,
+                     ordered: bool = False,
+                     batch_size: int = 1000,
+                     queue_size: int = 8) -> Generator[Dict[str, Any], None, None]:
+    """
+    Stream user_data rows using one worker process per key range.
+
+    Workers hand rows over in batches through bounded queues, so a slow
+    consumer applies backpressure instead of letting rows pile up in memory.
+    Closing the generator early terminates the workers.
+
+    Args:
+        where: Optional filter of `column <op> %s` comparisons joined by
+               AND, e.g. "age > %s"
+        params: Values for the placeholders in where
+        columns: "*" or comma-separated user_data columns to select
+        partitions: Number of key ranges/workers (default: CPU count)
+        ordered: Yield rows in user_id order instead of as they arrive
+        batch_size: Rows per fetchmany round trip and per queue item
+        queue_size: Batches buffered per partition
+
+    Yields:
+        Dict: A row from the user_data table
+    """
+    partitions = partitions or os.cpu_count() or 1
+    ranges = key_ranges(partitions)
+    if ordered:
+        # One queue per partition so that later ranges block while the
+        # consumer is still draining an earlier one
+        queues = [multiprocessing.Queue(queue_size) for _ in ranges]
+    else:
+        shared = multiprocessing.Queue(queue_size * partitions)
+        queues = [shared] * partitions
+
+    workers = []
+    for index, (low, high) in enumerate(ranges):
+        query, query_params = _range_query(low, high, columns, where, params, ordered)
+        worker = multiprocessing.Process(
+            target=_scan_partition,
+            args=(index, query, query_params, batch_size, queues[index]),
+            daemon=True)
+        worker.start()
+        workers.append(worker)
+
+    def drain(queue, remaining):
+        while remaining:
+            index, kind, payload = queue.get()
+            if kind == 'rows':
+                yield from payload
+            elif kind == 'done':
+                remaining -= 1
+            else:
+                raise RuntimeError(f"Partition {index} failed: {payload}")
+
+    try:
+        if ordered:
+            for queue in queues:
+                yield from drain(queue, 1)
+        else:
+            yield from drain(queues[0], partitions)
+    finally:
+        for worker in workers:
+            if worker.is_alive():
+                worker.terminate()
+            worker.join()
+
+
+def _reduce_partition(query: str, params: List[Any], batch_size: int,
+                      fold: Callable[[Any, Dict[str, Any]], Any], initial: Any,
+                      predicate: Optional[Callable[[Dict[str, Any]], bool]]) -> Any:
+    """Worker: fold every row of one key range into a partial result."""
+    acc = initial
+    for batch in seed.stream_batches(query, params, batch_size):
+        for row in batch:
+            if predicate is None or predicate(row):
+                acc = fold(acc, row)
+    return acc
+
+
+def partitioned_reduce(fold: Callable[[Any, Dict[str, Any]], Any],
+                       combine: Callable[[Any, Any], Any],
+                       initial: Any,
+                       where: Optional[str] = None,
+                       params: Sequence[Any] = (),
+                       columns: str = "*",
+                       predicate: Optional[Callable[[Dict[str, Any]], bool]] = None,
+                       partitions: Optional[int] = None,
+                       batch_size: int = 1000) -> Any:
+    """
+    Map/reduce over user_data with a process pool.
+
+    Each worker folds the rows of its key range into a partial result
+    starting from initial, and the partials are merged with combine. fold,
+    combine and predicate must be module-level functions (or partials of
+    them) so they can be sent to the workers.
+
+    Args:
+        fold: fold(acc, row) -> acc, applied to every matching row
+        combine: combine(a, b) -> acc, merges two partial results
+        initial: Starting value for every partition
+        where: Optional filter of `column <op> %s` comparisons joined by
+               AND, e.g. "age > %s"
+        params: Values for the placeholders in where
+        columns: "*" or comma-separated user_data columns to select
+        predicate: Optional Python filter applied in the workers
+        partitions: Number of key ranges/workers (default: CPU count)
+        batch_size: Rows per fetchmany round trip
+
+    Returns:
+        The combined result of all partitions
+    """
+    partitions = partitions or os.cpu_count() or 1
+    tasks = []
+    for low, high in key_ranges(partitions):
+        query, query_params = _range_query(low, high, columns, where, params, False)
+        tasks.append((query, query_params, batch_size, fold, initial, predicate))
+
+    with multiprocessing.Pool(partitions) as pool:
+        partials = pool.starmap(_reduce_partition, tasks)
+
+    result = initial
+    for value in partials:
+        result = combine(result, value)
+    return result
+
+
+def _fold_count_sum(column: Optional[str], acc: Tuple[int, Any],
+                    row: Dict[str, Any]) -> Tuple[int, Any]:
+    count, total = acc
+    return count + 1, total + (row[column] if column else 0)
+
+
+def _combine_count_sum(a: Tuple[int, Any], b: Tuple[int, Any]) -> Tuple[int, Any]:
+    return a[0] + b[0], a[1] + b[1]
+
+
+def partitioned_aggregate(column: Optional[str] = None,
+                          where: Optional[str] = None,
+                          params: Sequence[Any] = (),
+                          predicate: Optional[Callable[[Dict[str, Any]], bool]] = None,
+                          partitions: Optional[int] = None,
+                          batch_size: int = 1000) -> Dict[str, Any]:
+    """
+    Count matching rows, and sum a column over them, in parallel.
+
+    Args:
+        column: Column to sum, or None to only count
+        where: Optional filter of `column <op> %s` comparisons joined by
+               AND, e.g. "age > %s"
+        params: Values for the placeholders in where
+        predicate: Optional Python filter applied in the workers
+        partitions: Number of key ranges/workers (default: CPU count)
+        batch_size: Rows per fetchmany round trip
+
+    Returns:
+        Dict: {'count': int, 'sum': total}
+    """
+    count, total = partitioned_reduce(
+        partial(_fold_count_sum, column), _combine_count_sum, (0, 0),
+        where=where, params=params,
+        columns="*" if predicate else (column or "user_id"),
+        predicate=predicate, partitions=partitions, batch_size=batch_size)
+    return {'count': count, 'sum': total}
@@ -1,18 +1,31 @@
 
 import csv
+import json
+import os
+import threading
+import time
 import uuid
+from collections import deque
+from contextlib import contextmanager
+from itertools import islice
 import mysql.connector
 from mysql.connector import Error
-from typing import Generator, Tuple, Any
+from mysql.connector.errors import PoolError
+from typing import Generator, Tuple, Any, Optional, List, Sequence, Dict
+
+# Connection settings shared by every helper in this directory
+DB_CONFIG = {
+    'host': 'localhost',
+    'user': 'root',
+    'password': '',
+    'database': 'ALX_prodev',
+}
 
 def connect_db() -> mysql.connector.connection.MySQLConnection:
     """Connect to the MySQL database server."""
     try:
-        connection = mysql.connector.connect(
-            host='localhost',
-            user='root',
-            password=''
-        )
+        server_config = {k: v for k, v in DB_CONFIG.items() if k != 'database'}
+        connection = mysql.connector.connect(**server_config)
         return connection
     except Error as e:
         print(f"Error connecting to MySQL: {e}")
@@ -33,17 +46,235 @@ def create_database(connection: mysql.connector.connection.MySQLConnection) -> N
 def connect_to_prodev() -> mysql.connector.connection.MySQLConnection:
     """Connect to the ALX_prodev database."""
     try:
-        connection = mysql.connector.connect(
-            host='localhost',
-            user='root',
-            password='',
-            database='ALX_prodev'
-        )
+        connection = mysql.connector.connect(**DB_CONFIG)
         return connection
     except Error as e:
         print(f"Error connecting to ALX_prodev: {e}")
         return None
 
+class ConnectionPool:
+    """
+    Thread-safe pool of connections to the ALX_prodev database.
+
+    Connections are opened lazily up to `size`. On checkout a connection is
+    recycled once it is older than `max_lifetime` seconds, and pinged if it
+    has been idle for more than `ping_after` seconds. When every connection
+    is busy, callers wait up to `timeout` seconds before a PoolError is
+    raised. The time spent waiting is recorded in stats().
+    """
+
+    def __init__(self, size: int = 5, max_lifetime: float = 1800.0,
+                 ping_after: float = 5.0, timeout: float = 30.0,
+                 **connect_kwargs: Any) -> None:
+        if size < 1:
+            raise ValueError("size must be a positive integer")
+        self.size = size
+        self.max_lifetime = max_lifetime
+        self.ping_after = ping_after
+        self.timeout = timeout
+        self.connect_kwargs = connect_kwargs or dict(DB_CONFIG)
+        self._lock = threading.Condition()
+        self._reset()
+
+    def _reset(self) -> None:
+        """Forget all connections (used on creation and after a fork)."""
+        self._pid = os.getpid()
+        self._idle = deque()  # (connection, created_at, returned_at)
+        self._created_at = {}  # id(connection) -> created_at
+        self._open = 0
+        self._stats = {
+            'checkouts': 0, 'waits': 0, 'wait_seconds': 0.0,
+            'max_wait_seconds': 0.0, 'timeouts': 0, 'created': 0,
+            'recycled': 0, 'failed_health_checks': 0, 'discarded': 0,
+        }
+
+    def _check_pid(self) -> None:
+        # A forked child must not share the parent's sockets; its inherited
+        # connections are dropped without sending anything on them
+        if self._pid != os.getpid():
+            self._reset()
+
+    def _alive(self, connection: Any, returned_at: float) -> bool:
+        # Called without the lock: a ping is a round trip to the server
+        if time.monotonic() - returned_at <= self.ping_after:
+            return True
+        try:
+            connection.ping(reconnect=False)
+        except Error:
+            return False
+        return True
+
+    def acquire(self, timeout: Optional[float] = None) -> Any:
+        """
+        Check a connection out of the pool.
+
+        Args:
+            timeout: Seconds to wait for a free connection (default: pool timeout)
+
+        Returns:
+            A MySQL connection that must be given back with release()
+        """
+        timeout = self.timeout if timeout is None else timeout
+        started = time.monotonic()
+        waited = False
+        while True:
+            with self._lock:
+                self._check_pid()
+                entry = None
+                while True:
+                    while self._idle:
+                        entry = self._idle.pop()
+                        if time.monotonic() - entry[1] <= self.max_lifetime:
+                            break
+                        self._stats['recycled'] += 1
+                        self._close(entry[0])
+                        entry = None
+                    if entry is not None:
+                        break
+                    if self._open < self.size:
+                        self._open += 1
+                        break
+                    remaining = timeout - (time.monotonic() - started)
+                    if remaining <= 0:
+                        self._stats['timeouts'] += 1
+                        raise PoolError(f"No connection available after {timeout}s "
+                                        f"(pool size {self.size})")
+                    waited = True
+                    self._lock.wait(remaining)
+
+            # The popped connection still counts as open, so nobody can take
+            # its slot while it is pinged
+            if entry is None or self._alive(entry[0], entry[2]):
+                break
+            with self._lock:
+                self._stats['failed_health_checks'] += 1
+                self._close(entry[0])
+                self._lock.notify()
+
+        connection = None if entry is None else entry[0]
+        with self._lock:
+            waited_for = time.monotonic() - started
+            self._stats['checkouts'] += 1
+            if waited:
+                self._stats['waits'] += 1
+                self._stats['wait_seconds'] += waited_for
+                self._stats['max_wait_seconds'] = max(
+                    self._stats['max_wait_seconds'], waited_for)
+
+        if connection is None:
+            # Open the new connection outside the lock
+            try:
+                connection = mysql.connector.connect(**self.connect_kwargs)
+            except Exception:
+                with self._lock:
+                    self._open -= 1
+                    self._lock.notify()
+                raise
+            with self._lock:
+                self._created_at[id(connection)] = time.monotonic()
+                self._stats['created'] += 1
+        return connection
+
+    def release(self, connection: Any, discard: bool = False) -> None:
+        """
+        Give a connection back to the pool.
+
+        Uncommitted work is rolled back. Connections that are broken, still
+        hold an unread result, or are released with discard=True are closed
+        instead of being reused.
+        """
+        with self._lock:
+            if self._pid != os.getpid():
+                return
+        if not discard:
+            try:
+                if connection.unread_result or not connection.is_connected():
+                    discard = True
+                elif connection.in_transaction:
+                    connection.rollback()
+            except Error:
+                discard = True
+
+        with self._lock:
+            if discard:
+                self._stats['discarded'] += 1
+                self._close(connection)
+            else:
+                created_at = self._created_at.get(id(connection), time.monotonic())
+                self._idle.append((connection, created_at, time.monotonic()))
+            self._lock.notify()
+
+    def _close(self, connection: Any) -> None:
+        # Called with the lock held
+        self._open -= 1
+        self._created_at.pop(id(connection), None)
+        try:
+            connection.close()
+        except Error:
+            pass
+
+    @contextmanager
+    def connection(self) -> Generator[Any, None, None]:
+        """Borrow a connection for the duration of a with block."""
+        connection = self.acquire()
+        try:
+            yield connection
+        except Error:
+            self.release(connection, discard=True)
+            raise
+        except BaseException:
+            self.release(connection)
+            raise
+        else:
+            self.release(connection)
+
+    def stats(self) -> Dict[str, Any]:
+        """Snapshot of the pool counters, including wait times."""
+        with self._lock:
+            snapshot = dict(self._stats)
+            snapshot.update(size=self.size, open=self._open, idle=len(self._idle))
+        return snapshot
+
+    def close(self) -> None:
+        """Close every idle connection."""
+        with self._lock:
+            while self._idle:
+                self._close(self._idle.pop()[0])
+
+_pool: Optional[ConnectionPool] = None
+_pool_lock = threading.Lock()
+
+def configure_pool(**kwargs: Any) -> ConnectionPool:
+    """
+    Replace the shared connection pool.
+
+    Accepts the ConnectionPool arguments (size, max_lifetime, ping_after,
+    timeout) plus any mysql.connector.connect keyword arguments, which
+    override DB_CONFIG.
+    """
+    global _pool
+    pool_options = {k: kwargs.pop(k) for k in
+                    ('size', 'max_lifetime', 'ping_after', 'timeout') if k in kwargs}
+    with _pool_lock:
+        if _pool is not None:
+            _pool.close()
+        _pool = ConnectionPool(**pool_options, **{**DB_CONFIG, **kwargs})
+    return _pool
+
+def get_pool() -> ConnectionPool:
+    """Return the shared connection pool, creating it on first use."""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ConnectionPool()
+        return _pool
+
+@contextmanager
+def connection() -> Generator[Any, None, None]:
+    """Borrow a connection from the shared pool for a with block."""
+    with get_pool().connection() as conn:
+        yield conn
+
 def create_table(connection: mysql.connector.connection.MySQLConnection) -> None:
     """Create the user_data table if it doesn't exist."""
     try:
@@ -96,6 +327,230 @@ def insert_data(connection: mysql.connector.connection.MySQLConnection, csv_file
         if cursor:
             cursor.close()
 
+def _read_checkpoint(checkpoint_file: str, csv_file: str) -> Optional[int]:
+    """
+    Return the number of CSV rows already committed for csv_file, or None
+    if no load of csv_file is in progress.
+    """
+    try:
+        with open(checkpoint_file) as file:
+            checkpoint = json.load(file)
+    except (FileNotFoundError, ValueError):
+        return None
+    if checkpoint.get('csv_file') != os.path.abspath(csv_file):
+        return None
+    return int(checkpoint.get('rows_committed', 0))
+
+# Namespace of the user_ids derived for CSV rows that have none
+USER_ID_NAMESPACE = uuid.uuid5(uuid.NAMESPACE_URL, 'ALX_prodev/user_data')
+
+def _derived_user_id(csv_path: str, row_index: int) -> str:
+    """user_id for a CSV row without one, the same on every run."""
+    return str(uuid.uuid5(USER_ID_NAMESPACE, f"{csv_path}:{row_index}"))
+
+def _write_checkpoint(checkpoint_file: str, csv_file: str, rows_committed: int) -> None:
+    """Atomically record how many CSV rows have been committed."""
+    tmp_file = f"{checkpoint_file}.tmp"
+    with open(tmp_file, mode='w') as file:
+        json.dump({'csv_file': os.path.abspath(csv_file),
+                   'rows_committed': rows_committed}, file)
+    os.replace(tmp_file, checkpoint_file)
+
+def bulk_insert_data(connection: mysql.connector.connection.MySQLConnection,
+                     csv_file: str,
+                     chunk_size: int = 10000,
+                     checkpoint_file: Optional[str] = None) -> int:
+    """
+    Stream a CSV file into user_data in chunks, committing once per chunk.
+
+    Each chunk is sent with executemany, which mysql.connector rewrites into
+    a single multi-row INSERT. A checkpoint file is written before the first
+    chunk and updated with the number of rows loaded after every commit, so
+    rerunning a failed load skips the chunks that are already in the table.
+    The checkpoint is removed once the whole file has been loaded; without
+    one, a non-empty table counts as already loaded. Rows without a user_id
+    get one derived from the file path and row number, so a chunk replayed
+    after a crash between commit and checkpoint maps onto the rows it
+    already inserted.
+
+    Args:
+        connection: MySQL connection to the ALX_prodev database
+        csv_file: Path to the CSV file with name, email and age columns
+        chunk_size: Number of rows per INSERT batch and per transaction
+        checkpoint_file: Checkpoint path (default: '<csv_file>.checkpoint')
+
+    Returns:
+        int: Number of rows inserted by this run
+    """
+    if chunk_size < 1:
+        raise ValueError("chunk_size must be a positive integer")
+    if checkpoint_file is None:
+        checkpoint_file = f"{csv_file}.checkpoint"
+
+    cursor = None
+    inserted = 0
+    try:
+        cursor = connection.cursor()
+        rows_committed = _read_checkpoint(checkpoint_file, csv_file)
+
+        if rows_committed is None:
+            cursor.execute("SELECT COUNT(*) FROM user_data")
+            if cursor.fetchone()[0] > 0:
+                print("Data already exists in the table")
+                return 0
+            # Mark the load as started before anything is committed
+            rows_committed = 0
+            _write_checkpoint(checkpoint_file, csv_file, rows_committed)
+        else:
+            print(f"Resuming load of {csv_file} after row {rows_committed}")
+
+        started = time.perf_counter()
+        csv_path = os.path.abspath(csv_file)
+        with open(csv_file, mode='r', newline='') as file:
+            csv_reader = csv.DictReader(file)
+            # Skip the rows committed by a previous run
+            next(islice(csv_reader, rows_committed, rows_committed), None)
+
+            while True:
+                chunk = [
+                    (row.get('user_id') or _derived_user_id(csv_path, index),
+                     row['name'], row['email'], row['age'])
+                    for index, row in enumerate(islice(csv_reader, chunk_size),
+                                                start=rows_committed)
+                ]
+                if not chunk:
+                    break
+                # Rows of a chunk replayed after a crash between the commit
+                # and the checkpoint already exist: leave them as they are.
+                # Unlike IGNORE, this still fails on bad data.
+                cursor.executemany("""
+                    INSERT INTO user_data (user_id, name, email, age)
+                    VALUES (%s, %s, %s, %s)
+                    ON DUPLICATE KEY UPDATE user_id = user_id
+                """, chunk)
+                connection.commit()
+
+                inserted += len(chunk)
+                rows_committed += len(chunk)
+                _write_checkpoint(checkpoint_file, csv_file, rows_committed)
+
+                elapsed = time.perf_counter() - started
+                rate = inserted / elapsed if elapsed > 0 else float('inf')
+                print(f"Committed {rows_committed} rows ({rate:,.0f} rows/s)")
+
+        if os.path.exists(checkpoint_file):
+            os.remove(checkpoint_file)
+        print(f"Data inserted successfully ({inserted} rows)")
+    except Error as e:
+        connection.rollback()
+        print(f"Error inserting data: {e}")
+    except FileNotFoundError:
+        print(f"CSV file {csv_file} not found")
+    finally:
+        if cursor:
+            cursor.close()
+    return inserted
+
+def _cancel_query(connection: mysql.connector.connection.MySQLConnection) -> None:
+    """Ask the server to stop sending the result of a running query."""
+    killer = connect_to_prodev()
+    if killer is None:
+        return
+    try:
+        cursor = killer.cursor()
+        cursor.execute("KILL QUERY %s", (connection.connection_id,))
+        cursor.close()
+    except Error:
+        pass
+    finally:
+        killer.close()
+
+def stream_batches(query: str,
+                   params: Optional[Sequence[Any]] = None,
+                   batch_size: int = 1000,
+                   dictionary: bool = True,
+                   connection: Optional[mysql.connector.connection.MySQLConnection] = None
+                   ) -> Generator[List[Any], None, None]:
+    """
+    Stream the result of a query in batches using an unbuffered cursor.
+
+    Rows are pulled from the server with fetchmany, so at most batch_size
+    rows are held in client memory at any time regardless of the size of the
+    result set. If the consumer stops early the running query is killed on
+    the server instead of reading the rest of the result over the wire.
+
+    Args:
+        query: SQL query to run
+        params: Query parameters bound to the %s placeholders
+        batch_size: Number of rows fetched per round trip
+        dictionary: Yield rows as dicts instead of tuples
+        connection: Connection to use; one is borrowed from the pool if omitted
+
+    Yields:
+        List: Up to batch_size rows
+    """
+    if batch_size < 1:
+        raise ValueError("batch_size must be a positive integer")
+
+    owns_connection = connection is None
+    if owns_connection:
+        connection = get_pool().acquire()
+
+    cursor = None
+    exhausted = False
+    failed = False
+    try:
+        cursor = connection.cursor(buffered=False, dictionary=dictionary)
+        cursor.execute(query, params or ())
+        while True:
+            batch = cursor.fetchmany(batch_size)
+            if not batch:
+                exhausted = True
+                break
+            yield batch
+    except Error:
+        failed = True
+        raise
+    finally:
+        if cursor is not None and not exhausted and not failed:
+            # The consumer stopped early: stop the server from streaming the
+            # rest, then discard whatever was already in flight
+            _cancel_query(connection)
+            try:
+                while cursor.fetchmany(batch_size):
+                    pass
+            except Error:
+                pass
+        if cursor is not None:
+            try:
+                cursor.close()
+            except Error:
+                pass
+        if owns_connection:
+            get_pool().release(connection, discard=failed)
+
+def stream_rows(query: str,
+                params: Optional[Sequence[Any]] = None,
+                prefetch: int = 1000,
+                dictionary: bool = True,
+                connection: Optional[mysql.connector.connection.MySQLConnection] = None
+                ) -> Generator[Any, None, None]:
+    """
+    Stream the result of a query row by row using an unbuffered cursor.
+
+    Args:
+        query: SQL query to run
+        params: Query parameters bound to the %s placeholders
+        prefetch: Number of rows fetched per round trip
+        dictionary: Yield rows as dicts instead of tuples
+        connection: Connection to use; one is borrowed from the pool if omitted
+
+    Yields:
+        A single row of the result set
+    """
+    for batch in stream_batches(query, params, prefetch, dictionary, connection):
+        yield from batch
+
 def stream_users(connection: mysql.connector.connection.MySQLConnection) -> Generator[Tuple[Any, ...], None, None]:
     """
     Generator function that streams rows from user_data table one by one.
@@ -106,21 +561,11 @@ def stream_users(connection: mysql.connector.connection.MySQLConnection) -> Gene
     Yields:
         Tuple: A row from the user_data table
     """
-    cursor = None
     try:
-        cursor = connection.cursor(buffered=True)
-        cursor.execute("SELECT * FROM user_data")
-        
-        while True:
-            row = cursor.fetchone()
-            if row is None:
-                break
-            yield row
+        yield from stream_rows("SELECT * FROM user_data",
+                               dictionary=False, connection=connection)
     except Error as e:
         print(f"Error streaming users: {e}")
-    finally:
-        if cursor:
-            cursor.close()
 
 # Example usage of the generator:
 if __name__ == "__main__":
@@ -0,0 +1,139 @@
+#!/usr/bin/env python3
+"""Test async_streams module against a SQLite copy of user_data"""
+import os
+import sqlite3
+import tempfile
+import unittest
+from contextlib import aclosing
+
+import aiosqlite
+
+from async_streams import (async_lazy_paginate, async_stream_user_ages,
+                           async_stream_users, async_stream_users_in_batches)
+
+USERS = [
+    {'user_id': f"00000000-0000-4000-8000-{i:012d}", 'name': f"User {i}",
+     'email': f"user{i}@example.com", 'age': 20 + i % 5}
+    for i in range(25)
+]
+
+
+class AsyncStreamsTestCase(unittest.IsolatedAsyncioTestCase):
+    """Base class with a SQLite user_data table and a connection to it"""
+
+    async def asyncSetUp(self):
+        """Create the table and open an aiosqlite connection"""
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp.name, 'users.db')
+        conn = sqlite3.connect(self.path)
+        conn.execute("CREATE TABLE user_data (user_id TEXT PRIMARY KEY, "
+                     "name TEXT NOT NULL, email TEXT NOT NULL, age INTEGER NOT NULL)")
+        conn.executemany("INSERT INTO user_data VALUES (?, ?, ?, ?)",
+                         [tuple(user.values()) for user in USERS])
+        conn.commit()
+        conn.close()
+        self.connection = await aiosqlite.connect(self.path)
+
+    async def asyncTearDown(self):
+        """Close the connection and remove the database"""
+        await self.connection.close()
+        self.tmp.cleanup()
+
+    def assert_no_open_statement(self):
+        """A writer only commits once no reader holds the file open"""
+        writer = sqlite3.connect(self.path, timeout=0)
+        try:
+            writer.execute("UPDATE user_data SET age = age + 1")
+            writer.commit()
+        finally:
+            writer.close()
+
+
+class TestFullScans(AsyncStreamsTestCase):
+    """Test the generators that read the whole table"""
+
+    async def test_stream_users(self):
+        """Test async_stream_users yields every row as a dict"""
+        rows = [row async for row in async_stream_users(
+            prefetch=7, connection=self.connection)]
+        self.assertEqual(sorted(rows, key=lambda row: row['user_id']), USERS)
+
+    async def test_stream_users_in_batches(self):
+        """Test async_stream_users_in_batches yields full batches then the rest"""
+        batches = [batch async for batch in async_stream_users_in_batches(
+            10, connection=self.connection)]
+        self.assertEqual([len(batch) for batch in batches], [10, 10, 5])
+        self.assertEqual(sum(batches, []), USERS)
+
+    async def test_stream_user_ages(self):
+        """Test async_stream_user_ages yields plain ages"""
+        ages = [age async for age in async_stream_user_ages(
+            prefetch=4, connection=self.connection)]
+        self.assertEqual(sorted(ages), sorted(user['age'] for user in USERS))
+
+
+class TestKeysetCursors(AsyncStreamsTestCase):
+    """Test async_lazy_paginate"""
+
+    async def test_pages(self):
+        """Test pages follow user_id order and the last one has no cursor"""
+        pages = [page async for page in async_lazy_paginate(
+            10, connection=self.connection)]
+        self.assertEqual([len(page) for page in pages], [10, 10, 5])
+        self.assertIsNotNone(pages[0].next_cursor)
+        self.assertIsNone(pages[-1].next_cursor)
+        self.assertEqual(sum(pages, []), USERS)
+
+    async def test_resume_from_cursor(self):
+        """Test a cursor from one scan starts another at the next page"""
+        async with aclosing(async_lazy_paginate(
+                10, connection=self.connection)) as pages:
+            first = await anext(pages)
+        resumed = [page async for page in async_lazy_paginate(
+            10, cursor=first.next_cursor, connection=self.connection)]
+        self.assertEqual(sum(resumed, []), USERS[10:])
+
+    async def test_sort_key_with_ties(self):
+        """Test paging on age neither skips nor repeats rows with equal ages"""
+        pages = [page async for page in async_lazy_paginate(
+            4, sort_key='age', connection=self.connection)]
+        rows = sum(pages, [])
+        expected = sorted(USERS, key=lambda user: (user['age'], user['user_id']))
+        self.assertEqual(rows, expected)
+
+
+class TestEarlyClose(AsyncStreamsTestCase):
+    """Test closing a generator early closes the query under it"""
+
+    async def test_stream_users(self):
+        """Test closing async_stream_users releases its cursor at once"""
+        async with aclosing(async_stream_users(
+                prefetch=5, connection=self.connection)) as users:
+            await anext(users)
+        self.assert_no_open_statement()
+
+    async def test_stream_users_in_batches(self):
+        """Test closing async_stream_users_in_batches releases its cursor at once"""
+        async with aclosing(async_stream_users_in_batches(
+                5, connection=self.connection)) as batches:
+            await anext(batches)
+        self.assert_no_open_statement()
+
+    async def test_stream_user_ages(self):
+        """Test closing async_stream_user_ages releases its cursor at once"""
+        async with aclosing(async_stream_user_ages(
+                prefetch=5, connection=self.connection)) as ages:
+            await anext(ages)
+        self.assert_no_open_statement()
+
+    async def test_connection_stays_usable(self):
+        """Test a connection passed in is left open for the caller"""
+        async with aclosing(async_stream_users(
+                prefetch=5, connection=self.connection)) as users:
+            await anext(users)
+        async with self.connection.execute("SELECT COUNT(*) FROM user_data") as cursor:
+            self.assertEqual(await cursor.fetchone(), (len(USERS),))
+
+
+if __name__ == '__main__':
+    unittest.main()